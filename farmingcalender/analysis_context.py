@@ -0,0 +1,91 @@
+# analysis_context.py
+import time
+
+import cv2
+
+from image_ingest import ANALYSIS_SIZE
+from shape_features import MIN_CONTOUR_AREA, contour_stats
+
+
+class ImageAnalysisContext:
+    """Lazily computed representations of one preprocessed image.
+
+    Every detector stage reads HSV, gray, edges, contours and color fractions
+    from here, so each is computed at most once per image. The context records
+    which artifacts were built and how long each one took.
+    """
+
+    def __init__(self, image, color_engine=None):
+        self.image = image
+        self.color_engine = color_engine
+        self._artifacts = {}
+        self.timings = {}
+
+    @classmethod
+    def wrap(cls, image, color_engine=None):
+        """Return image unchanged if it already is a context, else a new context"""
+        if isinstance(image, cls):
+            return image
+        return cls(image, color_engine)
+
+    def _get(self, name, compute):
+        if name not in self._artifacts:
+            start = time.perf_counter()
+            self._artifacts[name] = compute()
+            self.timings[name] = round((time.perf_counter() - start) * 1000, 3)
+        return self._artifacts[name]
+
+    @property
+    def pixel_count(self):
+        return self.image.shape[0] * self.image.shape[1]
+
+    @property
+    def min_contour_area(self):
+        """MIN_CONTOUR_AREA scaled from the analysis resolution to this image"""
+        return MIN_CONTOUR_AREA * self.pixel_count / (ANALYSIS_SIZE[0] * ANALYSIS_SIZE[1])
+
+    @property
+    def hsv(self):
+        return self._get('hsv', lambda: cv2.cvtColor(self.image, cv2.COLOR_BGR2HSV))
+
+    @property
+    def gray(self):
+        return self._get('gray', lambda: cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY))
+
+    @property
+    def blurred(self):
+        return self._get('blurred', lambda: cv2.GaussianBlur(self.gray, (5, 5), 0))
+
+    @property
+    def edges(self):
+        return self._get('edges', lambda: cv2.Canny(self.blurred, 50, 150))
+
+    @property
+    def contours(self):
+        return self._get('contours', lambda: cv2.findContours(
+            self.edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0])
+
+    @property
+    def contour_stats(self):
+        """Area, perimeter, circularity and bounding box of every contour, as arrays"""
+        return self._get('contour_stats', lambda: contour_stats(self.contours))
+
+    @property
+    def color_fractions(self):
+        """Pixel share of every range compiled into the color engine, indexed by bit"""
+        return self._get('color_fractions', lambda: self.color_engine.fractions(self.hsv))
+
+    def profile_fractions(self):
+        return self.color_engine.profile_fractions(self.hsv, self.color_fractions)
+
+    def range_fraction(self, name):
+        """Pixel share of a named extra range registered on the color engine"""
+        return float(self.color_fractions[self.color_engine.named_bits[name]])
+
+    def report(self):
+        """Artifacts computed for this image, in order, with their cost in ms"""
+        return {
+            'computed': list(self.timings),
+            'timings_ms': dict(self.timings),
+            'total_ms': round(sum(self.timings.values()), 3)
+        }
@@ -1,15 +1,28 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import numpy as np
-import base64
-import io
-from PIL import Image
 from datetime import datetime, timedelta
+from functools import lru_cache
 import random
 import json
+import os
 import cv2
+from color_engine import ColorProfileEngine
+from analysis_context import ImageAnalysisContext
+from shape_features import (CIRCULARITY_BIN_EDGES, band_counts, circularity_histogram,
+                            substantial_circularity)
+from image_ingest import ANALYSIS_SIZE, decode_thumbnail, decode_to_bgr, decode_to_rgb, request_image
+from batch_detection import BatchDetector
+from result_cache import CachedDetector, CachedWeeklyPlanner, ResultCache
+from condition_forecast import SIMPLE_FORECAST, as_condition_lists
+from task_registry import TaskRegistry
+from task_scheduler import DEFAULT_DAILY_CAPACITY, PendingTaskScheduler
+from planner_rules import format_single_line_tasks, get_weekly_goals, is_task_still_relevant, task_relevance_rules
 
 app = Flask(__name__)
+# Upper bound for image uploads (JSON, multipart or raw body)
+app.config['MAX_CONTENT_LENGTH'] = 32 * 1024 * 1024
+app.config['BATCH_MAX_CONTENT_LENGTH'] = int(os.environ.get('DETECT_BATCH_MAX_BYTES', 1024 * 1024 * 1024))
 # Fix CORS - allow all origins and methods
 CORS(app, origins=["http://localhost:5173", "http://127.0.0.1:5173"], methods=["GET", "POST", "PUT", "DELETE"], allow_headers=["Content-Type"])
 
@@ -17,7 +30,7 @@ print("🚀 Starting Unified Smart Farming Backend...")
 
 # Your existing AdvancedCropDetector class remains the same...
 class AdvancedCropDetector:
-    def __init__(self):
+    def __init__(self, cascade=False, cascade_size=64, cascade_margin=0.1):
         self.crop_features = {
             'tomato': {
                 'color_profiles': {
@@ -43,39 +56,56 @@ class AdvancedCropDetector:
                 }
             }
         }
+        
+        # Ranges used by the tomato check and growth stage detection
+        self.stage_color_ranges = {
+            'red_fruit': {'lower': [0, 100, 100], 'upper': [10, 255, 255]},
+            'yellow_flower': {'lower': [20, 100, 100], 'upper': [30, 255, 255]}
+        }
+        
+        # Compile color profiles into HSV lookup tables once at startup
+        self.color_engine = ColorProfileEngine(self.crop_features, self.stage_color_ranges)
+        
+        # Coarse-to-fine mode: score a cascade_size thumbnail first and only run
+        # the full-resolution analysis when the top two final scores are closer
+        # than cascade_margin
+        self.cascade = cascade
+        self.cascade_size = (cascade_size, cascade_size)
+        self.cascade_margin = cascade_margin
     
     def detect_crop_from_image(self, image_data):
         try:
             print("🔍 Starting enhanced crop detection...")
             
-            # Convert base64 to image
-            if isinstance(image_data, str) and image_data.startswith('data:image'):
-                image_data = image_data.split(',')[1]
+            decision_level = 'full'
+            cascade_details = None
+            full_image = None
             
-            image_bytes = base64.b64decode(image_data)
-            image = Image.open(io.BytesIO(image_bytes))
-            opencv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+            if self.cascade:
+                thumbnail_image, full_image = decode_thumbnail(image_data, self.cascade_size, ANALYSIS_SIZE)
+                thumbnail = self.analyze_at(thumbnail_image, self.cascade_size)
+                margin = self.score_margin(thumbnail[3])
+                cascade_details = {
+                    'thumbnail_size': list(self.cascade_size),
+                    'thumbnail_margin': round(margin, 4),
+                    'margin_threshold': self.cascade_margin,
+                    'thumbnail_ms': thumbnail[0].report()['total_ms']
+                }
+                if margin >= self.cascade_margin:
+                    decision_level = 'thumbnail'
+                    analysis = thumbnail
             
-            # Preprocess image
-            processed_image = self.preprocess_image(opencv_image)
+            if decision_level == 'full':
+                if full_image is None:
+                    # Decode straight to the analysis resolution
+                    full_image = decode_to_bgr(image_data, ANALYSIS_SIZE)
+                analysis = self.analyze_at(full_image, ANALYSIS_SIZE)
             
-            # Multiple analysis methods
-            color_scores = self.analyze_colors(processed_image)
-            shape_scores = self.analyze_shapes(processed_image)
+            context, color_scores, shape_scores, final_scores = analysis
             
             print(f"🎨 Color scores: {color_scores}")
             print(f"📐 Shape scores: {shape_scores}")
-            
-            # FIX: Proper confidence calculation (was going above 100%)
-            final_scores = {}
-            for crop in ['tomato', 'rice', 'chili']:
-                color_score = color_scores.get(crop, 0)
-                shape_score = shape_scores.get(crop, 0)
-                # Normalize scores to prevent overflow
-                normalized_score = (color_score * 0.7) + (shape_score * 0.3)
-                final_scores[crop] = min(normalized_score, 100)  # Cap at 100
-            
-            print(f"📊 Final scores: {final_scores}")
+            print(f"📊 Final scores ({decision_level}): {final_scores}")
             
             # Get best match
             detected_crop = max(final_scores.items(), key=lambda x: x[1])[0]
@@ -85,7 +115,7 @@ class AdvancedCropDetector:
             confidence = min(max(confidence, 0), 100)
             
             # Tomato-specific verification
-            if detected_crop == 'rice' and self.has_tomato_features(processed_image):
+            if detected_crop == 'rice' and self.has_tomato_features(context):
                 print("🔄 Correcting rice to tomato - tomato features detected")
                 detected_crop = 'tomato'
                 confidence = max(confidence, 0.8)
@@ -99,15 +129,20 @@ class AdvancedCropDetector:
                 'success': True,
                 'detected_crop': detected_crop,
                 'crop_name': self.get_crop_name(detected_crop),
-                'growth_stage': self.detect_growth_stage(processed_image, detected_crop),
+                'growth_stage': self.detect_growth_stage(context, detected_crop),
                 'days_estimate': self.estimate_days(detected_crop),
                 'confidence': round(confidence, 1),  # FIX: Remove *100 multiplication
+                'decision_level': decision_level,
                 'analysis_details': {
                     'color_scores': color_scores,
                     'shape_scores': shape_scores,
-                    'final_scores': final_scores
+                    'final_scores': final_scores,
+                    'shape_features': self.shape_features(context),
+                    'pipeline': context.report()
                 }
             }
+            if cascade_details is not None:
+                result['analysis_details']['cascade'] = cascade_details
             
             print(f"✅ Detection complete: {result['detected_crop']} with {result['confidence']}% confidence")
             return result
@@ -116,10 +151,39 @@ class AdvancedCropDetector:
             print(f"❌ Detection error: {str(e)}")
             return {'success': False, 'error': f'Detection failed: {str(e)}'}
     
-    def preprocess_image(self, image):
+    def analyze_at(self, opencv_image, size):
+        """Preprocess and score a decoded image at the given (width, height)"""
+        processed_image = self.preprocess_image(opencv_image, size)
+        
+        # Shared per-image artifacts (HSV, edges, contours...) for every stage
+        context = ImageAnalysisContext(processed_image, self.color_engine)
+        
+        # Multiple analysis methods
+        color_scores = self.analyze_colors(context)
+        shape_scores = self.analyze_shapes(context)
+        
+        # FIX: Proper confidence calculation (was going above 100%)
+        final_scores = {}
+        for crop in ['tomato', 'rice', 'chili']:
+            color_score = color_scores.get(crop, 0)
+            shape_score = shape_scores.get(crop, 0)
+            # Normalize scores to prevent overflow
+            normalized_score = (color_score * 0.7) + (shape_score * 0.3)
+            final_scores[crop] = min(normalized_score, 100)  # Cap at 100
+        
+        return context, color_scores, shape_scores, final_scores
+    
+    @staticmethod
+    def score_margin(final_scores):
+        """Gap between the best and the runner-up crop score"""
+        best, runner_up = sorted(final_scores.values(), reverse=True)[:2]
+        return best - runner_up
+    
+    def preprocess_image(self, image, size=ANALYSIS_SIZE):
         """Enhance image for better detection"""
-        # Resize for consistency
-        image = cv2.resize(image, (400, 400))
+        # Resize for consistency (no-op for images decoded at the target size)
+        if image.shape[1::-1] != tuple(size):
+            image = cv2.resize(image, tuple(size))
         
         # Enhance contrast
         lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
@@ -129,17 +193,16 @@ class AdvancedCropDetector:
         return image
     
     def analyze_colors(self, image):
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        context = ImageAnalysisContext.wrap(image, self.color_engine)
         scores = {}
         
+        # One lookup-table pass gives the pixel share of every profile
+        fractions = context.profile_fractions()
+        
         for crop_name, features in self.crop_features.items():
             crop_score = 0
-            for color_name, color_range in features['color_profiles'].items():
-                lower = np.array(color_range['lower'])
-                upper = np.array(color_range['upper'])
-                mask = cv2.inRange(hsv, lower, upper)
-                
-                percentage = np.sum(mask > 0) / (hsv.shape[0] * hsv.shape[1])
+            for color_name in features['color_profiles']:
+                percentage = fractions[crop_name][color_name]
                 
                 # FIX: Use reasonable weights to prevent overflow
                 if 'fruit' in color_name or 'flower' in color_name:
@@ -152,63 +215,40 @@ class AdvancedCropDetector:
         return scores
     
     def analyze_shapes(self, image):
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        edges = cv2.Canny(blurred, 50, 150)
-        
-        # Find contours
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        context = ImageAnalysisContext.wrap(image, self.color_engine)
         
-        scores = {'tomato': 0, 'rice': 0, 'chili': 0}
+        # Circularity of every substantial contour, computed in bulk
+        circularity = substantial_circularity(context.contour_stats, context.min_contour_area)
+        bands = band_counts(circularity)
         
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            if area < 100:  # Filter small contours
-                continue
-                
-            # Shape analysis
-            perimeter = cv2.arcLength(contour, True)
-            if perimeter > 0:
-                circularity = 4 * np.pi * area / (perimeter * perimeter)
-                
-                # Tomato-like shapes (round fruits)
-                if 0.7 < circularity < 1.2:
-                    scores['tomato'] += 0.2  # Reduced from 20
-                # Rice-like shapes (long thin shapes)
-                elif circularity < 0.3:
-                    scores['rice'] += 0.15  # Reduced from 15
-                # Chili-like shapes (elongated)
-                elif 0.3 < circularity < 0.6:
-                    scores['chili'] += 0.15  # Reduced from 15
-        
-        return scores
+        # Round fruits score for tomato, long thin shapes for rice, elongated for chili
+        return {
+            'tomato': bands['tomato'] * 0.2,
+            'rice': bands['rice'] * 0.15,
+            'chili': bands['chili'] * 0.15
+        }
+    
+    def shape_features(self, image):
+        """Circularity distribution of the substantial contours as a feature vector"""
+        context = ImageAnalysisContext.wrap(image, self.color_engine)
+        circularity = substantial_circularity(context.contour_stats, context.min_contour_area)
+        return {
+            'contour_count': int(circularity.size),
+            'circularity_bins': CIRCULARITY_BIN_EDGES.tolist(),
+            'circularity_histogram': circularity_histogram(circularity)
+        }
     
     def has_tomato_features(self, image):
         """Check for distinctive tomato features"""
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        context = ImageAnalysisContext.wrap(image, self.color_engine)
         
         # Look for red fruits (tomato distinctive feature)
-        red_lower = np.array([0, 100, 100])
-        red_upper = np.array([10, 255, 255])
-        red_mask = cv2.inRange(hsv, red_lower, red_upper)
-        red_percentage = np.sum(red_mask > 0) / (hsv.shape[0] * hsv.shape[1])
-        
-        # Look for round shapes using contour analysis
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        edges = cv2.Canny(blurred, 50, 150)
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        has_round_objects = False
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            if area > 100:  # Only consider substantial objects
-                perimeter = cv2.arcLength(contour, True)
-                if perimeter > 0:
-                    circularity = 4 * np.pi * area / (perimeter * perimeter)
-                    if circularity > 0.7:  # Round shape
-                        has_round_objects = True
-                        break
+        red_percentage = context.range_fraction('red_fruit')
+        
+        # Look for round shapes among substantial contours
+        stats = context.contour_stats
+        substantial = (stats['area'] > context.min_contour_area) & (stats['perimeter'] > 0)
+        has_round_objects = bool(np.any(stats['circularity'][substantial] > 0.7))
         
         has_red_fruits = red_percentage > 0.005  # Even small amount of red
         
@@ -216,16 +256,14 @@ class AdvancedCropDetector:
         return has_red_fruits or has_round_objects
     
     def detect_growth_stage(self, image, crop):
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        context = ImageAnalysisContext.wrap(image, self.color_engine)
         
         if crop == 'tomato':
             # Check for red fruits (harvest stage)
-            red_mask = cv2.inRange(hsv, np.array([0, 100, 100]), np.array([10, 255, 255]))
-            red_percentage = np.sum(red_mask > 0) / (hsv.shape[0] * hsv.shape[1])
+            red_percentage = context.range_fraction('red_fruit')
             
             # Check for flowers
-            yellow_mask = cv2.inRange(hsv, np.array([20, 100, 100]), np.array([30, 255, 255]))
-            yellow_percentage = np.sum(yellow_mask > 0) / (hsv.shape[0] * hsv.shape[1])
+            yellow_percentage = context.range_fraction('yellow_flower')
             
             if red_percentage > 0.01:
                 return 'harvest'
@@ -252,14 +290,43 @@ class AdvancedCropDetector:
         }
         return names.get(crop_code, 'Unknown Crop')
 
-# Initialize enhanced detector
-enhanced_detector = AdvancedCropDetector()
+# Initialize enhanced detector (DETECT_CASCADE=1 enables the thumbnail-first mode)
+enhanced_detector = AdvancedCropDetector(
+    cascade=os.environ.get('DETECT_CASCADE', '0') == '1',
+    cascade_size=int(os.environ.get('DETECT_CASCADE_SIZE', 64)),
+    cascade_margin=float(os.environ.get('DETECT_CASCADE_MARGIN', 0.1))
+)
+
+# Repeat uploads of the same photo are answered from this cache
+detection_cache = ResultCache(
+    maxsize=int(os.environ.get('DETECT_CACHE_SIZE', 512)),
+    ttl=int(os.environ.get('DETECT_CACHE_TTL', 3600))
+)
+cached_detector = CachedDetector(enhanced_detector, detection_cache)
+
+# Worker pool for /api/detect-crop/batch ('thread' or 'process' mode)
+batch_detector = BatchDetector(
+    enhanced_detector,
+    workers=int(os.environ.get('DETECT_BATCH_WORKERS', 0)) or None,
+    max_in_flight=int(os.environ.get('DETECT_BATCH_MAX_IN_FLIGHT', 0)) or None,
+    mode=os.environ.get('DETECT_BATCH_MODE', 'thread'),
+    cached=cached_detector
+)
 
 # ============ WEEKLY PLANNER WITH REINFORCEMENT LEARNING ============
 
+@lru_cache(maxsize=32)
+def day_labels(date):
+    """Date key, weekday name and compact date of a plan day; a batch of plans shares its 7 days"""
+    return date.strftime('%Y-%m-%d'), date.strftime('%A'), date.strftime('%Y%m%d')
+
 class RLWeeklyPlanner:
-    def __init__(self):
-        self.task_completion_history = {}
+    def __init__(self, seed=None, task_registry=None, daily_capacity=DEFAULT_DAILY_CAPACITY):
+        # Served plans and task status/history by (farm_id, task_id)
+        self.task_registry = task_registry or TaskRegistry()
+        # Condition forecasts draw from this generator; pass a seed for reproducible plans
+        self.forecast = SIMPLE_FORECAST
+        self.rng = np.random.default_rng(seed)
         self.task_config = {
             'irrigation': {'priority': 1, 'duration': 2, 'max_delay': 2},
             'fertilizer': {'priority': 2, 'duration': 1, 'max_delay': 3},
@@ -272,9 +339,26 @@ class RLWeeklyPlanner:
             'shade_management': {'priority': 2, 'duration': 1, 'max_delay': 2},
             'frost_protection': {'priority': 1, 'duration': 1, 'max_delay': 1}
         }
+        # Column order of the vectorized per-task arrays
+        self.task_index = {task: i for i, task in enumerate(self.task_config)}
+        # Packs pending tasks into each day's labour hours, honouring max_delay
+        self.scheduler = PendingTaskScheduler(self.task_config, daily_capacity)
     
-    def generate_weekly_plan(self, crop_info, current_conditions, pending_tasks=None):
-        """Generate unified weekly plan with single-line daily tasks"""
+    def generate_weekly_plan(self, crop_info, current_conditions, pending_tasks=None, rng=None):
+        """Generate unified weekly plan with single-line daily tasks (rng overrides self.rng for the forecast)"""
+        # The whole week's conditions come from one forecast draw
+        rng = rng if rng is not None else self.rng
+        forecast = as_condition_lists(current_conditions, self.forecast.horizon(current_conditions, 7, rng))
+        
+        return self.assemble_weekly_plan(
+            crop_info,
+            pending_tasks,
+            lambda day_date, current_pending, day_offset: self.generate_unified_daily_plan(
+                day_date, current_conditions, crop_info, current_pending, day_offset, forecast[day_offset])
+        )
+
+    def assemble_weekly_plan(self, crop_info, pending_tasks, daily_plan, today=None):
+        """Run daily_plan(day_date, pending, day_offset) for the next 7 days, carrying postponed tasks over"""
         if pending_tasks is None:
             pending_tasks = []
             
@@ -283,17 +367,17 @@ class RLWeeklyPlanner:
         days_since_planting = crop_info.get('days_estimate', 30)
         
         # Get today's date
-        today = datetime.now()
+        today = today or datetime.now()
         
         weekly_plan = {
             'crop': crop_type,
             'current_stage': current_stage,
             'days_since_planting': days_since_planting,
             'generated_date': today.isoformat(),
-            'week_start': today.strftime('%Y-%m-%d'),
+            'week_start': day_labels(today)[0],
             'daily_plans': {},
             'carry_over_tasks': [],
-            'weekly_goals': self.get_weekly_goals(current_stage, crop_type),
+            'weekly_goals': get_weekly_goals(current_stage),
             'week_summary': []  # NEW: Unified weekly view
         }
         
@@ -302,45 +386,185 @@ class RLWeeklyPlanner:
         # Generate plan for next 7 days
         for day_offset in range(7):
             day_date = today + timedelta(days=day_offset)
-            day_plan = self.generate_unified_daily_plan(
-                day_date, 
-                current_conditions, 
-                crop_info,
-                current_pending,
-                day_offset
-            )
+            day_plan = daily_plan(day_date, current_pending, day_offset)
             
-            weekly_plan['daily_plans'][day_date.strftime('%Y-%m-%d')] = day_plan
+            date_key, day_name, _ = day_labels(day_date)
+            weekly_plan['daily_plans'][date_key] = day_plan
             
             # Update pending tasks for next day
             current_pending = day_plan.get('postponed_tasks', [])
             
             # Add to unified week summary
-            weekly_plan['week_summary'].append({
-                'date': day_date.strftime('%Y-%m-%d'),
-                'day_name': day_date.strftime('%A'),
-                'is_today': day_offset == 0,
-                'main_task': day_plan.get('main_task', {}),
-                'additional_tasks': day_plan.get('additional_tasks', []),
-                'postponed_count': len(day_plan.get('postponed_tasks', [])),
-                'total_duration': day_plan.get('total_duration', 0),
-                'single_line_display': self.format_single_line_tasks(day_plan.get('tasks', []), day_date)
-            })
+            weekly_plan['week_summary'].append(self.week_summary_entry(day_plan, day_date))
         
         weekly_plan['carry_over_tasks'] = current_pending
         return weekly_plan
 
-    def generate_unified_daily_plan(self, date, conditions, crop_info, pending_tasks, day_offset):
+    def week_summary_entry(self, day_plan, day_date):
+        """Unified weekly view of one day"""
+        date_key, day_name, _ = day_labels(day_date)
+        return {
+            'date': date_key,
+            'day_name': day_name,
+            'is_today': day_plan.get('day_offset') == 0,
+            'main_task': day_plan.get('main_task', {}),
+            'additional_tasks': day_plan.get('additional_tasks', []),
+            'postponed_count': len(day_plan.get('postponed_tasks', [])),
+            'total_duration': day_plan.get('total_duration', 0),
+            'single_line_display': format_single_line_tasks(day_plan.get('tasks', []), day_date)
+        }
+
+    def replan_from_change(self, weekly_plan, task_id, outcome, reason=None, date_key=None):
+        """Apply one task outcome ('completed' or 'postponed') to a plan from generate_weekly_plan.
+
+        Only the day holding the task and, for a postponement, the following
+        days whose carry-over list changes are recomputed; each keeps its
+        predicted conditions and main task. weekly_plan is updated in place
+        and the changed days are returned as a delta, or None if no day has
+        the task. date_key, if known (e.g. from the task registry), skips
+        the search for the task's day.
+        """
+        daily_plans = weekly_plan.get('daily_plans', {})
+        dates = sorted(daily_plans)
+        if date_key in daily_plans and any(task.get('id') == task_id for task in daily_plans[date_key].get('tasks', [])):
+            day_index = dates.index(date_key)
+        else:
+            day_index = next((i for i, day in enumerate(dates)
+                              if any(task.get('id') == task_id for task in daily_plans[day].get('tasks', []))), None)
+        if day_index is None:
+            return None
+        
+        day_plan = daily_plans[dates[day_index]]
+        changed_at = datetime.now().isoformat()
+        changed_dates = [dates[day_index]]
+        
+        if outcome == 'completed':
+            for task in self.tasks_with_id(day_plan, task_id):
+                task['completed'] = True
+                task['completed_at'] = changed_at
+        else:
+            # Move the task to the day's postponed list as a fresh pending task
+            for task in self.tasks_with_id(day_plan, task_id):
+                task['postponed'] = True
+                task['postpone_reason'] = reason
+                task['postponed_at'] = changed_at
+            postponed = next(task for task in day_plan['tasks'] if task.get('id') == task_id)
+            postponed = dict(postponed, is_carry_over=False, days_pending=postponed.get('days_pending', 0) + 1)
+            postponed.pop('postponed', None)
+            
+            day_plan['tasks'] = [task for task in day_plan['tasks'] if task.get('id') != task_id]
+            day_plan['additional_tasks'] = [task for task in day_plan['additional_tasks'] if task.get('id') != task_id]
+            day_plan['postponed_tasks'] = day_plan['postponed_tasks'] + [postponed]
+            day_plan['total_tasks'] = len(day_plan['tasks'])
+            day_plan['total_duration'] = sum(task.get('estimated_duration', 1) for task in day_plan['tasks'])
+            
+            # Carry the new postponed list forward until a day's own postponed list comes out unchanged
+            pending = day_plan['postponed_tasks']
+            for date_key in dates[day_index + 1:]:
+                previous = daily_plans[date_key]
+                conditions = previous['predicted_conditions']
+                main_task = previous['main_task']
+                scheduled, postponed_tasks = self.scheduler.schedule_day(
+                    pending,
+                    lambda task_data: self.calculate_task_score(task_data, conditions),
+                    0 if main_task.get('postponed') else self.scheduler.duration(main_task)
+                )
+                updated = self.fill_daily_plan(datetime.strptime(date_key, '%Y-%m-%d'), previous['day_offset'],
+                                               conditions, main_task, scheduled, postponed_tasks)
+                if updated == previous:
+                    break
+                daily_plans[date_key] = updated
+                changed_dates.append(date_key)
+                pending = updated['postponed_tasks']
+                if pending == previous['postponed_tasks']:
+                    break
+            else:
+                weekly_plan['carry_over_tasks'] = pending
+        
+        # Refresh the week summary of the changed days
+        summary_index = {entry.get('date'): i for i, entry in enumerate(weekly_plan.get('week_summary', []))}
+        changed_summary = []
+        for date_key in changed_dates:
+            entry = self.week_summary_entry(daily_plans[date_key], datetime.strptime(date_key, '%Y-%m-%d'))
+            if date_key in summary_index:
+                weekly_plan['week_summary'][summary_index[date_key]] = entry
+            changed_summary.append(entry)
+        
+        return {
+            'task_id': task_id,
+            'outcome': outcome,
+            'changed_dates': changed_dates,
+            'daily_plans': {date_key: daily_plans[date_key] for date_key in changed_dates},
+            'week_summary': changed_summary,
+            'carry_over_tasks': weekly_plan.get('carry_over_tasks', [])
+        }
+
+    def tasks_with_id(self, day_plan, task_id):
+        """Every copy of a task in a day plan (main_task, tasks and additional_tasks hold the same tasks)"""
+        candidates = [day_plan.get('main_task')] + day_plan.get('tasks', []) + day_plan.get('additional_tasks', [])
+        return [task for task in candidates if task and task.get('id') == task_id]
+
+    def generate_weekly_plans(self, records, chunk_size=1024):
+        """Weekly plans for many farms at once, yielded in input order.
+
+        Each record is (crop_info, current_conditions, pending_tasks). Condition
+        prediction, the task rules and main task selection run as array
+        operations over a chunk of farms x 7 days; only carrying pending tasks
+        from day to day stays a per-farm loop, and it is table lookups.
+        From the same self.rng state the plans equal calling generate_weekly_plan
+        for each farm in turn.
+        """
+        # One calendar for the whole batch, so every plan covers the same week
+        today = datetime.now()
+        records = iter(records)
+        while True:
+            chunk = [record for _, record in zip(range(chunk_size), records)]
+            if not chunk:
+                return
+            yield from self._generate_weekly_plan_chunk(chunk, today)
+
+    def _generate_weekly_plan_chunk(self, chunk, today):
+        current = [current_conditions for _, current_conditions, _ in chunk]
+        conditions = self.forecast.horizon_many(current, 7, self.rng)
+        crop_types = np.array([crop_info.get('crop', 'tomato') for crop_info, _, _ in chunk])
+        
+        main_tasks = self.get_ai_recommendations_many(conditions, crop_types[:, None])
+        task_scores = self.calculate_task_scores_many(conditions)
+        
+        for farm, (crop_info, _, pending_tasks) in enumerate(chunk):
+            farm_conditions = as_condition_lists(current[farm], conditions[farm])
+            
+            def daily_plan(day_date, current_pending, day_offset):
+                adjusted_conditions = farm_conditions[day_offset]
+                scores = task_scores[farm, day_offset]
+                return self.build_daily_plan(
+                    day_date, adjusted_conditions, crop_info, str(main_tasks[farm, day_offset]),
+                    current_pending, day_offset,
+                    lambda task_data: float(scores[self.task_index[task_data['task']]])
+                    if task_data['task'] in self.task_index else 100
+                )
+            
+            yield self.assemble_weekly_plan(crop_info, pending_tasks, daily_plan, today)
+
+    def generate_unified_daily_plan(self, date, conditions, crop_info, pending_tasks, day_offset, adjusted_conditions=None):
         """Generate daily plan with unified task display"""
-        # Adjust conditions for future days
-        adjusted_conditions = self.predict_conditions(conditions, day_offset)
+        # Adjust conditions for future days (unless the weekly forecast already did)
+        if adjusted_conditions is None:
+            adjusted_conditions = self.predict_conditions(conditions, day_offset)
         
         # Get AI recommendations for this day
         ai_recommendations = self.get_ai_recommendations(adjusted_conditions, crop_info, pending_tasks)
         
+        return self.build_daily_plan(date, adjusted_conditions, crop_info, ai_recommendations, pending_tasks, day_offset,
+                                     lambda task_data: self.calculate_task_score(task_data, adjusted_conditions))
+
+    def build_daily_plan(self, date, adjusted_conditions, crop_info, ai_recommendations, pending_tasks, day_offset, task_score):
+        """Daily plan dict from the chosen main task, with pending tasks packed into the remaining hours"""
+        _, _, compact_date = day_labels(date)
+        
         # Convert to task format
         main_task = {
-            'id': f"main_{date.strftime('%Y%m%d')}",
+            'id': f"main_{compact_date}",
             'task': ai_recommendations,
             'type': 'ai_recommendation',
             'priority': 'high',
@@ -349,69 +573,33 @@ class RLWeeklyPlanner:
             'is_carry_over': False
         }
         
-        # Process pending tasks with RL prioritization
-        processed_pending = self.prioritize_pending_tasks(pending_tasks, adjusted_conditions)
-        
-        # Separate carry-over tasks
-        carry_over_tasks = [task for task in processed_pending if task.get('is_carry_over', False)]
-        new_additional_tasks = [task for task in processed_pending if not task.get('is_carry_over', False)]
+        # Pending tasks by priority (escalated first) into the hours the main task leaves
+        additional_tasks, postponed_tasks = self.scheduler.schedule_day(
+            pending_tasks, task_score, self.scheduler.duration(main_task))
         
-        # Combine tasks (main AI task + prioritized pending tasks)
-        all_tasks = [main_task] + new_additional_tasks[:2]  # Limit to 3 tasks per day
+        return self.fill_daily_plan(date, day_offset, adjusted_conditions, main_task, additional_tasks, postponed_tasks)
+
+    def fill_daily_plan(self, date, day_offset, adjusted_conditions, main_task, additional_tasks, postponed_tasks):
+        """Daily plan dict: the main task (unless postponed) plus the scheduled pending tasks"""
+        date_key, day_name, _ = day_labels(date)
         
-        # Mark postponed tasks (carry-over + excess new tasks)
-        postponed_tasks = carry_over_tasks + new_additional_tasks[2:]
+        all_tasks = ([] if main_task.get('postponed') else [main_task]) + additional_tasks
+        carry_over_count = sum(1 for task in postponed_tasks if task.get('is_carry_over', False))
         
         return {
-            'date': date.strftime('%Y-%m-%d'),
-            'day_name': date.strftime('%A'),
+            'date': date_key,
+            'day_name': day_name,
             'day_offset': day_offset,
             'predicted_conditions': adjusted_conditions,
             'main_task': main_task,
-            'additional_tasks': new_additional_tasks[:2],
+            'additional_tasks': additional_tasks,
             'tasks': all_tasks,
             'postponed_tasks': postponed_tasks,
             'total_tasks': len(all_tasks),
             'total_duration': sum(task.get('estimated_duration', 1) for task in all_tasks),
-            'has_carry_over': len(carry_over_tasks) > 0
+            'has_carry_over': carry_over_count > 0
         }
 
-    def format_single_line_tasks(self, tasks, date):
-        """Format tasks for single-line display"""
-        if not tasks:
-            return "No tasks scheduled"
-        
-        main_task = tasks[0]
-        task_emojis = {
-            'irrigation': '💧',
-            'fertilizer': '🌱', 
-            'pest_control': '🐛',
-            'harvest': '🌾',
-            'pruning': '✂️',
-            'weeding': '🌿',
-            'general_care': '✅',
-            'drainage_check': '🌧️',
-            'shade_management': '☀️',
-            'frost_protection': '❄️'
-        }
-        
-        emoji = task_emojis.get(main_task['task'], '✅')
-        task_name = main_task['task'].replace('_', ' ').title()
-        
-        # Today's task display
-        if date.date() == datetime.now().date():
-            base_display = f"{emoji} {task_name}"
-            if len(tasks) > 1:
-                return f"{base_display} +{len(tasks)-1} more"
-            return base_display
-        
-        # Future day display
-        additional_count = len(tasks) - 1
-        if additional_count > 0:
-            return f"{emoji} {task_name} (+{additional_count})"
-        
-        return f"{emoji} {task_name}"
-
     def get_ai_recommendations(self, conditions, crop_info, pending_tasks):
         """AI-based task recommendation"""
         if len(conditions) < 6:
@@ -439,7 +627,7 @@ class RLWeeklyPlanner:
             return "general_care"
 
     def prioritize_pending_tasks(self, pending_tasks, conditions):
-        """Use RL to prioritize pending tasks"""
+        """Use RL to prioritize pending tasks (full ranking; daily plans use self.scheduler)"""
         if not pending_tasks:
             return []
             
@@ -452,32 +640,64 @@ class RLWeeklyPlanner:
                 task_data = {'task': task, 'priority': 'medium', 'days_pending': 0}
                 
             score = self.calculate_task_score(task_data, conditions)
-            days_pending = task_data.get('days_pending', 0)
-            
-            # RL-based urgency: increase score for older tasks
-            urgency_bonus = days_pending * 2
-            
-            # Priority multiplier
-            priority_multiplier = {
-                'urgent': 3.0,
-                'high': 2.0,
-                'medium': 1.5,
-                'low': 1.0
-            }.get(task_data.get('priority', 'medium'), 1.0)
-            
-            final_score = (score + urgency_bonus) * priority_multiplier
+            final_score = self.scheduler.priority_score(task_data, score)
             scored_tasks.append((final_score, task_data))
         
         # Sort by score (descending)
         scored_tasks.sort(key=lambda x: x[0], reverse=True)
         return [task for score, task in scored_tasks]
 
+    def get_ai_recommendations_many(self, conditions, crop_types):
+        """get_ai_recommendations over an (..., 6) conditions array; crop_types broadcasts against it"""
+        crop_age, temp, humidity, rain, soil_moisture, season = np.moveaxis(conditions, -1, 0)
+        
+        # Same rule order as get_ai_recommendations; the first matching rule wins
+        return np.select(
+            [
+                soil_moisture < 25,
+                rain > 10,
+                (20 <= crop_age) & (crop_age <= 40) & (crop_types == 'tomato'),
+                (35 <= crop_age) & (crop_age <= 55),
+                crop_age >= 70,
+                temp > 35,
+                temp < 10
+            ],
+            ['irrigation', 'drainage_check', 'fertilizer', 'pest_control', 'harvest',
+             'shade_management', 'frost_protection'],
+            default='general_care'
+        )
+
+    def calculate_task_scores_many(self, conditions):
+        """calculate_task_score for every task in task_config, shape (..., n_tasks) in task_index order"""
+        relevant = self.task_rules_many(conditions, task_relevance_rules)
+        weather_ok = self.task_rules_many(conditions, self.is_weather_appropriate_many)
+        return np.minimum(50 + 30 * relevant + 20 * weather_ok, 100)
+
+    def task_rules_many(self, conditions, rules):
+        """Stack rules(conditions) into a (..., n_tasks) mask; tasks without a rule pass"""
+        masks = rules(*np.moveaxis(conditions, -1, 0))
+        shape = conditions.shape[:-1]
+        return np.stack([np.broadcast_to(masks.get(task, True), shape) for task in self.task_index], axis=-1)
+
+    def is_weather_appropriate_many(self, crop_age, temp, humidity, rain, soil_moisture, season):
+        """is_weather_appropriate over condition arrays"""
+        return {
+            'irrigation': rain < 5,
+            'fertilizer': (rain < 3) & (temp < 35),
+            'pest_control': ~(rain > 10),
+            'harvest': rain < 2,
+            'pruning': ~((rain > 5) | (temp > 35)),
+            'drainage_check': rain > 5,
+            'shade_management': temp > 30,
+            'frost_protection': temp < 15
+        }
+
     def calculate_task_score(self, task, conditions):
         """Calculate RL score for task based on current conditions"""
         base_score = 50
         
         # Task relevance to current conditions
-        if self.is_task_still_relevant(task['task'], conditions):
+        if is_task_still_relevant(task['task'], conditions):
             base_score += 30
             
         # Weather appropriateness
@@ -486,28 +706,6 @@ class RLWeeklyPlanner:
             
         return min(base_score, 100)
 
-    def is_task_still_relevant(self, task, conditions):
-        """Check if task is still relevant"""
-        if len(conditions) < 6:
-            return True
-            
-        crop_age, temp, humidity, rain, soil_moisture, season = conditions
-        
-        task_rules = {
-            'irrigation': soil_moisture < 60,
-            'fertilizer': 15 <= crop_age <= 50 and rain < 5,
-            'pest_control': humidity > 70 or temp > 30,
-            'harvest': crop_age >= 70,
-            'weeding': True,
-            'pruning': 30 <= crop_age <= 80,
-            'general_care': True,
-            'drainage_check': rain > 5,
-            'shade_management': temp > 35,
-            'frost_protection': temp < 10
-        }
-        
-        return task_rules.get(task, True)
-
     def is_weather_appropriate(self, task, conditions):
         """Check if task is appropriate for weather"""
         if len(conditions) < 6:
@@ -552,110 +750,56 @@ class RLWeeklyPlanner:
         return reason_map.get(task, f"AI-optimized farming task for {crop_type} at day {crop_age}")
 
     def predict_conditions(self, current_conditions, day_offset):
-        """Predict conditions for future days (simplified)"""
-        if not current_conditions or len(current_conditions) < 6:
-            return [30 + day_offset, 25, 60, 0, 40, 2]
-            
-        crop_age, temp, humidity, rain, soil_moisture, season = current_conditions
-        
-        # Simple prediction model
-        predicted_conditions = [
-            crop_age + day_offset,  # Crop ages each day
-            temp + (np.random.random() - 0.5) * 4,  # Temp variation
-            max(30, min(90, humidity + (np.random.random() - 0.5) * 20)),  # Humidity variation
-            max(0, rain + (np.random.random() - 0.3) * 5),  # Rain variation
-            max(20, min(80, soil_moisture - 2 + (np.random.random() - 0.5) * 10)),  # Soil moisture
-            season  # Season remains same for the week
-        ]
-        
-        return predicted_conditions
-
-    def get_weekly_goals(self, current_stage, crop_type):
-        """Get weekly goals based on crop stage"""
-        goals = {
-            'germination': [
-                'Achieve 90% germination rate',
-                'Maintain optimal soil moisture',
-                'Prevent fungal diseases'
-            ],
-            'seedling': [
-                'Ensure strong root development',
-                'Prevent leggy growth',
-                'Begin light fertilization'
-            ],
-            'vegetative': [
-                'Promote leaf and stem growth',
-                'Apply nitrogen-rich fertilizer',
-                'Control weeds and pests'
-            ],
-            'flowering': [
-                'Ensure proper pollination',
-                'Apply phosphorus-rich fertilizer',
-                'Monitor for blossom drop'
-            ],
-            'fruiting': [
-                'Support fruit development',
-                'Maintain consistent watering',
-                'Prevent pest damage to fruits'
-            ],
-            'harvest': [
-                'Harvest at optimal ripeness',
-                'Proper post-harvest handling',
-                'Prepare for next cycle'
-            ]
-        }
-        
-        return goals.get(current_stage, [
-            'Monitor plant health',
-            'Adjust care as needed',
-            'Maintain optimal growing conditions'
-        ])
+        """Predict conditions for one future day (see condition_forecast for the noise model)"""
+        forecast = self.forecast.horizon(current_conditions, 1, self.rng, start=day_offset)
+        return as_condition_lists(current_conditions, forecast, start=day_offset)[0]
 
-    def update_task_completion(self, task_id, completed, completion_date=None):
-        """Update RL model with task completion data"""
+    def update_task_completion(self, task_id, completed, completion_date=None, farm_id=None):
+        """Update RL model with task completion data; returns the plan delta if the task is in a served plan"""
         if completion_date is None:
             completion_date = datetime.now()
-            
-        if task_id not in self.task_completion_history:
-            self.task_completion_history[task_id] = []
-            
-        self.task_completion_history[task_id].append({
-            'date': completion_date.isoformat(),
-            'completed': completed,
-            'timestamp': datetime.now().isoformat()
-        })
-
-    def postpone_task_with_rl(self, task_id, reason, current_conditions, crop_info):
-        """Postpone task with reinforcement learning optimization"""
-        # Find the task
-        task_to_postpone = None
-        for date_str, day_plan in self.weekly_plan.get('daily_plans', {}).items():
-            for task in day_plan.get('tasks', []):
-                if task.get('id') == task_id:
-                    task_to_postpone = task
-                    break
-            if task_to_postpone:
-                break
-        
-        if not task_to_postpone:
-            return False
-        
-        # Add postponement reason
-        task_to_postpone['postpone_reason'] = reason
-        task_to_postpone['postponed_at'] = datetime.now().isoformat()
-        
-        # Update RL model with negative reward for postponement
-        reward = -5  # Negative reward for postponing
-        
-        # Add to next day's pending tasks
-        next_day = datetime.now() + timedelta(days=1)
-        next_day_str = next_day.strftime('%Y-%m-%d')
         
-        print(f"🔄 Task '{task_to_postpone['task']}' postponed to tomorrow. Reason: {reason}")
-        return True
+        plan_delta = self.apply_task_change(task_id, 'completed' if completed else 'postponed', farm_id)
+        self.task_registry.record(
+            task_id,
+            'completed' if completed else 'not_completed',
+            farm_id,
+            date=completion_date.isoformat(),
+            completed=completed
+        )
+        return plan_delta
+
+    def postpone_task_with_rl(self, task_id, reason, current_conditions, crop_info, farm_id=None):
+        """Postpone a task of a served plan; returns the plan delta, or None if the task is unknown"""
+        plan_delta = self.apply_task_change(task_id, 'postponed', farm_id, reason)
+        if plan_delta is None:
+            return None
+        
+        self.task_registry.record(task_id, 'postponed', farm_id, reason=reason)
+        print(f"🔄 Task {task_id} postponed. Reason: {reason}")
+        return plan_delta
+
+    def apply_task_change(self, task_id, outcome, farm_id=None, reason=None):
+        """replan_from_change on the registered plan holding the task, keeping the registry index current"""
+        def change(entry):
+            plan_delta = self.replan_from_change(entry['plan'], task_id, outcome, reason, date_key=entry['date'])
+            if plan_delta is not None:
+                if outcome == 'postponed':
+                    entry['date'] = None  # until a later day picks it up again
+                self.task_registry.index_days(farm_id, entry['plan'], plan_delta['changed_dates'])
+            return plan_delta
+        
+        return self.task_registry.update_plan(task_id, change, farm_id)
 
 # Initialize weekly planner
-weekly_planner = RLWeeklyPlanner()
+weekly_planner = RLWeeklyPlanner(daily_capacity=float(os.environ.get('PLANNER_DAILY_HOURS', DEFAULT_DAILY_CAPACITY)))
+
+# Seeded, memoized plans for /api/weekly-plan; entries expire at midnight at the latest
+plan_cache = ResultCache(
+    maxsize=int(os.environ.get('PLAN_CACHE_SIZE', 8192)),
+    ttl=int(os.environ.get('PLAN_CACHE_TTL', 24 * 3600))
+)
+cached_planner = CachedWeeklyPlanner(weekly_planner, plan_cache)
 
 class FarmingAI:
     def __init__(self):
@@ -682,15 +826,11 @@ class FarmingAI:
     def detect_crop_from_image_basic(self, image_data):
         """Basic fallback crop detection"""
         try:
-            # Convert base64 to image
-            if image_data.startswith('data:image'):
-                image_data = image_data.split(',')[1]
-            
-            image_bytes = base64.b64decode(image_data)
-            image = Image.open(io.BytesIO(image_bytes))
+            # Decode at reduced resolution (aspect ratio preserved)
+            img_array = decode_to_rgb(image_data, max_side=max(ANALYSIS_SIZE))
             
             # Simple detection logic
-            width, height = image.size
+            height, width = img_array.shape[:2]
             aspect_ratio = width / height
             
             # Simple heuristics for demo
@@ -698,7 +838,6 @@ class FarmingAI:
                 detected_crop = 'rice'
             else:
                 # Check for red pixels (tomato fruits)
-                img_array = np.array(image)
                 red_pixels = np.sum((img_array[:, :, 0] > 150) & (img_array[:, :, 1] < 100) & (img_array[:, :, 2] < 100))
                 red_ratio = red_pixels / (width * height)
                 
@@ -814,10 +953,15 @@ def home():
         'message': '🌾 Unified Smart Farming API is running!',
         'endpoints': {
             'weather': 'GET /api/weather',
-            'detect_crop': 'POST /api/detect-crop (ENHANCED)',
+            'detect_crop': 'POST /api/detect-crop (ENHANCED; JSON base64, multipart or raw image body)',
+            'detect_crop_batch': 'POST /api/detect-crop/batch',
+            'detect_crop_cache': 'GET /api/detect-crop/cache',
             'manual_input': 'POST /api/manual-input', 
             'tomato_test': 'POST /api/tomato-test',
             'weekly_plan': 'POST /api/weekly-plan',
+            'weekly_plan_batch': 'POST /api/weekly-plan/batch',
+            'weekly_plan_cache': 'GET /api/weekly-plan/cache',
+            'weekly_plan_replan': 'POST /api/weekly-plan/replan',
             'detect_and_plan': 'POST /api/detect-and-plan'
         },
         'enhanced_system': True,
@@ -839,13 +983,15 @@ def get_weather():
 @app.route('/api/tomato-test', methods=['POST'])
 def tomato_test():
     """Special endpoint that always returns tomato for testing"""
-    data = request.get_json()
-    image_data = data.get('image', '')
+    try:
+        image_data, _ = request_image(request)
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Invalid upload: {str(e)}'})
     
     # Still analyze the image but force tomato result
     if image_data:
         try:
-            result = enhanced_detector.detect_crop_from_image(image_data)
+            result = cached_detector.detect_crop_from_image(image_data)
             result['detected_crop'] = 'tomato'
             result['crop_name'] = 'Tomato'
             result['confidence'] = 95.0
@@ -899,12 +1045,12 @@ def manual_input():
 def detect_and_plan():
     """Enhanced endpoint that returns both detection and weekly plan"""
     try:
-        data = request.get_json()
+        image_data, data = request_image(request)
         crop_info = {}
         
-        if 'image' in data:
+        if image_data is not None:
             # Image-based detection
-            result = enhanced_detector.detect_crop_from_image(data['image'])
+            result = cached_detector.detect_crop_from_image(image_data)
             if not result['success']:
                 return jsonify(result)
             crop_info = {
@@ -917,7 +1063,7 @@ def detect_and_plan():
             crop_info = {
                 'crop': data.get('crop', 'tomato'),
                 'growth_stage': data.get('growth_stage', 'vegetative'),
-                'days_estimate': data.get('daysSincePlanting', 30)
+                'days_estimate': int(data.get('daysSincePlanting', 30))
             }
         
         # Get current conditions
@@ -965,18 +1111,95 @@ def get_weekly_plan():
             'days_estimate': data.get('daysSincePlanting', 30)
         }
         
-        current_conditions = get_current_conditions()
+        current_conditions = data.get('conditions') or get_current_conditions()
         pending_tasks = data.get('pending_tasks', [])
         
-        weekly_plan = weekly_planner.generate_weekly_plan(
+        weekly_plan, cache_hit = cached_planner.generate_weekly_plan(
             crop_info, 
             current_conditions, 
-            pending_tasks
+            pending_tasks,
+            farm_id=data.get('farm_id')
         )
         
+        # Serve the farm's live plan for the week, so postponements and completions show up
+        weekly_plan = weekly_planner.task_registry.register_plan(weekly_plan, data.get('farm_id'))
+        
+        return jsonify({
+            'success': True,
+            'weekly_plan': weekly_plan,
+            'cache_hit': cache_hit
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@app.route('/api/weekly-plan/cache', methods=['GET'])
+def weekly_plan_cache_stats():
+    """Hit/miss counters of the weekly plan cache and size of the task registry"""
+    return jsonify({'success': True, 'cache': plan_cache.stats(), 'task_registry': weekly_planner.task_registry.stats()})
+
+@app.route('/api/weekly-plan/batch', methods=['POST'])
+def get_weekly_plan_batch():
+    """Weekly plans for many farms, streamed back as NDJSON (one line per farm, in input order).
+
+    Body: {"farms": [{"farm_id", "crop", "growth_stage", "daysSincePlanting",
+    "conditions", "pending_tasks"}, ...]}; crop fields may also be nested
+    under "crop_info" and conditions default to the current conditions.
+    """
+    data = request.get_json(silent=True) or {}
+    farms = data.get('farms') or []
+    
+    if not farms:
+        return jsonify({'success': False, 'error': 'No farms provided'})
+    
+    def records():
+        for farm in farms:
+            info = farm.get('crop_info') or farm
+            crop_info = {
+                'crop': info.get('crop', 'tomato'),
+                'growth_stage': info.get('growth_stage', 'vegetative'),
+                'days_estimate': info.get('days_estimate', info.get('daysSincePlanting', 30))
+            }
+            yield crop_info, farm.get('conditions') or get_current_conditions(), farm.get('pending_tasks', [])
+    
+    def generate():
+        print(f"🗓️ Batch weekly planning for {len(farms)} farms")
+        plans = weekly_planner.generate_weekly_plans(records())
+        try:
+            for index, (farm, weekly_plan) in enumerate(zip(farms, plans)):
+                yield json.dumps({
+                    'index': index,
+                    'farm_id': farm.get('farm_id'),
+                    'success': True,
+                    'weekly_plan': weekly_plan
+                }) + '\n'
+        except Exception as e:
+            print(f"❌ Batch planning error: {str(e)}")
+            yield json.dumps({'success': False, 'error': f'Batch planning failed: {str(e)}'}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/weekly-plan/replan', methods=['POST'])
+def replan_weekly_plan():
+    """Apply one task change to a weekly plan and return only the days that changed"""
+    try:
+        data = request.get_json()
+        
+        weekly_plan = data.get('weekly_plan')
+        outcome = data.get('outcome', 'completed')
+        if not weekly_plan or outcome not in ('completed', 'postponed'):
+            return jsonify({'success': False, 'error': "weekly_plan and an outcome of 'completed' or 'postponed' are required"})
+        
+        plan_delta = weekly_planner.replan_from_change(weekly_plan, data.get('task_id'), outcome, data.get('reason'))
+        if plan_delta is None:
+            return jsonify({'success': False, 'error': 'Task not found'})
+        
         return jsonify({
             'success': True,
-            'weekly_plan': weekly_plan
+            'plan_delta': plan_delta
         })
         
     except Exception as e:
@@ -995,18 +1218,31 @@ def update_task_status():
         completed = data.get('completed', False)
         task_data = data.get('task_data', {})
         
-        # Update RL model
-        weekly_planner.update_task_completion(task_id, completed)
+        # Update RL model and the served plan holding the task
+        plan_delta = weekly_planner.update_task_completion(task_id, completed, farm_id=data.get('farm_id'))
         
         # If task wasn't completed, add to pending
         if not completed and task_data:
             postpone_reason = data.get('postpone_reason', 'Not completed')
             print(f"Task {task_id} postponed: {postpone_reason}")
         
-        return jsonify({
+        # A task outside any served plan is re-planned on the client's copy instead
+        if plan_delta is None and data.get('weekly_plan'):
+            plan_delta = weekly_planner.replan_from_change(
+                data['weekly_plan'],
+                task_id,
+                'completed' if completed else 'postponed',
+                data.get('postpone_reason')
+            )
+        
+        response = {
             'success': True,
             'message': 'Task status updated'
-        })
+        }
+        if plan_delta is not None:
+            response['plan_delta'] = plan_delta
+        
+        return jsonify(response)
         
     except Exception as e:
         return jsonify({
@@ -1028,18 +1264,24 @@ def postpone_task():
         current_conditions = get_current_conditions()
         
         # Update weekly planner
-        success = weekly_planner.postpone_task_with_rl(
+        plan_delta = weekly_planner.postpone_task_with_rl(
             task_id, 
             postpone_reason, 
             current_conditions, 
-            crop_info
+            crop_info,
+            farm_id=data.get('farm_id')
         )
         
-        if success:
+        # A task outside any served plan is re-planned on the client's copy instead
+        if plan_delta is None and data.get('weekly_plan'):
+            plan_delta = weekly_planner.replan_from_change(data['weekly_plan'], task_id, 'postponed', postpone_reason)
+        
+        if plan_delta is not None:
             return jsonify({
                 'success': True,
                 'message': 'Task postponed successfully',
-                'carry_over': True
+                'carry_over': True,
+                'plan_delta': plan_delta
             })
         else:
             return jsonify({
@@ -1055,62 +1297,108 @@ def postpone_task():
     
 @app.route('/api/detect-crop', methods=['POST'])
 def detect_crop():
-    """Enhanced crop detection endpoint"""
+    """Enhanced crop detection endpoint (base64 JSON, multipart or raw image body)"""
+    try:
+        image_data, _ = request_image(request)
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Invalid upload: {str(e)}'})
+    if image_data is None:
+        return jsonify({'success': False, 'error': 'No image data provided'})
+    
     try:
-        data = request.get_json()
-        if not data or 'image' not in data:
-            return jsonify({'success': False, 'error': 'No image data provided'})
-        
         print("🚀 Using ENHANCED crop detector...")
         
         # Use the enhanced detector
-        result = enhanced_detector.detect_crop_from_image(data['image'])
-        
-        # Tomato-specific corrections
-        if result['success']:
-            analysis = result.get('analysis_details', {})
-            final_scores = analysis.get('final_scores', {})
-            
-            # Force tomato if analysis strongly suggests it
-            tomato_score = final_scores.get('tomato', 0)
-            rice_score = final_scores.get('rice', 0)
-            
-            if (result['detected_crop'] == 'rice' and tomato_score > rice_score):
-                result['detected_crop'] = 'tomato'
-                result['crop_name'] = 'Tomato'
-                result['confidence'] = max(result['confidence'], 80)
-                result['corrected'] = True
-                print("🔄 Corrected rice to tomato based on analysis scores")
-            
-            # Get recommendations and tasks
-            recommendations = farming_ai.get_recommendations(
-                result['detected_crop'], 
-                result['growth_stage'], 
-                result['days_estimate']
-            )
-            
-            tasks = farming_ai.generate_tasks(
-                result['detected_crop'],
-                result['days_estimate'], 
-                result['growth_stage']
-            )
-            
-            # Add to result
-            result['recommendations'] = recommendations
-            result['ai_tasks'] = {
-                'daily_checklist': tasks,
-                'pending_tasks': []
-            }
+        result = cached_detector.detect_crop_from_image(image_data)
         
-        return jsonify(result)
+        return jsonify(enrich_detection_result(result))
         
     except Exception as e:
         print(f"❌ Enhanced detection error: {str(e)}")
         # Fallback to basic detection
-        fallback_result = farming_ai.detect_crop_from_image_basic(data['image'])
+        fallback_result = farming_ai.detect_crop_from_image_basic(image_data)
         fallback_result['fallback_note'] = 'Using basic detection as fallback'
         return jsonify(fallback_result)
 
+def enrich_detection_result(result):
+    """Apply tomato corrections and attach recommendations/tasks to a detection result"""
+    # Tomato-specific corrections
+    if result['success']:
+        analysis = result.get('analysis_details', {})
+        final_scores = analysis.get('final_scores', {})
+        
+        # Force tomato if analysis strongly suggests it
+        tomato_score = final_scores.get('tomato', 0)
+        rice_score = final_scores.get('rice', 0)
+        
+        if (result['detected_crop'] == 'rice' and tomato_score > rice_score):
+            result['detected_crop'] = 'tomato'
+            result['crop_name'] = 'Tomato'
+            result['confidence'] = max(result['confidence'], 80)
+            result['corrected'] = True
+            print("🔄 Corrected rice to tomato based on analysis scores")
+        
+        # Get recommendations and tasks
+        recommendations = farming_ai.get_recommendations(
+            result['detected_crop'], 
+            result['growth_stage'], 
+            result['days_estimate']
+        )
+        
+        tasks = farming_ai.generate_tasks(
+            result['detected_crop'],
+            result['days_estimate'], 
+            result['growth_stage']
+        )
+        
+        # Add to result
+        result['recommendations'] = recommendations
+        result['ai_tasks'] = {
+            'daily_checklist': tasks,
+            'pending_tasks': []
+        }
+    
+    return result
+
+@app.route('/api/detect-crop/cache', methods=['GET'])
+def detect_crop_cache_stats():
+    """Hit/miss counters of the detection result cache"""
+    return jsonify({'success': True, 'cache': detection_cache.stats()})
+
+@app.route('/api/detect-crop/batch', methods=['POST'])
+def detect_crop_batch():
+    """Detect crops for many images in one request (JSON 'images' list or multipart 'images' files)"""
+    # Survey sessions are much larger than a single upload
+    request.max_content_length = app.config['BATCH_MAX_CONTENT_LENGTH']
+    
+    try:
+        if request.mimetype == 'multipart/form-data':
+            images = [upload.stream for upload in request.files.getlist('images')]
+        else:
+            data = request.get_json(silent=True) or {}
+            images = data.get('images') or []
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Invalid upload: {str(e)}'})
+    
+    if not images:
+        return jsonify({'success': False, 'error': 'No images provided'})
+    
+    try:
+        print(f"🚀 Batch detection: {len(images)} images on {batch_detector.workers} {batch_detector.mode} workers")
+        
+        results = [enrich_detection_result(result) for result in batch_detector.detect_many(images)]
+        
+        return jsonify({
+            'success': True,
+            'count': len(results),
+            'detected': sum(1 for result in results if result['success']),
+            'results': results
+        })
+        
+    except Exception as e:
+        print(f"❌ Batch detection error: {str(e)}")
+        return jsonify({'success': False, 'error': f'Batch detection failed: {str(e)}'})
+
 def get_current_conditions():
     """Get current farming conditions"""
     # In real implementation, get from sensors/weather API
@@ -1137,10 +1425,13 @@ if __name__ == '__main__':
     print("🌱 Available endpoints:")
     print("   - GET  /api/weather")
     print("   - POST /api/detect-crop (ENHANCED)")
+    print("   - POST /api/detect-crop/batch")
+    print("   - GET  /api/detect-crop/cache")
     print("   - POST /api/tomato-test (testing)")
     print("   - POST /api/manual-input")
     print("   - POST /api/detect-and-plan (WITH WEEKLY PLANNING)")
     print("   - POST /api/weekly-plan")
+    print("   - POST /api/weekly-plan/batch")
     print("   - POST /api/update-task-status")
     print("   - POST /api/postpone-task")
     print("\n🎯 Features restored:")
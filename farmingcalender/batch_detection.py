@@ -0,0 +1,100 @@
+# batch_detection.py
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+# Detector owned by each worker process in 'process' mode
+_worker_detector = None
+
+
+def _init_worker(detector):
+    global _worker_detector
+    _worker_detector = detector
+
+
+def _detect_in_worker(image_data):
+    return _worker_detector.detect_crop_from_image(image_data)
+
+
+class BatchDetector:
+    """Runs crop detection for many images on a bounded worker pool.
+
+    'thread' mode shares one detector across threads; the OpenCV calls release
+    the GIL. 'process' mode gives every worker process its own detector for
+    full core scaling. At most max_in_flight images are submitted at once and
+    results are yielded in input order. With a CachedDetector, repeated images
+    are answered from its cache without reaching the pool.
+    """
+
+    def __init__(self, detector, workers=None, max_in_flight=None, mode='thread', cached=None):
+        if mode not in ('thread', 'process'):
+            raise ValueError(f"Unknown batch mode: {mode}")
+
+        self.detector = detector
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or self.workers * 2
+        self.mode = mode
+        self.cached = cached
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.mode == 'process':
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_worker,
+                    initargs=(self.detector,)
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix='crop-detect'
+                )
+        return self._executor
+
+    def _submit(self, executor, image_data):
+        if self.mode == 'process':
+            # File objects cannot cross the process boundary
+            if hasattr(image_data, 'read'):
+                if image_data.seekable():
+                    image_data.seek(0)
+                image_data = image_data.read()
+            return executor.submit(_detect_in_worker, image_data)
+
+        return executor.submit(self.detector.detect_crop_from_image, image_data)
+
+    def _collect(self, key, future):
+        result = future.result()
+        # Cache before the caller gets a chance to modify the result
+        if key is not None:
+            self.cached.store(key, result)
+        return result
+
+    def detect_many(self, images):
+        """Yield one detection result per image, in input order"""
+        executor = self._get_executor()
+        in_flight = deque()  # (cache key or None, future)
+
+        for image_data in images:
+            if len(in_flight) >= self.max_in_flight:
+                yield self._collect(*in_flight.popleft())
+
+            key = None
+            if self.cached is not None:
+                key, image_data, result = self.cached.lookup(image_data)
+                if result is not None:
+                    result['cache_hit'] = True
+                    done = Future()
+                    done.set_result(result)
+                    in_flight.append((None, done))
+                    continue
+
+            in_flight.append((key, self._submit(executor, image_data)))
+
+        while in_flight:
+            yield self._collect(*in_flight.popleft())
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,101 @@
+# color_engine.py
+import cv2
+import numpy as np
+
+
+class ColorProfileEngine:
+    """Counts pixels for every HSV color profile in a single pass over the image.
+
+    Each profile is an inclusive HSV box (same semantics as cv2.inRange). The
+    boxes are compiled once into per-channel lookup tables that map a channel
+    value to the bitmask of boxes containing it, so a pixel's membership in
+    every profile is lut_h[h] & lut_s[s] & lut_v[v]. Identical boxes share a bit.
+    """
+
+    MAX_RANGES = 32
+
+    def __init__(self, crop_features, extra_ranges=None):
+        self.ranges = []          # unique (lower, upper) boxes, index == bit
+        self.profile_bits = {}    # crop -> {color_name: bit}
+        self.named_bits = {}      # extra range name -> bit
+
+        for crop_name, features in crop_features.items():
+            self.profile_bits[crop_name] = {
+                color_name: self._register(color_range)
+                for color_name, color_range in features['color_profiles'].items()
+            }
+
+        for name, color_range in (extra_ranges or {}).items():
+            self.named_bits[name] = self._register(color_range)
+
+        self._compile()
+
+    def _register(self, color_range):
+        box = (tuple(int(v) for v in color_range['lower']),
+               tuple(int(v) for v in color_range['upper']))
+        if box in self.ranges:
+            return self.ranges.index(box)
+        if len(self.ranges) >= self.MAX_RANGES:
+            raise ValueError(f"Too many distinct color ranges (max {self.MAX_RANGES})")
+        self.ranges.append(box)
+        return len(self.ranges) - 1
+
+    def _compile(self):
+        n = len(self.ranges)
+        if n <= 8:
+            self.code_dtype = np.uint8
+        elif n <= 16:
+            self.code_dtype = np.uint16
+        else:
+            self.code_dtype = np.uint32
+
+        # One table per channel, indexed by the 8-bit channel value
+        self.lut = np.zeros((3, 256), dtype=self.code_dtype)
+        values = np.arange(256)
+        for bit, (lower, upper) in enumerate(self.ranges):
+            for channel in range(3):
+                inside = (values >= lower[channel]) & (values <= upper[channel])
+                self.lut[channel, inside] |= self.code_dtype(1 << bit)
+
+        # cv2.LUT applies all three 8-bit tables in one call
+        self._cv_lut = self.lut.T.reshape(256, 1, 3).copy() if n <= 8 else None
+
+        # Which bits are set for each possible code (only used for 8/16-bit codes)
+        if n <= 16:
+            codes = np.arange(1 << (8 * np.dtype(self.code_dtype).itemsize), dtype=np.int64)
+            self._code_bits = ((codes[:, None] >> np.arange(n)) & 1).astype(np.int64)
+        else:
+            self._code_bits = None
+
+    def pixel_codes(self, hsv):
+        """Per-pixel bitmask of the profiles each pixel falls into"""
+        if self._cv_lut is not None:
+            mapped = cv2.LUT(hsv, self._cv_lut)
+            return cv2.bitwise_and(cv2.bitwise_and(mapped[:, :, 0], mapped[:, :, 1]), mapped[:, :, 2])
+
+        return self.lut[0][hsv[:, :, 0]] & self.lut[1][hsv[:, :, 1]] & self.lut[2][hsv[:, :, 2]]
+
+    def count(self, hsv):
+        """Pixel count for every compiled range, indexed by bit"""
+        codes = self.pixel_codes(hsv)
+
+        if self._code_bits is not None:
+            histogram = np.bincount(codes.ravel(), minlength=self._code_bits.shape[0])
+            return histogram @ self._code_bits
+
+        return np.array([np.count_nonzero(codes & self.code_dtype(1 << bit))
+                         for bit in range(len(self.ranges))], dtype=np.int64)
+
+    def fractions(self, hsv):
+        """Fraction of pixels inside every compiled range, indexed by bit"""
+        return self.count(hsv) / (hsv.shape[0] * hsv.shape[1])
+
+    def profile_fractions(self, hsv, fractions=None):
+        """Map fractions back onto {crop: {color_name: fraction}}"""
+        if fractions is None:
+            fractions = self.fractions(hsv)
+
+        return {
+            crop_name: {color_name: float(fractions[bit]) for color_name, bit in bits.items()}
+            for crop_name, bits in self.profile_bits.items()
+        }
@@ -0,0 +1,110 @@
+# condition_forecast.py
+import numpy as np
+
+# Forecast for farms without a full set of current conditions
+DEFAULT_CONDITIONS = [30, 25, 60, 0, 40, 2]
+
+# Bounds the forecast clamps to, by condition column
+CLAMP_BOUNDS = {2: (30, 90), 3: (0,), 4: (20, 80)}
+
+
+class ConditionForecast:
+    """Noise model behind the planners' predict_conditions, for a whole horizon at once.
+
+    Conditions are (crop_age, temperature, humidity, rain, soil_moisture,
+    season). For day offset d a forecast is
+
+        crop_age + d
+        temperature + (u - 0.5) * temp_spread
+        clip(humidity + (u - 0.5) * humidity_spread, 30, 90)
+        max(0, rain + (u - rain_bias) * rain_spread)
+        clip(soil_moisture - soil_drop - soil_drop_per_day * d + (u - 0.5) * soil_spread, 20, 80)
+        season
+
+    with u drawn uniformly from the Generator passed in, so a seeded
+    Generator gives a reproducible forecast.
+    """
+
+    def __init__(self, temp_spread=4, humidity_spread=20, rain_bias=0.3, rain_spread=5,
+                 soil_spread=10, soil_drop=2, soil_drop_per_day=0):
+        self.temp_spread = temp_spread
+        self.humidity_spread = humidity_spread
+        self.rain_bias = rain_bias
+        self.rain_spread = rain_spread
+        self.soil_spread = soil_spread
+        self.soil_drop = soil_drop
+        self.soil_drop_per_day = soil_drop_per_day
+
+    def horizon(self, current_conditions, days=7, rng=None, start=0):
+        """(days, 6) forecast of one farm for day offsets start..start+days-1"""
+        return self.horizon_many([current_conditions], days, rng, start)[0]
+
+    def horizon_many(self, farms, days=7, rng=None, start=0):
+        """(farms, days, 6) forecast for a list of farms' current conditions.
+
+        Farms whose conditions are missing or short get DEFAULT_CONDITIONS
+        aged by the day offset, without noise. Noise is drawn farm by farm, so
+        with the same Generator state the result matches calling horizon()
+        for each farm in turn.
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+
+        if isinstance(farms, np.ndarray) and farms.ndim == 2:
+            # Already an (n, 6) array, e.g. from the season simulator
+            n = len(farms)
+            valid = np.ones(n, dtype=bool)
+            base = farms[:, None, :6].astype(np.float64)
+        else:
+            n = len(farms)
+            valid = np.array([has_conditions(current) for current in farms], dtype=bool)
+            base = np.array([list(current[:6]) if ok else DEFAULT_CONDITIONS for current, ok in zip(farms, valid)],
+                            dtype=np.float64).reshape(n, 1, 6)
+        day_offset = np.arange(start, start + days, dtype=np.float64)
+        noise = rng.random((n, days, 4))
+
+        forecast = np.empty((n, days, 6))
+        forecast[..., 0] = base[..., 0] + day_offset
+        forecast[..., 1] = base[..., 1] + (noise[..., 0] - 0.5) * self.temp_spread
+        forecast[..., 2] = np.clip(base[..., 2] + (noise[..., 1] - 0.5) * self.humidity_spread, 30, 90)
+        forecast[..., 3] = np.maximum(0, base[..., 3] + (noise[..., 2] - self.rain_bias) * self.rain_spread)
+        forecast[..., 4] = np.clip(base[..., 4] - self.soil_drop - self.soil_drop_per_day * day_offset
+                                   + (noise[..., 3] - 0.5) * self.soil_spread, 20, 80)
+        forecast[..., 5] = base[..., 5]
+
+        if not valid.all():
+            defaults = np.array(DEFAULT_CONDITIONS, dtype=np.float64) + np.outer(day_offset, [1, 0, 0, 0, 0, 0])
+            forecast[~valid] = defaults
+
+        return forecast
+
+
+def has_conditions(current):
+    return current is not None and len(current) >= 6
+
+
+def as_condition_lists(current_conditions, forecast, start=0):
+    """One farm's (days, 6) forecast as plain lists, the form predict_conditions returns.
+
+    Crop age and season keep the caller's values and types, and clamped
+    values are the int bounds, so plan JSON and task reasons read the same
+    as before ("20%" rather than "20.0%").
+    """
+    rows = forecast.tolist()
+    valid = has_conditions(current_conditions)
+    for day, row in enumerate(rows):
+        day_offset = start + day
+        if not valid:
+            rows[day] = [DEFAULT_CONDITIONS[0] + day_offset] + DEFAULT_CONDITIONS[1:]
+            continue
+        row[0] = current_conditions[0] + day_offset
+        row[5] = current_conditions[5]
+        for column, bounds in CLAMP_BOUNDS.items():
+            if row[column] in bounds:
+                row[column] = int(row[column])
+    return rows
+
+
+# Noise models of the existing planners
+SIMPLE_FORECAST = ConditionForecast()  # app.py and enhanced_planner.py
+VARIED_FORECAST = ConditionForecast(temp_spread=6, humidity_spread=30, rain_bias=0.4, rain_spread=8,
+                                    soil_spread=15, soil_drop=0, soil_drop_per_day=1)  # crop_detector.py
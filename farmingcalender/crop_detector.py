@@ -1,22 +1,30 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import numpy as np
-import base64
-import io
-from PIL import Image
 from datetime import datetime, timedelta
 import random
 import json
+import os
+import threading
 import cv2
+from color_engine import ColorProfileEngine
+from analysis_context import ImageAnalysisContext
+from shape_features import (CIRCULARITY_BIN_EDGES, band_counts, circularity_histogram,
+                            substantial_circularity)
+from image_ingest import ANALYSIS_SIZE, decode_thumbnail, decode_to_bgr, request_image
+from rl_weekly_planner import RLWeeklyPlanner
+from task_scheduler import DEFAULT_DAILY_CAPACITY
 
 app = Flask(__name__)
+# Upper bound for image uploads (JSON, multipart or raw body)
+app.config['MAX_CONTENT_LENGTH'] = 32 * 1024 * 1024
 # Fix CORS - allow all origins and methods
 CORS(app, origins=["http://localhost:5002", "http://127.0.0.1:5002"], methods=["GET", "POST", "PUT", "DELETE"], allow_headers=["Content-Type"])
 
 print("🚀 Starting Unified Smart Farming Backend on Port 5002...")
 
 class AdvancedCropDetector:
-    def __init__(self):
+    def __init__(self, cascade=False, cascade_size=64, cascade_margin=10):
         self.crop_features = {
             'tomato': {
                 'color_profiles': {
@@ -42,39 +50,56 @@ class AdvancedCropDetector:
                 }
             }
         }
+        
+        # Ranges used by the tomato check and growth stage detection
+        self.stage_color_ranges = {
+            'red_fruit': {'lower': [0, 100, 100], 'upper': [10, 255, 255]},
+            'yellow_flower': {'lower': [20, 100, 100], 'upper': [30, 255, 255]}
+        }
+        
+        # Compile color profiles into HSV lookup tables once at startup
+        self.color_engine = ColorProfileEngine(self.crop_features, self.stage_color_ranges)
+        
+        # Coarse-to-fine mode: score a cascade_size thumbnail first and only run
+        # the full-resolution analysis when the top two final scores are closer
+        # than cascade_margin
+        self.cascade = cascade
+        self.cascade_size = (cascade_size, cascade_size)
+        self.cascade_margin = cascade_margin
     
     def detect_crop_from_image(self, image_data):
         try:
             print("🔍 Starting enhanced crop detection...")
             
-            # Convert base64 to image
-            if isinstance(image_data, str) and image_data.startswith('data:image'):
-                image_data = image_data.split(',')[1]
-            
-            image_bytes = base64.b64decode(image_data)
-            image = Image.open(io.BytesIO(image_bytes))
-            opencv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+            decision_level = 'full'
+            cascade_details = None
+            full_image = None
+            
+            if self.cascade:
+                thumbnail_image, full_image = decode_thumbnail(image_data, self.cascade_size, ANALYSIS_SIZE)
+                thumbnail = self.analyze_at(thumbnail_image, self.cascade_size)
+                margin = self.score_margin(thumbnail[3])
+                cascade_details = {
+                    'thumbnail_size': list(self.cascade_size),
+                    'thumbnail_margin': round(margin, 4),
+                    'margin_threshold': self.cascade_margin,
+                    'thumbnail_ms': thumbnail[0].report()['total_ms']
+                }
+                if margin >= self.cascade_margin:
+                    decision_level = 'thumbnail'
+                    analysis = thumbnail
             
-            # Preprocess image
-            processed_image = self.preprocess_image(opencv_image)
+            if decision_level == 'full':
+                if full_image is None:
+                    # Decode straight to the analysis resolution
+                    full_image = decode_to_bgr(image_data, ANALYSIS_SIZE)
+                analysis = self.analyze_at(full_image, ANALYSIS_SIZE)
             
-            # Multiple analysis methods
-            color_scores = self.analyze_colors(processed_image)
-            shape_scores = self.analyze_shapes(processed_image)
+            context, color_scores, shape_scores, final_scores = analysis
             
             print(f"🎨 Color scores: {color_scores}")
             print(f"📐 Shape scores: {shape_scores}")
-            
-            # FIXED: Proper confidence calculation as percentage
-            final_scores = {}
-            for crop in ['tomato', 'rice', 'chili']:
-                color_score = color_scores.get(crop, 0)
-                shape_score = shape_scores.get(crop, 0)
-                # Normalize to percentage (0-100%)
-                normalized_score = (color_score * 0.7) + (shape_score * 0.3)
-                final_scores[crop] = min(normalized_score * 100, 100)  # Convert to percentage
-            
-            print(f"📊 Final scores: {final_scores}")
+            print(f"📊 Final scores ({decision_level}): {final_scores}")
             
             # Get best match
             detected_crop = max(final_scores.items(), key=lambda x: x[1])[0]
@@ -84,7 +109,7 @@ class AdvancedCropDetector:
             confidence = min(max(confidence, 0), 100)
             
             # Tomato-specific verification
-            if detected_crop == 'rice' and self.has_tomato_features(processed_image):
+            if detected_crop == 'rice' and self.has_tomato_features(context):
                 print("🔄 Correcting rice to tomato - tomato features detected")
                 detected_crop = 'tomato'
                 confidence = max(confidence, 80)  # 80% confidence
@@ -98,15 +123,20 @@ class AdvancedCropDetector:
                 'success': True,
                 'detected_crop': detected_crop,
                 'crop_name': self.get_crop_name(detected_crop),
-                'growth_stage': self.detect_growth_stage(processed_image, detected_crop),
+                'growth_stage': self.detect_growth_stage(context, detected_crop),
                 'days_estimate': self.estimate_days(detected_crop),
                 'confidence': round(confidence, 1),  # Now shows percentage
+                'decision_level': decision_level,
                 'analysis_details': {
                     'color_scores': color_scores,
                     'shape_scores': shape_scores,
-                    'final_scores': final_scores
+                    'final_scores': final_scores,
+                    'shape_features': self.shape_features(context),
+                    'pipeline': context.report()
                 }
             }
+            if cascade_details is not None:
+                result['analysis_details']['cascade'] = cascade_details
             
             print(f"✅ Detection complete: {result['detected_crop']} with {result['confidence']}% confidence")
             return result
@@ -115,10 +145,39 @@ class AdvancedCropDetector:
             print(f"❌ Detection error: {str(e)}")
             return {'success': False, 'error': f'Detection failed: {str(e)}'}
     
-    def preprocess_image(self, image):
+    def analyze_at(self, opencv_image, size):
+        """Preprocess and score a decoded image at the given (width, height)"""
+        processed_image = self.preprocess_image(opencv_image, size)
+        
+        # Shared per-image artifacts (HSV, edges, contours...) for every stage
+        context = ImageAnalysisContext(processed_image, self.color_engine)
+        
+        # Multiple analysis methods
+        color_scores = self.analyze_colors(context)
+        shape_scores = self.analyze_shapes(context)
+        
+        # FIXED: Proper confidence calculation as percentage
+        final_scores = {}
+        for crop in ['tomato', 'rice', 'chili']:
+            color_score = color_scores.get(crop, 0)
+            shape_score = shape_scores.get(crop, 0)
+            # Normalize to percentage (0-100%)
+            normalized_score = (color_score * 0.7) + (shape_score * 0.3)
+            final_scores[crop] = min(normalized_score * 100, 100)  # Convert to percentage
+        
+        return context, color_scores, shape_scores, final_scores
+    
+    @staticmethod
+    def score_margin(final_scores):
+        """Gap between the best and the runner-up crop score"""
+        best, runner_up = sorted(final_scores.values(), reverse=True)[:2]
+        return best - runner_up
+    
+    def preprocess_image(self, image, size=ANALYSIS_SIZE):
         """Enhance image for better detection"""
-        # Resize for consistency
-        image = cv2.resize(image, (400, 400))
+        # Resize for consistency (no-op for images decoded at the target size)
+        if image.shape[1::-1] != tuple(size):
+            image = cv2.resize(image, tuple(size))
         
         # Enhance contrast
         lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
@@ -128,17 +187,16 @@ class AdvancedCropDetector:
         return image
     
     def analyze_colors(self, image):
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        context = ImageAnalysisContext.wrap(image, self.color_engine)
         scores = {}
         
+        # One lookup-table pass gives the pixel share of every profile
+        fractions = context.profile_fractions()
+        
         for crop_name, features in self.crop_features.items():
             crop_score = 0
-            for color_name, color_range in features['color_profiles'].items():
-                lower = np.array(color_range['lower'])
-                upper = np.array(color_range['upper'])
-                mask = cv2.inRange(hsv, lower, upper)
-                
-                percentage = np.sum(mask > 0) / (hsv.shape[0] * hsv.shape[1])
+            for color_name in features['color_profiles']:
+                percentage = fractions[crop_name][color_name]
                 
                 # Reasonable weights for percentage calculation
                 if 'fruit' in color_name or 'flower' in color_name:
@@ -151,63 +209,40 @@ class AdvancedCropDetector:
         return scores
     
     def analyze_shapes(self, image):
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        edges = cv2.Canny(blurred, 50, 150)
-        
-        # Find contours
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        context = ImageAnalysisContext.wrap(image, self.color_engine)
         
-        scores = {'tomato': 0, 'rice': 0, 'chili': 0}
+        # Circularity of every substantial contour, computed in bulk
+        circularity = substantial_circularity(context.contour_stats, context.min_contour_area)
+        bands = band_counts(circularity)
         
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            if area < 100:  # Filter small contours
-                continue
-                
-            # Shape analysis
-            perimeter = cv2.arcLength(contour, True)
-            if perimeter > 0:
-                circularity = 4 * np.pi * area / (perimeter * perimeter)
-                
-                # Tomato-like shapes (round fruits)
-                if 0.7 < circularity < 1.2:
-                    scores['tomato'] += 20
-                # Rice-like shapes (long thin shapes)
-                elif circularity < 0.3:
-                    scores['rice'] += 15
-                # Chili-like shapes (elongated)
-                elif 0.3 < circularity < 0.6:
-                    scores['chili'] += 15
-        
-        return scores
+        # Round fruits score for tomato, long thin shapes for rice, elongated for chili
+        return {
+            'tomato': bands['tomato'] * 20,
+            'rice': bands['rice'] * 15,
+            'chili': bands['chili'] * 15
+        }
+    
+    def shape_features(self, image):
+        """Circularity distribution of the substantial contours as a feature vector"""
+        context = ImageAnalysisContext.wrap(image, self.color_engine)
+        circularity = substantial_circularity(context.contour_stats, context.min_contour_area)
+        return {
+            'contour_count': int(circularity.size),
+            'circularity_bins': CIRCULARITY_BIN_EDGES.tolist(),
+            'circularity_histogram': circularity_histogram(circularity)
+        }
     
     def has_tomato_features(self, image):
         """Check for distinctive tomato features"""
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        context = ImageAnalysisContext.wrap(image, self.color_engine)
         
         # Look for red fruits (tomato distinctive feature)
-        red_lower = np.array([0, 100, 100])
-        red_upper = np.array([10, 255, 255])
-        red_mask = cv2.inRange(hsv, red_lower, red_upper)
-        red_percentage = np.sum(red_mask > 0) / (hsv.shape[0] * hsv.shape[1])
-        
-        # Look for round shapes using contour analysis
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        edges = cv2.Canny(blurred, 50, 150)
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        has_round_objects = False
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            if area > 100:  # Only consider substantial objects
-                perimeter = cv2.arcLength(contour, True)
-                if perimeter > 0:
-                    circularity = 4 * np.pi * area / (perimeter * perimeter)
-                    if circularity > 0.7:  # Round shape
-                        has_round_objects = True
-                        break
+        red_percentage = context.range_fraction('red_fruit')
+        
+        # Look for round shapes among substantial contours
+        stats = context.contour_stats
+        substantial = (stats['area'] > context.min_contour_area) & (stats['perimeter'] > 0)
+        has_round_objects = bool(np.any(stats['circularity'][substantial] > 0.7))
         
         has_red_fruits = red_percentage > 0.005  # Even small amount of red
         
@@ -215,16 +250,14 @@ class AdvancedCropDetector:
         return has_red_fruits or has_round_objects
     
     def detect_growth_stage(self, image, crop):
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        context = ImageAnalysisContext.wrap(image, self.color_engine)
         
         if crop == 'tomato':
             # Check for red fruits (harvest stage)
-            red_mask = cv2.inRange(hsv, np.array([0, 100, 100]), np.array([10, 255, 255]))
-            red_percentage = np.sum(red_mask > 0) / (hsv.shape[0] * hsv.shape[1])
+            red_percentage = context.range_fraction('red_fruit')
             
             # Check for flowers
-            yellow_mask = cv2.inRange(hsv, np.array([20, 100, 100]), np.array([30, 255, 255]))
-            yellow_percentage = np.sum(yellow_mask > 0) / (hsv.shape[0] * hsv.shape[1])
+            yellow_percentage = context.range_fraction('yellow_flower')
             
             if red_percentage > 0.01:
                 return 'harvest'
@@ -256,445 +289,44 @@ enhanced_detector = AdvancedCropDetector()
 
 # ============ IMPROVED WEEKLY PLANNER WITH REAL RL ============
 
-class RLWeeklyPlanner:
-    def __init__(self):
-        self.task_completion_history = {}
-        self.q_table = {}  # Q-learning table
-        self.learning_rate = 0.1
-        self.discount_factor = 0.9
-        self.exploration_rate = 0.3
-        
-        self.task_config = {
-            'irrigation': {'priority': 1, 'duration': 2, 'max_delay': 2},
-            'fertilizer': {'priority': 2, 'duration': 1, 'max_delay': 3},
-            'pest_control': {'priority': 1, 'duration': 1, 'max_delay': 1},
-            'harvest': {'priority': 1, 'duration': 3, 'max_delay': 0},
-            'pruning': {'priority': 3, 'duration': 2, 'max_delay': 5},
-            'weeding': {'priority': 2, 'duration': 2, 'max_delay': 4},
-            'general_care': {'priority': 4, 'duration': 1, 'max_delay': 7},
-            'drainage_check': {'priority': 1, 'duration': 1, 'max_delay': 1},
-            'shade_management': {'priority': 2, 'duration': 1, 'max_delay': 2},
-            'frost_protection': {'priority': 1, 'duration': 1, 'max_delay': 1}
-        }
-        
-        # Task sequences for different crops and stages
-        self.crop_task_sequences = {
-            'tomato': {
-                'vegetative': ['irrigation', 'fertilizer', 'weeding', 'general_care'],
-                'flowering': ['irrigation', 'pest_control', 'pruning', 'general_care'],
-                'fruiting': ['irrigation', 'pest_control', 'general_care'],
-                'harvest': ['harvest', 'irrigation', 'general_care']
-            },
-            'rice': {
-                'vegetative': ['irrigation', 'fertilizer', 'weeding'],
-                'flowering': ['irrigation', 'pest_control', 'drainage_check'],
-                'harvest': ['harvest', 'drainage_check']
-            },
-            'chili': {
-                'vegetative': ['irrigation', 'fertilizer', 'weeding'],
-                'flowering': ['irrigation', 'pest_control', 'general_care'],
-                'fruiting': ['irrigation', 'harvest', 'general_care']
-            }
-        }
-    
-    def get_state_key(self, state):
-        """Convert state to hashable key for Q-table"""
-        return tuple(state)
-    
-    def choose_action(self, state, possible_actions):
-        """Choose action using epsilon-greedy policy (Real RL)"""
-        state_key = self.get_state_key(state)
-        
-        if state_key not in self.q_table:
-            self.q_table[state_key] = {action: 0 for action in possible_actions}
-        
-        # Exploration vs Exploitation
-        if np.random.random() < self.exploration_rate:
-            return np.random.choice(possible_actions)
-        else:
-            return max(self.q_table[state_key], key=self.q_table[state_key].get)
-    
-    def update_q_value(self, state, action, reward, next_state):
-        """Update Q-value using Q-learning algorithm"""
-        state_key = self.get_state_key(state)
-        next_state_key = self.get_state_key(next_state)
-        
-        # Initialize if states don't exist
-        if state_key not in self.q_table:
-            self.q_table[state_key] = {action: 0}
-        if next_state_key not in self.q_table:
-            self.q_table[next_state_key] = {action: 0 for action in self.task_config.keys()}
-        
-        # Q-learning update formula
-        current_q = self.q_table[state_key].get(action, 0)
-        max_next_q = max(self.q_table[next_state_key].values()) if self.q_table[next_state_key] else 0
-        
-        new_q = current_q + self.learning_rate * (reward + self.discount_factor * max_next_q - current_q)
-        self.q_table[state_key][action] = new_q
-        
-        print(f"🤖 RL Update: State {state_key}, Action {action}, Reward {reward}, New Q-value: {new_q}")
-    
-    def calculate_reward(self, task, conditions, outcome):
-        """Calculate reward based on task performance and conditions"""
-        base_reward = 0
-        
-        if outcome == 'completed':
-            base_reward += 10
-        elif outcome == 'postponed':
-            base_reward -= 5
-        
-        # Reward for weather-appropriate tasks
-        if self.is_weather_appropriate(task, conditions):
-            base_reward += 3
-        
-        # Reward for stage-appropriate tasks
-        crop_age = conditions[0]
-        if self.is_stage_appropriate(task, crop_age):
-            base_reward += 2
-        
-        return base_reward
-    
-    def generate_weekly_plan(self, crop_info, current_conditions, pending_tasks=None):
-        """Generate unified weekly plan with RL optimization"""
-        if pending_tasks is None:
-            pending_tasks = []
-            
-        crop_type = crop_info.get('crop', 'tomato')
-        current_stage = crop_info.get('growth_stage', 'vegetative')
-        days_since_planting = crop_info.get('days_estimate', 30)
-        
-        # Get today's date
-        today = datetime.now()
-        
-        weekly_plan = {
-            'crop': crop_type,
-            'current_stage': current_stage,
-            'days_since_planting': days_since_planting,
-            'generated_date': today.isoformat(),
-            'week_start': today.strftime('%Y-%m-%d'),
-            'daily_plans': {},
-            'carry_over_tasks': [],
-            'weekly_goals': self.get_weekly_goals(current_stage, crop_type),
-            'week_summary': [],
-            'rl_used': True  # Indicate RL was used
-        }
-        
-        current_pending = pending_tasks.copy()
-        
-        # Generate plan for next 7 days with varied tasks
-        for day_offset in range(7):
-            day_date = today + timedelta(days=day_offset)
-            day_plan = self.generate_unified_daily_plan(
-                day_date, 
-                current_conditions, 
-                crop_info,
-                current_pending,
-                day_offset
-            )
-            
-            weekly_plan['daily_plans'][day_date.strftime('%Y-%m-%d')] = day_plan
-            
-            # Update pending tasks for next day
-            current_pending = day_plan.get('postponed_tasks', [])
-            
-            # Add to unified week summary
-            weekly_plan['week_summary'].append({
-                'date': day_date.strftime('%Y-%m-%d'),
-                'day_name': day_date.strftime('%A'),
-                'is_today': day_offset == 0,
-                'main_task': day_plan.get('main_task', {}),
-                'additional_tasks': day_plan.get('additional_tasks', []),
-                'postponed_count': len(day_plan.get('postponed_tasks', [])),
-                'total_duration': day_plan.get('total_duration', 0),
-                'single_line_display': self.format_single_line_tasks(day_plan.get('tasks', []), day_date)
-            })
-        
-        weekly_plan['carry_over_tasks'] = current_pending
-        return weekly_plan
-
-    def generate_unified_daily_plan(self, date, conditions, crop_info, pending_tasks, day_offset):
-        """Generate daily plan with RL-optimized task selection"""
-        # Adjust conditions for future days
-        adjusted_conditions = self.predict_conditions(conditions, day_offset)
-        
-        # Get AI recommendations for this day using RL
-        ai_recommendations = self.get_ai_recommendations_with_rl(adjusted_conditions, crop_info, pending_tasks, day_offset)
-        
-        # Convert to task format
-        main_task = {
-            'id': f"main_{date.strftime('%Y%m%d')}",
-            'task': ai_recommendations,
-            'type': 'ai_recommendation',
-            'priority': 'high',
-            'reason': self.get_task_reason(ai_recommendations, adjusted_conditions, crop_info, day_offset),
-            'estimated_duration': self.task_config.get(ai_recommendations, {}).get('duration', 1),
-            'is_carry_over': False,
-            'rl_confidence': self.get_rl_confidence(adjusted_conditions, ai_recommendations)  # RL confidence score
-        }
-        
-        # Process pending tasks with RL prioritization
-        processed_pending = self.prioritize_pending_tasks_with_rl(pending_tasks, adjusted_conditions)
-        
-        # Separate carry-over tasks
-        carry_over_tasks = [task for task in processed_pending if task.get('is_carry_over', False)]
-        new_additional_tasks = [task for task in processed_pending if not task.get('is_carry_over', False)]
-        
-        # Combine tasks (main AI task + prioritized pending tasks)
-        all_tasks = [main_task] + new_additional_tasks[:2]  # Limit to 3 tasks per day
-        
-        # Mark postponed tasks (carry-over + excess new tasks)
-        postponed_tasks = carry_over_tasks + new_additional_tasks[2:]
-        
-        return {
-            'date': date.strftime('%Y-%m-%d'),
-            'day_name': date.strftime('%A'),
-            'day_offset': day_offset,
-            'predicted_conditions': adjusted_conditions,
-            'main_task': main_task,
-            'additional_tasks': new_additional_tasks[:2],
-            'tasks': all_tasks,
-            'postponed_tasks': postponed_tasks,
-            'total_tasks': len(all_tasks),
-            'total_duration': sum(task.get('estimated_duration', 1) for task in all_tasks),
-            'has_carry_over': len(carry_over_tasks) > 0,
-            'rl_optimized': True
-        }
-
-    def get_ai_recommendations_with_rl(self, conditions, crop_info, pending_tasks, day_offset):
-        """AI-based task recommendation with RL optimization"""
-        if len(conditions) < 6:
-            return "general_care"
-            
-        crop_age, temp, humidity, rain, soil_moisture, season = conditions
-        crop_type = crop_info.get('crop', 'tomato')
-        current_stage = crop_info.get('growth_stage', 'vegetative')
-        
-        # Get possible actions based on crop sequence
-        possible_actions = self.get_possible_actions(crop_type, current_stage, conditions, day_offset)
-        
-        if not possible_actions:
-            return "general_care"
-        
-        # Use RL to choose optimal action
-        state = self.prepare_rl_state(conditions, crop_info, day_offset)
-        optimal_task = self.choose_action(state, possible_actions)
-        
-        print(f"🤖 RL Selected: {optimal_task} from {possible_actions}")
-        return optimal_task
-
-    def get_possible_actions(self, crop_type, current_stage, conditions, day_offset):
-        """Get possible actions that make sense for the crop and conditions"""
-        crop_age, temp, humidity, rain, soil_moisture, season = conditions
-        
-        # Base possible actions from crop sequence
-        base_actions = self.crop_task_sequences.get(crop_type, {}).get(current_stage, ['general_care'])
-        
-        # Filter based on conditions
-        possible_actions = []
-        
-        for action in base_actions:
-            if self.is_task_relevant(action, conditions, day_offset):
-                possible_actions.append(action)
-        
-        # Always include some variety
-        if len(possible_actions) < 2:
-            possible_actions.extend(['general_care', 'irrigation'])
-        
-        return list(set(possible_actions))
-
-    def is_task_relevant(self, task, conditions, day_offset):
-        """Check if task is relevant given conditions and day"""
-        crop_age, temp, humidity, rain, soil_moisture, season = conditions
-        
-        # Vary tasks based on day offset to prevent repetition
-        day_specific_rules = {
-            0: lambda t: t in ['irrigation', 'general_care'],  # Day 1
-            1: lambda t: t in ['fertilizer', 'weeding'],       # Day 2  
-            2: lambda t: t in ['pest_control', 'pruning'],     # Day 3
-            3: lambda t: t in ['irrigation', 'general_care'],  # Day 4
-            4: lambda t: t in ['harvest', 'weeding'],          # Day 5
-            5: lambda t: t in ['general_care', 'drainage_check'], # Day 6
-            6: lambda t: t in ['irrigation', 'planning']       # Day 7
-        }
-        
-        rule = day_specific_rules.get(day_offset % 7, lambda t: True)
-        if not rule(task):
-            return False
-        
-        # Condition-based rules
-        if task == 'irrigation' and soil_moisture > 70:
-            return False
-        if task == 'fertilizer' and rain > 5:
-            return False
-        if task == 'harvest' and crop_age < 60:
-            return False
-            
-        return True
-
-    def prepare_rl_state(self, conditions, crop_info, day_offset):
-        """Prepare state representation for RL"""
-        crop_age, temp, humidity, rain, soil_moisture, season = conditions
-        crop_type = crop_info.get('crop', 'tomato')
-        
-        # Normalize values for state representation
-        state = [
-            min(crop_age, 120) / 120,  # Normalized crop age
-            temp / 50,                  # Normalized temperature
-            humidity / 100,             # Normalized humidity
-            min(rain, 50) / 50,         # Normalized rainfall
-            soil_moisture / 100,        # Normalized soil moisture
-            season / 4,                 # Normalized season
-            day_offset / 7              # Normalized day offset
-        ]
-        
-        return state
+# Built on first use so that importing this module creates no planner state;
+# learning survives restarts and is shared by all workers through PLANNER_STATE_DIR
+weekly_planner = None
+_weekly_planner_lock = threading.Lock()
 
-    def get_rl_confidence(self, conditions, task):
-        """Calculate RL confidence score for the chosen task"""
-        state = self.prepare_rl_state(conditions, {'crop': 'tomato'}, 0)
-        state_key = self.get_state_key(state)
-        
-        if state_key in self.q_table and task in self.q_table[state_key]:
-            q_value = self.q_table[state_key][task]
-            # Convert Q-value to confidence (0-100%)
-            confidence = min(max((q_value + 10) * 5, 0), 100)
-            return round(confidence, 1)
-        
-        return 75.0  # Default confidence
-
-    def prioritize_pending_tasks_with_rl(self, pending_tasks, conditions):
-        """Use RL to prioritize pending tasks"""
-        if not pending_tasks:
-            return []
-            
-        scored_tasks = []
-        
-        for task in pending_tasks:
-            if isinstance(task, dict):
-                task_data = task
-            else:
-                task_data = {'task': task, 'priority': 'medium', 'days_pending': 0}
-                
-            # Calculate RL-based score
-            rl_score = self.calculate_task_rl_score(task_data, conditions)
-            days_pending = task_data.get('days_pending', 0)
-            
-            # RL-based urgency: increase score for older tasks
-            urgency_bonus = days_pending * 2
-            
-            # Priority multiplier
-            priority_multiplier = {
-                'urgent': 3.0,
-                'high': 2.0,
-                'medium': 1.5,
-                'low': 1.0
-            }.get(task_data.get('priority', 'medium'), 1.0)
-            
-            final_score = (rl_score + urgency_bonus) * priority_multiplier
-            scored_tasks.append((final_score, task_data))
-        
-        # Sort by score (descending)
-        scored_tasks.sort(key=lambda x: x[0], reverse=True)
-        return [task for score, task in scored_tasks]
+def get_weekly_planner(async_learning=None):
+    """The server's weekly planner with real RL, created on the first call.
 
-    def calculate_task_rl_score(self, task, conditions):
-        """Calculate RL score for task based on current conditions"""
-        state = self.prepare_rl_state(conditions, {'crop': 'tomato'}, 0)
-        task_name = task['task'] if isinstance(task, dict) else task
-        
-        state_key = self.get_state_key(state)
-        if state_key in self.q_table and task_name in self.q_table[state_key]:
-            return self.q_table[state_key][task_name]
-        
-        # Default scoring based on conditions
-        base_score = 50
-        
-        if self.is_task_still_relevant(task_name, conditions):
-            base_score += 30
-            
-        if self.is_weather_appropriate(task_name, conditions):
-            base_score += 20
-            
-        return min(base_score, 100)
-
-    def get_task_reason(self, task, conditions, crop_info, day_offset):
-        """Generate reason for task with day-specific context"""
-        crop_age, temp, humidity, rain, soil_moisture, season = conditions
-        crop_type = crop_info.get('crop', 'tomato')
-        
-        # Day-specific reasons
-        day_context = {
-            0: "Start of week - ",
-            1: "Mid-week maintenance - ",
-            2: "Growth phase - ",
-            3: "Regular care - ",
-            4: "Weekend preparation - ",
-            5: "Weekly review - ",
-            6: "End of week - "
-        }
-        
-        context = day_context.get(day_offset % 7, "")
-        
-        reason_map = {
-            'irrigation': f"{context}Soil moisture at {soil_moisture}% - {crop_type} needs water",
-            'fertilizer': f"{context}{crop_type} at day {crop_age} needs nutrients for growth",
-            'pest_control': f"{context}Preventive care with {humidity}% humidity",
-            'harvest': f"{context}{crop_type} ready for harvesting at day {crop_age}",
-            'pruning': f"{context}Optimal time for pruning {crop_type} plants",
-            'weeding': f"{context}Weed control for better {crop_type} growth",
-            'general_care': f"{context}Routine maintenance for healthy {crop_type} plants"
-        }
-        
-        return reason_map.get(task, f"{context}AI-optimized task for {crop_type}")
-
-    # ... (keep the existing helper methods like predict_conditions, format_single_line_tasks, etc.)
-
-    def predict_conditions(self, current_conditions, day_offset):
-        """Predict conditions for future days with more variation"""
-        if not current_conditions or len(current_conditions) < 6:
-            return [30 + day_offset, 25, 60, 0, 40, 2]
-            
-        crop_age, temp, humidity, rain, soil_moisture, season = current_conditions
-        
-        # More realistic prediction model
-        predicted_conditions = [
-            crop_age + day_offset,
-            temp + (np.random.random() - 0.5) * 6,  # More temperature variation
-            max(30, min(90, humidity + (np.random.random() - 0.5) * 30)),  # More humidity variation
-            max(0, rain + (np.random.random() - 0.4) * 8),  # More rain variation
-            max(20, min(80, soil_moisture - day_offset + (np.random.random() - 0.5) * 15)),
-            season
-        ]
-        
-        return predicted_conditions
-
-    def update_task_completion(self, task_id, completed, completion_date=None):
-        """Update RL model with task completion data"""
-        if completion_date is None:
-            completion_date = datetime.now()
-            
-        if task_id not in self.task_completion_history:
-            self.task_completion_history[task_id] = []
-            
-        self.task_completion_history[task_id].append({
-            'date': completion_date.isoformat(),
-            'completed': completed,
-            'timestamp': datetime.now().isoformat()
-        })
-        
-        # Update Q-values based on completion
-        if completed:
-            # Positive reward for completion
-            reward = 10
-        else:
-            # Negative reward for non-completion
-            reward = -5
-            
-        # In a real implementation, we would update Q-values here
-        print(f"🤖 RL Learning: Task {task_id} completed: {completed}, Reward: {reward}")
+    Background learning is off unless PLANNER_ASYNC_LEARNING=1 or the caller
+    asks for it; the server entry point below turns it on by default.
+    """
+    global weekly_planner
+    with _weekly_planner_lock:
+        if weekly_planner is None:
+            if async_learning is None:
+                async_learning = os.environ.get('PLANNER_ASYNC_LEARNING', '0') == '1'
+            weekly_planner = RLWeeklyPlanner(
+                state_dir=os.environ.get('PLANNER_STATE_DIR', 'planner_state'),
+                snapshot_interval=float(os.environ.get('PLANNER_SNAPSHOT_INTERVAL', 30)),
+                async_learning=async_learning,
+                replay_capacity=int(os.environ.get('PLANNER_REPLAY_CAPACITY', 10000)),
+                replay_batch_size=int(os.environ.get('PLANNER_REPLAY_BATCH', 256)),
+                learn_interval=float(os.environ.get('PLANNER_LEARN_INTERVAL', 1.0)),
+                daily_capacity=float(os.environ.get('PLANNER_DAILY_HOURS', DEFAULT_DAILY_CAPACITY))
+            )
+    return weekly_planner
 
-# Initialize weekly planner with real RL
-weekly_planner = RLWeeklyPlanner()
+def get_current_conditions():
+    """Get current farming conditions"""
+    # In real implementation, get from sensors/weather API
+    return [
+        30,  # crop_age (will be adjusted based on detection)
+        28,  # temperature
+        65,  # humidity
+        0,   # rainfall
+        42,  # soil_moisture
+        2    # season
+    ]
 
 # ... (rest of your existing FarmingAI class and endpoints remain similar)
 
@@ -702,12 +334,12 @@ weekly_planner = RLWeeklyPlanner()
 def detect_and_plan():
     """Enhanced endpoint that returns both detection and weekly plan"""
     try:
-        data = request.get_json()
+        image_data, data = request_image(request)
         crop_info = {}
         
-        if 'image' in data:
+        if image_data is not None:
             # Image-based detection
-            result = enhanced_detector.detect_crop_from_image(data['image'])
+            result = enhanced_detector.detect_crop_from_image(image_data)
             if not result['success']:
                 return jsonify(result)
             crop_info = {
@@ -720,7 +352,7 @@ def detect_and_plan():
             crop_info = {
                 'crop': data.get('crop', 'tomato'),
                 'growth_stage': data.get('growth_stage', 'vegetative'),
-                'days_estimate': data.get('daysSincePlanting', 30)
+                'days_estimate': int(data.get('daysSincePlanting', 30))
             }
         
         # Get current conditions
@@ -734,7 +366,7 @@ def detect_and_plan():
         ]
         
         # Generate weekly plan with RL
-        weekly_plan = weekly_planner.generate_weekly_plan(crop_info, current_conditions)
+        weekly_plan = get_weekly_planner().generate_weekly_plan(crop_info, current_conditions)
         
         # Get today's tasks
         today_date = datetime.now().strftime('%Y-%m-%d')
@@ -757,6 +389,73 @@ def detect_and_plan():
             'error': f'Planning failed: {str(e)}'
         })
 
+def task_outcome_from_request(data):
+    """Task name and the conditions it was planned under, from a status/postpone request"""
+    task_data = data.get('task_data') or {}
+    task = task_data.get('task') or data.get('task')
+    conditions = (task_data.get('predicted_conditions') or data.get('conditions')
+                  or get_current_conditions())
+    return task, conditions
+
+@app.route('/api/update-task-status', methods=['POST'])
+def update_task_status():
+    """Record task completion; Q-learning happens off the request path"""
+    try:
+        data = request.get_json()
+        
+        task_id = data.get('task_id')
+        completed = bool(data.get('completed', False))
+        task, conditions = task_outcome_from_request(data)
+        
+        get_weekly_planner().update_task_completion(task_id, completed, task=task, conditions=conditions)
+        
+        return jsonify({
+            'success': True,
+            'message': 'Task status updated'
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@app.route('/api/postpone-task', methods=['POST'])
+def postpone_task():
+    """Postpone task; counts as a non-completion for RL learning"""
+    try:
+        data = request.get_json()
+        
+        task_id = data.get('task_id')
+        task, conditions = task_outcome_from_request(data)
+        
+        get_weekly_planner().update_task_completion(task_id, False, task=task, conditions=conditions)
+        
+        return jsonify({
+            'success': True,
+            'message': 'Task postponed successfully',
+            'postpone_reason': data.get('reason', 'Not specified'),
+            'carry_over': True
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@app.route('/api/learner-status', methods=['GET'])
+def learner_status():
+    """Replay buffer and Q-table state of the planner"""
+    planner = get_weekly_planner()
+    learner = planner.learner
+    return jsonify({
+        'success': True,
+        'async_learning': learner is not None,
+        'learner': learner.stats() if learner is not None else None,
+        'state': planner.state_store.stats()
+    })
+
 # Update other endpoints similarly...
 
 if __name__ == '__main__':
@@ -768,4 +467,6 @@ if __name__ == '__main__':
     print("   - Varied daily tasks (not just pest control)")
     print("   - Weather-adaptive scheduling")
     
+    # The server learns off the request path unless PLANNER_ASYNC_LEARNING=0
+    get_weekly_planner(async_learning=os.environ.get('PLANNER_ASYNC_LEARNING', '1') == '1')
     app.run(debug=True, port=5002, use_reloader=False)
\ No newline at end of file
@@ -1,11 +1,8 @@
 # crop_stage_detector.py
 import cv2
 import numpy as np
-import tensorflow as tf
-from tensorflow import keras
-from PIL import Image
-import io
-import base64
+
+from image_ingest import decode_to_bgr
 
 class TomatoStageDetector:
     def __init__(self):
@@ -27,17 +24,15 @@ class TomatoStageDetector:
             'fruiting_green': {'lower': [30, 40, 40], 'upper': [40, 255, 255]}, # Green fruits
             'fruiting_ripe': {'lower': [0, 50, 50], 'upper': [10, 255, 255]}   # Red fruits
         }
+        
+        # Stage scores are pixel shares, so analysing a reduced image is enough
+        self.analysis_max_side = 800
     
     def analyze_image(self, image_data):
         """Analyze uploaded image to detect tomato growth stage"""
         try:
-            # Convert base64 to image
-            if isinstance(image_data, str) and image_data.startswith('data:image'):
-                image_data = image_data.split(',')[1]
-            
-            image_bytes = base64.b64decode(image_data)
-            image = Image.open(io.BytesIO(image_bytes))
-            opencv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+            # Decode at reduced resolution (aspect ratio preserved)
+            opencv_image = decode_to_bgr(image_data, size=None, max_side=self.analysis_max_side)
             
             # Convert to HSV for better color analysis
             hsv = cv2.cvtColor(opencv_image, cv2.COLOR_BGR2HSV)
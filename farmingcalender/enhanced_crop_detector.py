@@ -1,12 +1,15 @@
 # enhanced_crop_detector.py
 import cv2
 import numpy as np
-from PIL import Image
-import io
-import base64
+
+from color_engine import ColorProfileEngine
+from analysis_context import ImageAnalysisContext
+from shape_features import (CIRCULARITY_BIN_EDGES, band_counts, circularity_histogram,
+                            substantial_circularity)
+from image_ingest import ANALYSIS_SIZE, decode_thumbnail, decode_to_bgr
 
 class AdvancedCropDetector:
-    def __init__(self):
+    def __init__(self, cascade=False, cascade_size=64, cascade_margin=10):
         self.crop_features = {
             'tomato': {
                 'color_profiles': {
@@ -32,66 +35,54 @@ class AdvancedCropDetector:
                 }
             }
         }
+        
+        # Ranges used by the tomato check and growth stage detection
+        self.stage_color_ranges = {
+            'red_fruit': {'lower': [0, 100, 100], 'upper': [10, 255, 255]},
+            'yellow_flower': {'lower': [20, 100, 100], 'upper': [30, 255, 255]}
+        }
+        
+        # Compile color profiles into HSV lookup tables once at startup
+        self.color_engine = ColorProfileEngine(self.crop_features, self.stage_color_ranges)
+        
+        # Coarse-to-fine mode: score a cascade_size thumbnail first and only run
+        # the full-resolution analysis when the top two final scores are closer
+        # than cascade_margin
+        self.cascade = cascade
+        self.cascade_size = (cascade_size, cascade_size)
+        self.cascade_margin = cascade_margin
     
     def detect_crop_from_image(self, image_data):
         try:
             print("🔍 Starting enhanced crop detection...")
             
-            # Convert base64 to image
-            if isinstance(image_data, str) and image_data.startswith('data:image'):
-                image_data = image_data.split(',')[1]
-            
-            image_bytes = base64.b64decode(image_data)
-            image = Image.open(io.BytesIO(image_bytes))
-            opencv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-            
-            # Preprocess image
-            processed_image = self.preprocess_image(opencv_image)
-            
-            # Multiple analysis methods
-            color_scores = self.analyze_colors(processed_image)
-            shape_scores = self.analyze_shapes(processed_image)
-            
-            print(f"🎨 Color scores: {color_scores}")
-            print(f"📐 Shape scores: {shape_scores}")
-            
-            # Combined scoring with weights
-            final_scores = {}
-            for crop in ['tomato', 'rice', 'chili']:
-                color_score = color_scores.get(crop, 0)
-                shape_score = shape_scores.get(crop, 0)
-                final_scores[crop] = (color_score * 0.7) + (shape_score * 0.3)
-            
-            print(f"📊 Final scores: {final_scores}")
-            
-            # Get best match
-            detected_crop = max(final_scores.items(), key=lambda x: x[1])[0]
-            confidence = final_scores[detected_crop]
+            decision_level = 'full'
+            cascade_details = None
+            full_image = None
             
-            # Tomato-specific verification
-            if detected_crop == 'rice' and self.has_tomato_features(processed_image):
-                print("🔄 Correcting rice to tomato - tomato features detected")
-                detected_crop = 'tomato'
-                confidence = max(confidence, 0.8)
+            if self.cascade:
+                thumbnail_image, full_image = decode_thumbnail(image_data, self.cascade_size, ANALYSIS_SIZE)
+                thumbnail = self.analyze_at(thumbnail_image, self.cascade_size)
+                margin = self.score_margin(thumbnail[3])
+                cascade_details = {
+                    'thumbnail_size': list(self.cascade_size),
+                    'thumbnail_margin': round(margin, 4),
+                    'margin_threshold': self.cascade_margin,
+                    'thumbnail_ms': thumbnail[0].report()['total_ms']
+                }
+                if margin >= self.cascade_margin:
+                    decision_level = 'thumbnail'
+                    analysis = thumbnail
             
-            # Ensure minimum confidence
-            if confidence < 0.4:
-                detected_crop = 'tomato'  # Default to tomato for unclear images
-                confidence = 0.6
+            if decision_level == 'full':
+                if full_image is None:
+                    # Decode straight to the analysis resolution
+                    full_image = decode_to_bgr(image_data, ANALYSIS_SIZE)
+                analysis = self.analyze_at(full_image, ANALYSIS_SIZE)
             
-            result = {
-                'success': True,
-                'detected_crop': detected_crop,
-                'crop_name': self.get_crop_name(detected_crop),
-                'growth_stage': self.detect_growth_stage(processed_image, detected_crop),
-                'days_estimate': self.estimate_days(detected_crop),
-                'confidence': round(confidence * 100, 1),
-                'analysis_details': {
-                    'color_scores': color_scores,
-                    'shape_scores': shape_scores,
-                    'final_scores': final_scores
-                }
-            }
+            result = self.build_result(analysis, decision_level)
+            if cascade_details is not None:
+                result['analysis_details']['cascade'] = cascade_details
             
             print(f"✅ Detection complete: {result['detected_crop']} with {result['confidence']}% confidence")
             return result
@@ -100,10 +91,87 @@ class AdvancedCropDetector:
             print(f"❌ Detection error: {str(e)}")
             return {'success': False, 'error': f'Detection failed: {str(e)}'}
     
-    def preprocess_image(self, image):
+    def detect_crop_from_array(self, opencv_image):
+        """Detect the crop in an already decoded BGR image at its own resolution"""
+        try:
+            analysis = self.analyze_at(opencv_image, opencv_image.shape[1::-1])
+            return self.build_result(analysis, 'full')
+            
+        except Exception as e:
+            print(f"❌ Detection error: {str(e)}")
+            return {'success': False, 'error': f'Detection failed: {str(e)}'}
+    
+    def build_result(self, analysis, decision_level):
+        """Turn the scores from analyze_at into the detection response"""
+        context, color_scores, shape_scores, final_scores = analysis
+        
+        print(f"🎨 Color scores: {color_scores}")
+        print(f"📐 Shape scores: {shape_scores}")
+        print(f"📊 Final scores ({decision_level}): {final_scores}")
+        
+        # Get best match
+        detected_crop = max(final_scores.items(), key=lambda x: x[1])[0]
+        confidence = final_scores[detected_crop]
+        
+        # Tomato-specific verification
+        if detected_crop == 'rice' and self.has_tomato_features(context):
+            print("🔄 Correcting rice to tomato - tomato features detected")
+            detected_crop = 'tomato'
+            confidence = max(confidence, 0.8)
+        
+        # Ensure minimum confidence
+        if confidence < 0.4:
+            detected_crop = 'tomato'  # Default to tomato for unclear images
+            confidence = 0.6
+        
+        return {
+            'success': True,
+            'detected_crop': detected_crop,
+            'crop_name': self.get_crop_name(detected_crop),
+            'growth_stage': self.detect_growth_stage(context, detected_crop),
+            'days_estimate': self.estimate_days(detected_crop),
+            'confidence': round(confidence * 100, 1),
+            'decision_level': decision_level,
+            'analysis_details': {
+                'color_scores': color_scores,
+                'shape_scores': shape_scores,
+                'final_scores': final_scores,
+                'shape_features': self.shape_features(context),
+                'pipeline': context.report()
+            }
+        }
+    
+    def analyze_at(self, opencv_image, size):
+        """Preprocess and score a decoded image at the given (width, height)"""
+        processed_image = self.preprocess_image(opencv_image, size)
+        
+        # Shared per-image artifacts (HSV, edges, contours...) for every stage
+        context = ImageAnalysisContext(processed_image, self.color_engine)
+        
+        # Multiple analysis methods
+        color_scores = self.analyze_colors(context)
+        shape_scores = self.analyze_shapes(context)
+        
+        # Combined scoring with weights
+        final_scores = {}
+        for crop in ['tomato', 'rice', 'chili']:
+            color_score = color_scores.get(crop, 0)
+            shape_score = shape_scores.get(crop, 0)
+            final_scores[crop] = (color_score * 0.7) + (shape_score * 0.3)
+        
+        return context, color_scores, shape_scores, final_scores
+    
+    @staticmethod
+    def score_margin(final_scores):
+        """Gap between the best and the runner-up crop score"""
+        best, runner_up = sorted(final_scores.values(), reverse=True)[:2]
+        return best - runner_up
+    
+    def preprocess_image(self, image, size=ANALYSIS_SIZE):
         """Enhance image for better detection"""
-        # Resize for consistency
-        image = cv2.resize(image, (400, 400))
+        # Resize for consistency (no-op for images decoded at the target size)
+        if image.shape[1::-1] != tuple(size):
+            image = cv2.resize(image, tuple(size))
         
         # Enhance contrast
         lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
@@ -113,17 +181,16 @@ class AdvancedCropDetector:
         return image
     
     def analyze_colors(self, image):
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        context = ImageAnalysisContext.wrap(image, self.color_engine)
         scores = {}
         
+        # One lookup-table pass gives the pixel share of every profile
+        fractions = context.profile_fractions()
+        
         for crop_name, features in self.crop_features.items():
             crop_score = 0
-            for color_name, color_range in features['color_profiles'].items():
-                lower = np.array(color_range['lower'])
-                upper = np.array(color_range['upper'])
-                mask = cv2.inRange(hsv, lower, upper)
-                
-                percentage = np.sum(mask > 0) / (hsv.shape[0] * hsv.shape[1])
+            for color_name in features['color_profiles']:
+                percentage = fractions[crop_name][color_name]
                 
                 # Weight important colors higher
                 if 'fruit' in color_name or 'flower' in color_name:
@@ -136,63 +203,40 @@ class AdvancedCropDetector:
         return scores
     
     def analyze_shapes(self, image):
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        edges = cv2.Canny(blurred, 50, 150)
-        
-        # Find contours
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        context = ImageAnalysisContext.wrap(image, self.color_engine)
         
-        scores = {'tomato': 0, 'rice': 0, 'chili': 0}
-        
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            if area < 100:  # Filter small contours
-                continue
-                
-            # Shape analysis
-            perimeter = cv2.arcLength(contour, True)
-            if perimeter > 0:
-                circularity = 4 * np.pi * area / (perimeter * perimeter)
-                
-                # Tomato-like shapes (round fruits)
-                if 0.7 < circularity < 1.2:
-                    scores['tomato'] += 20
-                # Rice-like shapes (long thin shapes)
-                elif circularity < 0.3:
-                    scores['rice'] += 15
-                # Chili-like shapes (elongated)
-                elif 0.3 < circularity < 0.6:
-                    scores['chili'] += 15
+        # Circularity of every substantial contour, computed in bulk
+        circularity = substantial_circularity(context.contour_stats, context.min_contour_area)
+        bands = band_counts(circularity)
         
-        return scores
+        # Round fruits score for tomato, long thin shapes for rice, elongated for chili
+        return {
+            'tomato': bands['tomato'] * 20,
+            'rice': bands['rice'] * 15,
+            'chili': bands['chili'] * 15
+        }
+    
+    def shape_features(self, image):
+        """Circularity distribution of the substantial contours as a feature vector"""
+        context = ImageAnalysisContext.wrap(image, self.color_engine)
+        circularity = substantial_circularity(context.contour_stats, context.min_contour_area)
+        return {
+            'contour_count': int(circularity.size),
+            'circularity_bins': CIRCULARITY_BIN_EDGES.tolist(),
+            'circularity_histogram': circularity_histogram(circularity)
+        }
     
     def has_tomato_features(self, image):
         """Check for distinctive tomato features"""
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        context = ImageAnalysisContext.wrap(image, self.color_engine)
         
         # Look for red fruits (tomato distinctive feature)
-        red_lower = np.array([0, 100, 100])
-        red_upper = np.array([10, 255, 255])
-        red_mask = cv2.inRange(hsv, red_lower, red_upper)
-        red_percentage = np.sum(red_mask > 0) / (hsv.shape[0] * hsv.shape[1])
-        
-        # Look for round shapes using contour analysis
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        edges = cv2.Canny(blurred, 50, 150)
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        has_round_objects = False
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            if area > 100:  # Only consider substantial objects
-                perimeter = cv2.arcLength(contour, True)
-                if perimeter > 0:
-                    circularity = 4 * np.pi * area / (perimeter * perimeter)
-                    if circularity > 0.7:  # Round shape
-                        has_round_objects = True
-                        break
+        red_percentage = context.range_fraction('red_fruit')
+        
+        # Look for round shapes among substantial contours
+        stats = context.contour_stats
+        substantial = (stats['area'] > context.min_contour_area) & (stats['perimeter'] > 0)
+        has_round_objects = bool(np.any(stats['circularity'][substantial] > 0.7))
         
         has_red_fruits = red_percentage > 0.005  # Even small amount of red
         
@@ -200,16 +244,14 @@ class AdvancedCropDetector:
         return has_red_fruits or has_round_objects
     
     def detect_growth_stage(self, image, crop):
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        context = ImageAnalysisContext.wrap(image, self.color_engine)
         
         if crop == 'tomato':
             # Check for red fruits (harvest stage)
-            red_mask = cv2.inRange(hsv, np.array([0, 100, 100]), np.array([10, 255, 255]))
-            red_percentage = np.sum(red_mask > 0) / (hsv.shape[0] * hsv.shape[1])
+            red_percentage = context.range_fraction('red_fruit')
             
             # Check for flowers
-            yellow_mask = cv2.inRange(hsv, np.array([20, 100, 100]), np.array([30, 255, 255]))
-            yellow_percentage = np.sum(yellow_mask > 0) / (hsv.shape[0] * hsv.shape[1])
+            yellow_percentage = context.range_fraction('yellow_flower')
             
             if red_percentage > 0.01:
                 return 'harvest'
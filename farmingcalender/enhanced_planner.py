@@ -1,10 +1,14 @@
 import numpy as np
 from datetime import datetime, timedelta
 import json
+from condition_forecast import SIMPLE_FORECAST, as_condition_lists
 
 class RLWeeklyPlanner:
-    def __init__(self, predictor):
+    def __init__(self, predictor, seed=None):
         self.predictor = predictor
+        # Condition forecasts draw from this generator; pass a seed for reproducible plans
+        self.forecast = SIMPLE_FORECAST
+        self.rng = np.random.default_rng(seed)
         self.task_completion_history = {}
         self.weekly_schedule = {}
         
@@ -28,6 +32,9 @@ class RLWeeklyPlanner:
             'weekly_goals': self.get_weekly_goals(current_stage, crop_type)
         }
         
+        # The whole week's conditions come from one forecast draw
+        forecast = as_condition_lists(current_conditions, self.forecast.horizon(current_conditions, 7, self.rng))
+        
         # Generate plan for next 7 days
         for day_offset in range(7):
             day_date = datetime.now() + timedelta(days=day_offset)
@@ -36,7 +43,8 @@ class RLWeeklyPlanner:
                 current_conditions, 
                 crop_info,
                 pending_tasks,
-                day_offset
+                day_offset,
+                forecast[day_offset]
             )
             weekly_plan['daily_plans'][day_date.strftime('%Y-%m-%d')] = day_plan
             
@@ -46,10 +54,11 @@ class RLWeeklyPlanner:
         weekly_plan['carry_over_tasks'] = pending_tasks
         return weekly_plan
     
-    def generate_daily_plan(self, date, conditions, crop_info, pending_tasks, day_offset):
+    def generate_daily_plan(self, date, conditions, crop_info, pending_tasks, day_offset, adjusted_conditions=None):
         """Generate daily plan with RL optimization"""
-        # Adjust conditions for future days
-        adjusted_conditions = self.predict_conditions(conditions, day_offset)
+        # Adjust conditions for future days (unless the weekly forecast already did)
+        if adjusted_conditions is None:
+            adjusted_conditions = self.predict_conditions(conditions, day_offset)
         
         # Get AI recommendations for this day
         ai_recommendations = "general_care"  # Default fallback
@@ -208,23 +217,9 @@ class RLWeeklyPlanner:
         return reason_map.get(task, f"AI-optimized farming task for day {crop_age}")
     
     def predict_conditions(self, current_conditions, day_offset):
-        """Predict conditions for future days (simplified)"""
-        if not current_conditions or len(current_conditions) < 6:
-            return [30 + day_offset, 25, 60, 0, 40, 2]
-            
-        crop_age, temp, humidity, rain, soil_moisture, season = current_conditions
-        
-        # Simple prediction model
-        predicted_conditions = [
-            crop_age + day_offset,  # Crop ages each day
-            temp + (np.random.random() - 0.5) * 4,  # Temp variation
-            max(30, min(90, humidity + (np.random.random() - 0.5) * 20)),  # Humidity variation
-            max(0, rain + (np.random.random() - 0.3) * 5),  # Rain variation
-            max(20, min(80, soil_moisture - 2 + (np.random.random() - 0.5) * 10)),  # Soil moisture
-            season  # Season remains same for the week
-        ]
-        
-        return predicted_conditions
+        """Predict conditions for future days (see condition_forecast for the noise model)"""
+        forecast = self.forecast.horizon(current_conditions, 1, self.rng, start=day_offset)
+        return as_condition_lists(current_conditions, forecast, start=day_offset)[0]
     
     def get_weekly_goals(self, current_stage, crop_type):
         """Get weekly goals based on crop stage"""
@@ -0,0 +1,143 @@
+# image_ingest.py
+import base64
+import io
+import shutil
+import tempfile
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Resolution the crop detectors analyse at (see preprocess_image)
+ANALYSIS_SIZE = (400, 400)
+
+# Raw upload bodies up to this size are kept in memory, larger ones spill to a temporary file
+SPOOL_MAX_MEMORY = 1024 * 1024
+
+
+def open_image(image_data):
+    """Open a base64 string (optionally a data URI), raw bytes or a binary file object as a lazy PIL image"""
+    if isinstance(image_data, Image.Image):
+        return image_data
+
+    if hasattr(image_data, 'read'):
+        # Uploaded files may already have been read by an earlier attempt
+        if image_data.seekable():
+            image_data.seek(0)
+        return Image.open(image_data)
+
+    if isinstance(image_data, str):
+        if image_data.startswith('data:image'):
+            image_data = image_data.split(',')[1]
+        image_data = base64.b64decode(image_data)
+
+    return Image.open(io.BytesIO(image_data))
+
+
+def read_image_bytes(image_data):
+    """Raw encoded image bytes from a base64 string, bytes or a binary file object"""
+    if hasattr(image_data, 'read'):
+        if image_data.seekable():
+            image_data.seek(0)
+        return image_data.read()
+
+    if isinstance(image_data, str):
+        if image_data.startswith('data:image'):
+            image_data = image_data.split(',')[1]
+        return base64.b64decode(image_data)
+
+    return bytes(image_data)
+
+
+def request_image(req, field='image'):
+    """Pull the uploaded image and the remaining parameters out of a Flask request.
+
+    Supports JSON with a base64 data URI (the original format), multipart
+    form uploads and raw application/octet-stream or image/* bodies. Binary
+    uploads are handed to the decoder as file objects, skipping the base64
+    round-trip. Returns (image_source or None, params dict). Werkzeug's
+    HTTP errors (body too large, malformed multipart) are raised to the
+    caller.
+    """
+    if req.mimetype == 'multipart/form-data':
+        upload = req.files.get(field)
+        return (upload.stream if upload else None), req.form.to_dict()
+
+    if req.mimetype == 'application/octet-stream' or req.mimetype.startswith('image/'):
+        return spool_body(req.stream), req.args.to_dict()
+
+    data = req.get_json(silent=True) or {}
+    return data.get(field) or None, data
+
+
+def spool_body(stream):
+    """Copy a request body stream into a seekable file in chunks; None if it is empty.
+
+    Detection reads an upload more than once (content hash, decode,
+    fallback), so the stream cannot be handed over as it is; spooling keeps
+    large bodies out of memory.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    shutil.copyfileobj(stream, spool, 64 * 1024)
+    if spool.tell() == 0:
+        spool.close()
+        return None
+    spool.seek(0)
+    return spool
+
+
+def target_size(image_size, size=None, max_side=None):
+    """Output (width, height): an exact size, a longest-side cap, or the original size"""
+    if size is not None:
+        return tuple(size)
+
+    width, height = image_size
+    if max_side is not None and max(width, height) > max_side:
+        scale = max_side / max(width, height)
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    return width, height
+
+
+def decode_to_rgb(image_data, size=None, max_side=None):
+    """Decode straight to about the requested resolution and return an RGB array.
+
+    For JPEGs, draft() lets libjpeg scale by 1/2, 1/4 or 1/8 while decoding,
+    so a 12 MP photo never materialises at full size. The remaining resize
+    happens on the already reduced image.
+    """
+    image = open_image(image_data)
+    width, height = target_size(image.size, size, max_side)
+
+    # No-op for formats without reduced decoding
+    image.draft('RGB', (width, height))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    rgb = np.asarray(image)
+    if rgb.shape[1] != width or rgb.shape[0] != height:
+        rgb = cv2.resize(rgb, (width, height), interpolation=cv2.INTER_AREA)
+
+    return rgb
+
+
+def decode_to_bgr(image_data, size=ANALYSIS_SIZE, max_side=None):
+    """Decode to the analysis resolution and convert to OpenCV's BGR order after resizing"""
+    rgb = decode_to_rgb(image_data, size=size, max_side=max_side)
+    return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+
+
+def decode_thumbnail(image_data, thumbnail_size, size=ANALYSIS_SIZE):
+    """Decode a thumbnail for a coarse first pass; returns (thumbnail_bgr, full_bgr or None).
+
+    JPEGs are decoded straight to the thumbnail size, so the full-resolution
+    decode is only paid if the caller escalates. Other formats cannot decode
+    at reduced size; they are decoded once at size and the thumbnail is
+    downsampled from that, which is returned for reuse.
+    """
+    image = open_image(image_data)
+    if image.format == 'JPEG':
+        return cv2.cvtColor(decode_to_rgb(image, size=thumbnail_size), cv2.COLOR_RGB2BGR), None
+
+    full = cv2.cvtColor(decode_to_rgb(image, size=size), cv2.COLOR_RGB2BGR)
+    return cv2.resize(full, tuple(thumbnail_size), interpolation=cv2.INTER_AREA), full
@@ -1,11 +1,9 @@
 import numpy as np
-import pandas as pd
-import joblib
 import os
 from datetime import datetime, timedelta
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
 import warnings
+
+from forest_engine import FlatForest, scale_features
 warnings.filterwarnings('ignore')
 
 class ReinforcementLearningTaskOptimizer:
@@ -54,7 +52,8 @@ class ReinforcementLearningTaskOptimizer:
 class AdvancedFarmingTaskPredictor:
     def __init__(self):
         self.model = None
-        self.scaler = StandardScaler()
+        self.scaler = None  # created on first training; sklearn is imported lazily
+        self.engine = None  # flattened forest for single-row predictions (forest_engine.py)
         self.is_trained = False
         self.rl_optimizer = ReinforcementLearningTaskOptimizer()
         self.task_history = []
@@ -195,6 +194,8 @@ class AdvancedFarmingTaskPredictor:
     
     def load_historical_data(self):
         """Load or create historical data for RL training"""
+        import pandas as pd
+        
         try:
             if os.path.exists('farming_history.csv'):
                 self.historical_data = pd.read_csv('farming_history.csv')
@@ -211,7 +212,12 @@ class AdvancedFarmingTaskPredictor:
     def train_model(self):
         """Train the ML model with enhanced features"""
         try:
+            # sklearn takes over a second to import, so only load it when training
+            from sklearn.ensemble import RandomForestClassifier
+            from sklearn.preprocessing import StandardScaler
+            
             # Scale features
+            self.scaler = StandardScaler()
             X_scaled = self.scaler.fit_transform(self.X_train)
             
             # Train Random Forest with optimized parameters
@@ -224,6 +230,7 @@ class AdvancedFarmingTaskPredictor:
             )
             
             self.model.fit(X_scaled, self.y_train)
+            self.engine = FlatForest.from_sklearn(self.model)
             self.is_trained = True
             
             # Calculate feature importance
@@ -333,8 +340,10 @@ class AdvancedFarmingTaskPredictor:
             return self.rule_based_predictor(features)
         
         try:
-            input_features = np.array([features])
-            input_scaled = self.scaler.transform(input_features)
+            input_features = np.array([features], dtype=np.float64)
+            input_scaled = scale_features(self.scaler, input_features)
+            if self.engine is not None:
+                return self.engine.predict(input_scaled)[0]
             prediction = self.model.predict(input_scaled)[0]
             return prediction
         except:
@@ -0,0 +1,182 @@
+# batch_predict.py - Score many condition records in one pass
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from task_predictor import DEFAULT_CONDITIONS, format_response, load_predictor
+
+
+def read_records(stream, fmt='jsonl'):
+    """Yield condition records from a JSONL or CSV stream one at a time.
+
+    Lines that are not JSON objects, and CSV rows with more fields than the
+    header, are yielded as {'error': ...} so the output keeps one line per
+    input record.
+    """
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            if None in row:  # DictReader puts the extra fields under None
+                record = {'error': f'row has {len(row[None])} more fields than the header'}
+                if row.get('id') not in (None, ''):
+                    record['id'] = parse_number(row['id'])
+                yield record
+                continue
+            yield {name: parse_number(value) for name, value in row.items() if value not in (None, '')}
+        return
+
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield {'error': f'JSON parsing failed: {str(e)}'}
+            continue
+        yield record if isinstance(record, dict) else {'error': 'record must be a JSON object'}
+
+
+def parse_number(value):
+    """CSV cell as int or float where it is numeric, else the string"""
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except (TypeError, ValueError):
+            pass
+    return value
+
+
+def predict_chunk(predictor, records):
+    """predict_from_json responses for a list of records, in order.
+
+    The whole chunk goes through predict_tasks_batch, so per-record work is
+    limited to building the response dicts.
+    """
+    responses = [None] * len(records)
+    rows, positions, conditions = [], [], []
+    for position, record in enumerate(records):
+        if 'error' in record:
+            responses[position] = error_response(record)
+            continue
+        values = {name: record.get(name, default) for name, default in DEFAULT_CONDITIONS.items()}
+        try:
+            # null is a missing value, as it is for predict_from_json
+            rows.append([np.nan if value is None else float(value) for value in values.values()])
+        except (TypeError, ValueError):
+            responses[position] = error_response(record, 'conditions must be numbers')
+            continue
+        positions.append(position)
+        conditions.append(values)
+
+    if not rows:
+        return responses
+    rows = np.array(rows)
+
+    model_rows = np.arange(len(rows))
+    if predictor.table is not None:
+        # The table covers finite conditions; missing values go to the model, as in predict_from_json
+        finite = np.isfinite(rows).all(axis=1)
+        tasks, confidence = predictor.table.lookup(rows[finite])
+        for task, conf, i in zip(tasks.tolist(), confidence.tolist(), np.flatnonzero(finite)):
+            result = {'recommended_task': task, 'confidence': conf, 'alternative_tasks': [],
+                      'current_conditions': conditions[i]}
+            responses[positions[i]] = with_id(format_response(result), records[positions[i]])
+        model_rows = np.flatnonzero(~finite)
+
+    if len(model_rows):
+        batch = predictor.predict_tasks_batch(rows[model_rows])
+        recommended = batch['recommended_task'].tolist()
+        confidence = batch['confidence'].tolist()
+        top_tasks = batch['alternative_tasks'].tolist()
+        top_confidence = batch['alternative_confidence'].tolist()
+
+        for j, i in enumerate(model_rows):
+            result = {
+                'recommended_task': recommended[j],
+                'confidence': confidence[j],
+                'alternative_tasks': [{'task': task, 'confidence': conf}
+                                      for task, conf in zip(top_tasks[j], top_confidence[j])],
+                'current_conditions': conditions[i]
+            }
+            responses[positions[i]] = with_id(format_response(result), records[positions[i]])
+
+    return responses
+
+
+def error_response(record, message=None):
+    return with_id({
+        'success': False,
+        'error': message or record['error'],
+        'tasks': [],
+        'overall_confidence': 0
+    }, record)
+
+
+def with_id(response, record):
+    if 'id' in record:
+        response['id'] = record['id']
+    return response
+
+
+def predict_stream(predictor, records, chunk_size=4096):
+    """Yield one response per record, holding at most chunk_size records in memory"""
+    records = iter(records)
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            return
+        yield from predict_chunk(predictor, chunk)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Predict tasks for a JSONL or CSV file of condition records')
+    parser.add_argument('input', help="records file, or - for stdin")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help='input format (default: from the file extension)')
+    parser.add_argument('--output', default='-', help="JSONL results file, or - for stdout")
+    parser.add_argument('--chunk-size', type=int, default=4096, help='records scored per vectorized pass')
+    parser.add_argument('--model', default=os.environ.get('PREDICTOR_MODEL_PATH', 'farming_model.joblib'),
+                        help='saved model to load; a new one is trained if it is missing')
+    parser.add_argument('--table', action='store_true',
+                        help='answer from the decision table (task and confidence only, no alternatives)')
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('csv' if args.input.lower().endswith('.csv') else 'jsonl')
+
+    # Keep stdout clean for results while the model loads
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        predictor = load_predictor(args.model, table=args.table)
+    finally:
+        sys.stdout = stdout
+    if not predictor.is_trained:
+        print("❌ No model available for batch prediction", file=sys.stderr)
+        sys.exit(1)
+
+    source = sys.stdin if args.input == '-' else open(args.input, 'r', encoding='utf-8', newline='')
+    sink = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    start = time.perf_counter()
+    count = 0
+    try:
+        for response in predict_stream(predictor, read_records(source, fmt), args.chunk_size):
+            sink.write(json.dumps(response) + '\n')
+            count += 1
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ {count} records in {elapsed:.2f}s ({count / elapsed if elapsed else 0:.0f} per second)",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
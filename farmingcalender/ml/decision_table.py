@@ -0,0 +1,191 @@
+# decision_table.py - Precomputed predictions over a quantized condition grid
+import argparse
+import bisect
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+from forest_engine import forest_fingerprint
+
+# (first, last, step) of the sampled values per feature, over the predictor's input ranges:
+# crop_age, temperature, humidity, rainfall, soil_moisture, season
+DEFAULT_GRID = [(1, 120, 5), (15, 40, 1), (30, 90, 10), (0, 20, 1), (20, 80, 5), (1, 4, 1)]
+
+
+def axis_cells(first, last, step, rule_edges=()):
+    """Cell edges and one representative value per cell for one feature.
+
+    Sampled values get a cell each, split halfway between neighbours, and
+    every expert-rule edge is a cell edge too, so no cell straddles a rule.
+    A value v falls in cell i when edges[i-1] < v <= edges[i]; the outer
+    cells are unbounded. A cell is represented by its sampled value, or by
+    its upper edge if a rule edge left it without one.
+    """
+    points = np.append(np.arange(first, last, step, dtype=np.float64), float(last))
+    edges = np.unique(np.concatenate([(points[:-1] + points[1:]) / 2, np.asarray(rule_edges, dtype=np.float64)]))
+
+    representatives = np.append(edges, edges[-1] + step)
+    representatives[np.searchsorted(edges, points, side='left')] = points
+    return edges, representatives
+
+
+class DecisionTable:
+    """Recommended task and confidence for every cell of a condition grid.
+
+    Built once from a trained predictor (forest plus expert rules) and
+    stored as one uint8 task code and one float16 confidence per cell, so
+    serving a prediction is six bisections and one array index. Results
+    are exact on the grid's sampled values, and the expert rules are exact
+    everywhere because their thresholds are cell edges; between sampled
+    values the forest's part of the answer is that of the cell's sample.
+    Conditions outside the grid use the nearest outer cell. NaN and
+    infinite conditions have no cell: lookups reject them, and callers
+    send them to the predictor instead.
+    """
+
+    def __init__(self, edges, tasks, recommended, confidence, signature):
+        self.edges = [np.asarray(axis_edges, dtype=np.float64) for axis_edges in edges]
+        self.tasks = np.asarray(tasks)
+        self.recommended = recommended
+        self.confidence = confidence
+        self.signature = signature
+
+        self.shape = tuple(len(axis_edges) + 1 for axis_edges in self.edges)
+        self.strides = [int(np.prod(self.shape[axis + 1:])) for axis in range(len(self.shape))]
+        self._edge_lists = [axis_edges.tolist() for axis_edges in self.edges]
+        self._task_list = self.tasks.tolist()
+
+    @classmethod
+    def build(cls, predictor, grid=DEFAULT_GRID, block_size=1 << 18):
+        """Evaluate the predictor's forest and expert rules on every cell"""
+        axes = [axis_cells(first, last, step, predictor.expert_rule_edges.get(axis, ()))
+                for axis, (first, last, step) in enumerate(grid)]
+        edges = [axis_edges for axis_edges, _ in axes]
+        representatives = [values for _, values in axes]
+        shape = tuple(len(values) for values in representatives)
+
+        tasks = np.unique(np.append(predictor.model.classes_, predictor.expert_rule_tasks)).astype(str)
+        if len(tasks) > 256:
+            raise ValueError('too many tasks for uint8 codes')
+
+        cells = int(np.prod(shape))
+        recommended = np.empty(cells, dtype=np.uint8)
+        confidence = np.empty(cells, dtype=np.float16)
+        for start in range(0, cells, block_size):
+            index = np.unravel_index(np.arange(start, min(start + block_size, cells)), shape)
+            X = np.column_stack([values[i] for values, i in zip(representatives, index)])
+            batch = predictor.predict_tasks_batch(X, top_k=1)
+            recommended[start:start + len(X)] = np.searchsorted(tasks, batch['recommended_task'].astype(str))
+            confidence[start:start + len(X)] = batch['confidence']
+
+        return cls(edges, tasks, recommended, confidence, model_signature(predictor))
+
+    def matches(self, predictor):
+        """True if this table was built from the predictor's current model and scaler"""
+        return np.array_equal(self.signature, model_signature(predictor))
+
+    def lookup(self, X):
+        """(recommended tasks, confidences) for an (N, 6) array of finite conditions"""
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(self.edges))
+        if not np.isfinite(X).all():
+            raise ValueError('decision table conditions must be finite')
+        index = np.zeros(len(X), dtype=np.intp)
+        for axis, axis_edges in enumerate(self.edges):
+            index += np.searchsorted(axis_edges, X[:, axis], side='left') * self.strides[axis]
+        confidence = np.round(self.confidence[index].astype(np.float64), 1)
+        return self.tasks[self.recommended[index]], confidence
+
+    def lookup_one(self, conditions):
+        """(recommended task, confidence) for one row of finite conditions, without building arrays"""
+        index = 0
+        for value, axis_edges, stride in zip(conditions, self._edge_lists, self.strides):
+            value = float(value)
+            if not math.isfinite(value):
+                raise ValueError('decision table conditions must be finite')
+            index += bisect.bisect_left(axis_edges, value) * stride
+        return self._task_list[self.recommended[index]], round(float(self.confidence[index]), 1)
+
+    def nbytes(self):
+        return self.recommended.nbytes + self.confidence.nbytes
+
+    def save(self, path):
+        arrays = {f'edges_{axis}': axis_edges for axis, axis_edges in enumerate(self.edges)}
+        np.savez(path, tasks=self.tasks, recommended=self.recommended, confidence=self.confidence,
+                 signature=self.signature, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            edges = [data[f'edges_{axis}'] for axis in range(sum(name.startswith('edges_') for name in data.files))]
+            return cls(edges, data['tasks'], data['recommended'], data['confidence'], data['signature'])
+
+
+def model_signature(predictor):
+    """Scaler parameters and the forest's fingerprint, enough to tell models apart"""
+    forest = b''
+    if hasattr(predictor.model, 'estimators_'):
+        forest = bytes.fromhex(forest_fingerprint(predictor.model))
+    return np.concatenate([predictor.scaler.mean_, predictor.scaler.scale_,
+                           np.frombuffer(forest, dtype=np.uint8).astype(np.float64)])
+
+
+def table_path(model_path):
+    """Where the decision table for a saved model lives"""
+    return os.path.splitext(model_path)[0] + '.table.npz'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the task predictor's decision table and check it")
+    parser.add_argument('--model', default=os.environ.get('PREDICTOR_MODEL_PATH', 'farming_model.joblib'))
+    parser.add_argument('--check', action='store_true', help='compare the table with the live predictor and exit')
+    parser.add_argument('--samples', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    from task_predictor import load_predictor
+
+    predictor = load_predictor(args.model, table=args.check)
+    if not predictor.is_trained:
+        print("❌ No model to build a table from")
+        sys.exit(1)
+
+    if args.check:
+        table, predictor.table = predictor.table, None
+        rng = np.random.default_rng(args.seed)
+
+        # Sampled grid values must match exactly
+        grid = [axis_cells(first, last, step) for first, last, step in DEFAULT_GRID]
+        X = np.column_stack([rng.choice(values, args.samples) for _, values in grid])
+        live = predictor.predict_tasks_batch(X, top_k=1)
+        tasks, confidence = table.lookup(X)
+        mismatches = np.flatnonzero((tasks != live['recommended_task'].astype(str)) | (confidence != live['confidence']))
+        if len(mismatches):
+            print(f"❌ {len(mismatches)} of {args.samples} grid points differ, first: {X[mismatches[0]]}")
+            sys.exit(1)
+
+        # Anywhere in the input ranges the answer is the nearest sample's
+        low = np.array([first for first, _, _ in DEFAULT_GRID])
+        high = np.array([last for _, last, _ in DEFAULT_GRID])
+        X = rng.uniform(low, high, (args.samples, len(DEFAULT_GRID)))
+        live = predictor.predict_tasks_batch(X, top_k=1)
+        tasks, _ = table.lookup(X)
+        agreement = np.mean(tasks == live['recommended_task'].astype(str)) * 100
+        print(f"✅ Table matches the predictor on {args.samples} grid points; "
+              f"{agreement:.1f}% of random in-range conditions get the same task")
+        return
+
+    start = time.perf_counter()
+    table = DecisionTable.build(predictor)
+    path = table_path(args.model)
+    if not os.path.exists(args.model):
+        predictor.save_model(args.model)
+    table.save(path)
+    print(f"✅ {len(table.recommended)} cells ({table.nbytes() / 1e6:.1f} MB) built in "
+          f"{time.perf_counter() - start:.1f}s and saved to {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+# forest_engine.py - Random forest flattened into NumPy arrays
+import argparse
+import hashlib
+import os
+import sys
+
+import numpy as np
+
+
+class FlatForest:
+    """A trained RandomForestClassifier as contiguous arrays.
+
+    All trees share one node table: feature, threshold and left/right child
+    per node, with leaves pointing back at themselves so every row can take
+    the same number of steps (the deepest tree's depth). Leaf values are the
+    trees' normalized class probabilities. NaN inputs follow each node's
+    missing_go_to_left like sklearn's trees. Evaluation walks every tree for
+    a whole batch with a few array operations per level, with no sklearn
+    input validation or joblib dispatch. It reproduces
+    RandomForestClassifier.predict_proba bit for bit: inputs are compared
+    as float32 like sklearn's trees, and tree outputs are summed in
+    estimator order before dividing by the number of trees.
+    """
+
+    def __init__(self, feature, threshold, left, right, leaf_values, roots, depth, classes, missing_left=None,
+                 fingerprint=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.missing_left = missing_left  # None for exports made before NaN routing was stored
+        self.left = left
+        self.right = right
+        self.leaf_values = leaf_values
+        self.roots = roots
+        self.depth = int(depth)
+        self.classes_ = classes
+        self.n_trees = len(roots)
+        # forest_fingerprint of the source model; None for exports made before it was stored
+        self.fingerprint = None if fingerprint is None else str(fingerprint)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Flatten a fitted single-output RandomForestClassifier"""
+        if not hasattr(model, 'estimators_'):
+            raise ValueError('model is not a fitted random forest')
+
+        features, thresholds, lefts, rights, missing, values, roots = [], [], [], [], [], [], []
+        offset = 0
+        depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left == -1
+
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, np.inf, tree.threshold))
+            lefts.append(np.where(leaf, nodes, tree.children_left) + offset)
+            rights.append(np.where(leaf, nodes, tree.children_right) + offset)
+            # sklearn before 1.3 has no missing-value support and rejects NaN
+            missing.append(np.asarray(getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count)), dtype=bool))
+
+            # Recent sklearn stores class fractions and returns them as they are;
+            # older versions store weighted counts and normalize in predict_proba
+            value = tree.value[:, 0, :len(model.classes_)]
+            normalizer = value.sum(axis=1)[:, np.newaxis]
+            if not np.allclose(normalizer, 1.0):
+                normalizer[normalizer == 0.0] = 1.0
+                value = value / normalizer
+            values.append(value)
+
+            roots.append(offset)
+            offset += tree.node_count
+            depth = max(depth, tree.max_depth)
+
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            missing_left=np.concatenate(missing),
+            leaf_values=np.concatenate(values).astype(np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            depth=depth,
+            classes=np.asarray(model.classes_),
+            fingerprint=forest_fingerprint(model)
+        )
+
+    def matches(self, model):
+        """True if this engine was exported from model (same classes, splits and thresholds)"""
+        estimators = getattr(model, 'estimators_', None)
+        if self.missing_left is None or self.fingerprint is None:
+            return False
+        if estimators is None or len(estimators) != self.n_trees:
+            return False
+        if not np.array_equal(np.asarray(model.classes_), self.classes_):
+            return False
+        return forest_fingerprint(model) == self.fingerprint
+
+    def apply(self, X):
+        """(rows, trees) index of the leaf each row reaches in each tree"""
+        X = np.asarray(X, dtype=np.float32).reshape(len(X), -1)
+        rows = np.arange(len(X))[:, np.newaxis]
+        nodes = np.repeat(self.roots[np.newaxis, :], len(X), axis=0)
+        for _ in range(self.depth):
+            value = X[rows, self.feature[nodes]]
+            go_left = np.where(np.isnan(value), self.missing_left[nodes], value <= self.threshold[nodes])
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_proba(self, X, block_size=1024):
+        """Same as the source forest's predict_proba"""
+        X = np.asarray(X)
+        proba = np.empty((len(X), len(self.classes_)))
+        for start in range(0, len(X), block_size):
+            leaves = self.apply(X[start:start + block_size])
+            # (trees, rows, classes) summed over trees in estimator order; cumsum
+            # adds strictly in sequence where sum() may pair terms differently
+            proba[start:start + block_size] = np.cumsum(self.leaf_values[leaves.T], axis=0)[-1] / self.n_trees
+        return proba
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    def save(self, path):
+        np.savez(path, feature=self.feature, threshold=self.threshold, left=self.left, right=self.right,
+                 missing_left=self.missing_left, leaf_values=self.leaf_values, roots=self.roots, depth=self.depth,
+                 classes=self.classes_, fingerprint=self.fingerprint)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(**{name: data[name] for name in data.files})
+
+
+def forest_fingerprint(model):
+    """Hash of every tree's split features, thresholds, children and leaf values, to tell retrained forests apart"""
+    digest = hashlib.sha1()
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        for array in (tree.feature, tree.threshold, tree.children_left, tree.children_right, tree.value):
+            digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+def scale_features(scaler, X):
+    """scaler.transform without sklearn's per-call input validation"""
+    if hasattr(scaler, 'mean_') and hasattr(scaler, 'scale_'):
+        return (X - scaler.mean_) / scaler.scale_
+    return scaler.transform(X)
+
+
+def engine_path(model_path):
+    """Where the flattened forest for a saved model lives"""
+    return os.path.splitext(model_path)[0] + '.forest.npz'
+
+
+def check_parity(model, engine, X):
+    """Rows of X on which the engine and sklearn disagree (probabilities compared exactly)"""
+    expected = model.predict_proba(X)
+    actual = engine.predict_proba(X)
+    return np.flatnonzero((expected != actual).any(axis=1))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the task predictor's forest and check it against sklearn")
+    parser.add_argument('--model', default=os.environ.get('PREDICTOR_MODEL_PATH', 'farming_model.joblib'))
+    parser.add_argument('--check', action='store_true', help='compare with sklearn on random conditions and exit')
+    parser.add_argument('--samples', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    from task_predictor import load_predictor
+
+    predictor = load_predictor(args.model)
+    if not predictor.is_trained:
+        print("❌ No model to export")
+        sys.exit(1)
+    engine = FlatForest.from_sklearn(predictor.model)
+
+    if args.check:
+        # Conditions around and beyond the predictor's input ranges
+        rng = np.random.default_rng(args.seed)
+        low = np.array([0, 0, 10, 0, 0, 1])
+        high = np.array([150, 50, 100, 40, 100, 4])
+        conditions = rng.uniform(low, high, (args.samples, 6))
+        conditions[: args.samples // 2] = np.round(conditions[: args.samples // 2])
+        # A missing value in every tenth row, as a null condition becomes NaN
+        conditions[::10, rng.integers(0, 6)] = np.nan
+        X = scale_features(predictor.scaler, conditions)
+
+        mismatches = check_parity(predictor.model, engine, X)
+        if len(mismatches):
+            print(f"❌ {len(mismatches)} of {args.samples} rows differ from sklearn, first: {conditions[mismatches[0]]}")
+            sys.exit(1)
+        print(f"✅ Flattened forest matches sklearn on {args.samples} rows "
+              f"({engine.n_trees} trees, {len(engine.feature)} nodes)")
+        return
+
+    if not os.path.exists(args.model):
+        predictor.save_model(args.model)
+    path = engine_path(args.model)
+    engine.save(path)
+    print(f"✅ Forest exported to {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+# predictor_daemon.py - Long-lived task predictor
+import argparse
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+
+from task_predictor import load_predictor, predict_from_json
+
+
+class PredictorDaemon:
+    """Answers predict_from_json requests with one warm predictor.
+
+    The protocol is newline-delimited JSON: each request line is the object
+    task_predictor_file.py reads from its file, and each gets exactly one
+    response line with the same fields as predict_from_json. An "id" in the
+    request is echoed back so clients can pipeline requests. The line
+    {"command": "stats"} returns request counts and latency instead.
+    Interpreter start, the sklearn import and the model load are paid once
+    at startup rather than on every prediction.
+    """
+
+    def __init__(self, predictor):
+        self.predictor = predictor
+        self.started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.busy_ms = 0.0
+        self._lock = threading.Lock()
+
+    def handle_line(self, line):
+        """Response for one request line, or None for a blank line"""
+        line = line.strip()
+        if not line:
+            return None
+
+        start = time.perf_counter()
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('request must be a JSON object')
+            request_id = request.get('id')
+
+            if request.get('command') == 'stats':
+                response = self.stats()
+            else:
+                response = predict_from_json(request, self.predictor)
+        except json.JSONDecodeError as e:
+            response = error_response(f'JSON parsing failed: {str(e)}')
+        except Exception as e:
+            print(f"❌ Prediction error: {e}", file=sys.stderr)
+            response = error_response(str(e))
+
+        if request_id is not None:
+            response['id'] = request_id
+
+        with self._lock:
+            self.requests += 1
+            self.errors += not response.get('success', False)
+            self.busy_ms += (time.perf_counter() - start) * 1000
+        return response
+
+    def serve_stream(self, lines, write):
+        """Answer every line read from lines by passing one encoded response line to write"""
+        for line in lines:
+            response = self.handle_line(line)
+            if response is not None:
+                write(json.dumps(response) + '\n')
+
+    def serve_stdio(self):
+        # Responses own stdout; anything the predictor prints goes to stderr
+        out = sys.stdout
+        sys.stdout = sys.stderr
+
+        def write(text):
+            out.write(text)
+            out.flush()
+
+        self.serve_stream(sys.stdin, write)
+
+    def serve_socket(self, path):
+        """Serve each connection to a Unix socket on its own thread until interrupted"""
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                def write(text):
+                    self.wfile.write(text.encode('utf-8'))
+                    self.wfile.flush()
+
+                try:
+                    daemon.serve_stream((raw.decode('utf-8', errors='replace') for raw in self.rfile), write)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        if os.path.exists(path):
+            os.remove(path)  # left behind by a previous run
+
+        server = socketserver.ThreadingUnixStreamServer(path, Handler)
+        server.daemon_threads = True
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # so the socket file is removed
+        print(f"✅ Predictor listening on {path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if os.path.exists(path):
+                os.remove(path)
+
+    def stats(self):
+        with self._lock:
+            served = self.requests
+            return {
+                'success': True,
+                'requests': served,
+                'errors': self.errors,
+                'mean_ms': round(self.busy_ms / served, 3) if served else 0.0,
+                'uptime_seconds': round(time.monotonic() - self.started, 1)
+            }
+
+
+def error_response(message):
+    return {
+        'success': False,
+        'error': message,
+        'tasks': [],
+        'overall_confidence': 0
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve task predictions as newline-delimited JSON')
+    parser.add_argument('--socket', default=os.environ.get('PREDICTOR_SOCKET'),
+                        help='Unix socket path to listen on (default: stdin/stdout)')
+    parser.add_argument('--model', default=os.environ.get('PREDICTOR_MODEL_PATH', 'farming_model.joblib'),
+                        help='saved model to load; a new one is trained if it is missing')
+    parser.add_argument('--table', action='store_true', default=os.environ.get('PREDICTOR_TABLE') == '1',
+                        help='answer from the decision table (task and confidence only, no alternatives)')
+    args = parser.parse_args(argv)
+
+    # Keep stdout clean for responses while the model loads
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        daemon = PredictorDaemon(load_predictor(args.model, table=args.table))
+    finally:
+        sys.stdout = stdout
+
+    if args.socket:
+        daemon.serve_socket(args.socket)
+    else:
+        print("✅ Predictor ready on stdin/stdout", file=sys.stderr)
+        daemon.serve_stdio()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,40 @@
 # task_predictor.py - Advanced Farming Task Predictor
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
-import pandas as pd
-import joblib
 import os
 from datetime import datetime
 
+from decision_table import DecisionTable, table_path
+from forest_engine import FlatForest, engine_path, scale_features
+
+# Inputs predict_from_json assumes when a request leaves them out
+DEFAULT_CONDITIONS = {
+    'crop_age': 30,
+    'temperature': 25,
+    'humidity': 60,
+    'rainfall': 0,
+    'soil_moisture': 40,
+    'season': 2
+}
+
 class AdvancedFarmingTaskPredictor:
+    # Above this many rows sklearn's compiled trees beat the flattened forest
+    engine_max_rows = 64
+    
+    # Tasks the expert rules can recommend, and by feature index the values their
+    # conditions switch at (v <= edge is below it), for decision_table.py
+    expert_rule_tasks = ['drainage_check', 'irrigation', 'shade_management', 'frost_protection', 'pest_control']
+    expert_rule_edges = {
+        0: [np.nextafter(40, -np.inf), 60],  # flowering: 40 <= crop_age <= 60
+        1: [np.nextafter(10, -np.inf), 35],  # temp < 10, temp > 35
+        3: [10],                             # rain > 10
+        4: [np.nextafter(25, -np.inf), 70]   # soil_moisture < 25, soil_moisture > 70
+    }
+    
     def __init__(self):
         self.model = None
-        self.scaler = StandardScaler()
+        self.scaler = None  # created on first training; sklearn is imported lazily
+        self.engine = None  # flattened forest for low-latency predictions (forest_engine.py)
+        self.table = None   # optional precomputed decisions (decision_table.py)
         self.is_trained = False
         
         # Feature names for better interpretation
@@ -107,7 +131,12 @@ class AdvancedFarmingTaskPredictor:
     def train_model(self):
         """Train the Random Forest model"""
         try:
+            # sklearn takes over a second to import, so only load it when training
+            from sklearn.ensemble import RandomForestClassifier
+            from sklearn.preprocessing import StandardScaler
+            
             # Scale the features
+            self.scaler = StandardScaler()
             X_scaled = self.scaler.fit_transform(self.X_train)
             
             # Create and train Random Forest classifier
@@ -118,6 +147,7 @@ class AdvancedFarmingTaskPredictor:
             )
             
             self.model.fit(X_scaled, self.y_train)
+            self.engine = FlatForest.from_sklearn(self.model)
             self.is_trained = True
             
             # Calculate training accuracy
@@ -138,34 +168,16 @@ class AdvancedFarmingTaskPredictor:
                 return self.fallback_prediction(crop_age, temperature, humidity, rainfall, soil_moisture, season)
         
         try:
-            # Prepare input features
-            input_features = np.array([[crop_age, temperature, humidity, rainfall, soil_moisture, season]])
-            
-            # Scale features
-            input_scaled = self.scaler.transform(input_features)
-            
-            # Make prediction
-            prediction = self.model.predict(input_scaled)[0]
-            probabilities = self.model.predict_proba(input_scaled)[0]
-            
-            # Get top 3 predictions
-            class_indices = np.argsort(probabilities)[-3:][::-1]
-            top_tasks = [self.model.classes_[i] for i in class_indices]
-            top_probabilities = [probabilities[i] for i in class_indices]
-            
-            # Apply expert rules for final decision
-            final_recommendation = self.apply_expert_rules(
-                prediction, crop_age, temperature, humidity, rainfall, soil_moisture
-            )
+            batch = self.predict_tasks_batch([[crop_age, temperature, humidity, rainfall, soil_moisture, season]])
             
             return {
-                'recommended_task': final_recommendation,
-                'confidence': round(max(probabilities) * 100, 1),
+                'recommended_task': batch['recommended_task'][0],
+                'confidence': batch['confidence'][0],
                 'alternative_tasks': [
-                    {'task': task, 'confidence': round(prob * 100, 1)}
-                    for task, prob in zip(top_tasks, top_probabilities)
+                    {'task': task, 'confidence': confidence}
+                    for task, confidence in zip(batch['alternative_tasks'][0], batch['alternative_confidence'][0])
                 ],
-                'all_predictions': dict(zip(self.model.classes_, probabilities)),
+                'all_predictions': dict(zip(self.model.classes_, batch['probabilities'][0])),
                 'current_conditions': {
                     'crop_age': crop_age,
                     'temperature': temperature,
@@ -180,32 +192,82 @@ class AdvancedFarmingTaskPredictor:
             print(f"❌ Prediction error: {e}")
             return self.fallback_prediction(crop_age, temperature, humidity, rainfall, soil_moisture, season)
     
-    def apply_expert_rules(self, ml_prediction, crop_age, temp, humidity, rain, soil_moisture):
-        """Apply farming expert rules to refine ML prediction"""
-        # Rule 1: If heavy rain predicted, prioritize drainage
-        if rain > 10:
-            return 'drainage_check'
+    def predict_tasks_batch(self, conditions, top_k=3):
+        """Predict tasks for many rows of conditions at once.
+        
+        conditions is an (N, 6) array-like in feature order, or a DataFrame
+        with the feature columns. Returns arrays, one entry per row:
+        recommended_task (after the expert rules), ml_prediction, confidence
+        (percent), alternative_tasks and alternative_confidence (N, top_k)
+        and the raw class probabilities (N, classes).
+        """
+        if not self.is_trained and not self.train_model():
+            raise RuntimeError('model is not trained')
         
-        # Rule 2: If soil moisture very low, prioritize irrigation
-        if soil_moisture < 25:
-            return 'irrigation'
+        if hasattr(conditions, 'columns'):
+            conditions = conditions[self.features] if set(self.features) <= set(conditions.columns) else conditions.to_numpy()
+        X = np.asarray(conditions, dtype=np.float64).reshape(-1, len(self.features))
         
-        # Rule 3: If soil moisture very high, avoid irrigation
-        if soil_moisture > 70 and ml_prediction == 'irrigation':
-            return 'drainage_check'
+        # The forest's predict is the argmax of its probabilities
+        probabilities = self.forest_probabilities(scale_features(self.scaler, X))
+        classes = self.model.classes_
+        ml_predictions = classes[probabilities.argmax(axis=1)]
+        
+        top = np.argsort(probabilities, axis=1)[:, -top_k:][:, ::-1]
+        return {
+            'recommended_task': self.apply_expert_rules_many(ml_predictions, X),
+            'ml_prediction': ml_predictions,
+            'confidence': np.round(probabilities.max(axis=1) * 100, 1),
+            'alternative_tasks': classes[top],
+            'alternative_confidence': np.round(np.take_along_axis(probabilities, top, axis=1) * 100, 1),
+            'probabilities': probabilities
+        }
+    
+    def forest_probabilities(self, input_scaled):
+        """Class probabilities averaged tree by tree, same as model.predict_proba.
+
+        Calling the trees directly skips the input validation and joblib
+        dispatch that cost several milliseconds per single-row prediction;
+        small batches go through the flattened forest, which is faster still.
+        """
+        if self.engine is not None and len(input_scaled) <= self.engine_max_rows:
+            return self.engine.predict_proba(input_scaled)
+        if not hasattr(self.model, 'estimators_'):
+            return self.model.predict_proba(input_scaled)
         
-        # Rule 4: If temperature extreme, adjust tasks
-        if temp > 35:
-            return 'shade_management'
-        elif temp < 10:
-            return 'frost_protection'
+        X = np.asarray(input_scaled, dtype=np.float32)
+        total = np.zeros((len(X), len(self.model.classes_)))
+        for estimator in self.model.estimators_:
+            total += estimator.predict_proba(X, check_input=False)
+        return total / len(self.model.estimators_)
+    
+    def apply_expert_rules(self, ml_prediction, crop_age, temp, humidity, rain, soil_moisture):
+        """Apply farming expert rules to refine ML prediction"""
+        conditions = np.array([[crop_age, temp, humidity, rain, soil_moisture, 0]], dtype=np.float64)
+        return self.apply_expert_rules_many([ml_prediction], conditions)[0]
+    
+    def apply_expert_rules_many(self, ml_predictions, conditions):
+        """apply_expert_rules for an (N, 6) array of conditions; the first matching rule wins.
         
-        # Rule 5: Growth stage based adjustments
-        if 40 <= crop_age <= 60:  # Flowering stage
-            if ml_prediction in ['irrigation', 'fertilizer']:
-                return 'pest_control'  # Pests common during flowering
+        Keep expert_rule_tasks and expert_rule_edges in step with these rules.
+        """
+        crop_age, temp, rain, soil_moisture = conditions[:, 0], conditions[:, 1], conditions[:, 3], conditions[:, 4]
+        ml_predictions = np.asarray(ml_predictions, dtype=object)
         
-        return ml_prediction
+        rules = [
+            # Rule 1: If heavy rain predicted, prioritize drainage
+            (rain > 10, 'drainage_check'),
+            # Rule 2: If soil moisture very low, prioritize irrigation
+            (soil_moisture < 25, 'irrigation'),
+            # Rule 3: If soil moisture very high, avoid irrigation
+            ((soil_moisture > 70) & (ml_predictions == 'irrigation'), 'drainage_check'),
+            # Rule 4: If temperature extreme, adjust tasks
+            (temp > 35, 'shade_management'),
+            (temp < 10, 'frost_protection'),
+            # Rule 5: Pests common during flowering
+            ((crop_age >= 40) & (crop_age <= 60) & np.isin(ml_predictions, ['irrigation', 'fertilizer']), 'pest_control')
+        ]
+        return np.select([mask for mask, _ in rules], [task for _, task in rules], default=ml_predictions)
     
     def fallback_prediction(self, crop_age, temperature, humidity, rainfall, soil_moisture, season):
         """Fallback rule-based prediction if ML fails"""
@@ -263,49 +325,110 @@ class AdvancedFarmingTaskPredictor:
     def save_model(self, filepath='farming_model.joblib'):
         """Save trained model to file"""
         if self.is_trained:
+            import joblib
             joblib.dump({
                 'model': self.model,
                 'scaler': self.scaler,
                 'features': self.features
             }, filepath)
             print(f"✅ Model saved to {filepath}")
+            if self.engine is not None:
+                self.engine.save(engine_path(filepath))
     
     def load_model(self, filepath='farming_model.joblib'):
         """Load trained model from file"""
         try:
             if os.path.exists(filepath):
+                import joblib
                 loaded = joblib.load(filepath)
                 self.model = loaded['model']
                 self.scaler = loaded['scaler']
                 self.features = loaded['features']
+                self.engine = self.load_engine(filepath)
                 self.is_trained = True
                 print(f"✅ Model loaded from {filepath}")
                 return True
         except Exception as e:
             print(f"❌ Error loading model: {e}")
         return False
+    
+    def load_table(self, filepath='farming_model.joblib'):
+        """Decision table saved next to the model, built and saved if it is missing or stale"""
+        path = table_path(filepath)
+        if os.path.exists(path):
+            table = DecisionTable.load(path)
+            if table.matches(self):
+                print(f"✅ Decision table loaded from {path}")
+                return table
+            print(f"⚠️ {path} was built from a different model, rebuilding")
+        
+        print("Building decision table...")
+        table = DecisionTable.build(self)
+        table.save(path)
+        print(f"✅ Decision table saved to {path}")
+        return table
+    
+    def load_engine(self, filepath='farming_model.joblib'):
+        """Flattened forest exported next to the model, else one compiled from the loaded model"""
+        path = engine_path(filepath)
+        if os.path.exists(path):
+            engine = FlatForest.load(path)
+            if engine.matches(self.model):
+                return engine
+            print(f"⚠️ {path} was exported from a different model, recompiling")
+        if not hasattr(self.model, 'estimators_'):
+            return None
+        return FlatForest.from_sklearn(self.model)
 
-def predict_from_json(json_data):
-    """Make prediction from JSON input for API calls"""
+def load_predictor(filepath='farming_model.joblib', table=False):
+    """Predictor with the saved model loaded, or a freshly trained one.
+    
+    With table=True predictions come from the model's decision table
+    (recommended task and confidence only, no alternatives).
+    """
     predictor = AdvancedFarmingTaskPredictor()
     
     # Try to load saved model first
-    if not predictor.load_model():
+    if not predictor.load_model(filepath):
         print("Training new model...")
-        predictor.train_model()
+        if predictor.train_model() and table:
+            predictor.save_model(filepath)
+    if table and predictor.is_trained:
+        predictor.table = predictor.load_table(filepath)
+    return predictor
+
+def predict_from_json(json_data, predictor=None):
+    """Make prediction from JSON input for API calls.
     
-    # Extract parameters
-    crop_age = json_data.get('crop_age', 30)
-    temperature = json_data.get('temperature', 25)
-    humidity = json_data.get('humidity', 60)
-    rainfall = json_data.get('rainfall', 0)
-    soil_moisture = json_data.get('soil_moisture', 40)
-    season = json_data.get('season', 2)
+    Pass a loaded predictor to reuse it (see predictor_daemon.py); without
+    one the model is loaded or trained for this call alone.
+    """
+    if predictor is None:
+        predictor = load_predictor()
     
-    # Make prediction
-    result = predictor.predict_tasks(crop_age, temperature, humidity, rainfall, soil_moisture, season)
+    conditions = conditions_from_json(json_data)
+    if predictor.table is not None:
+        try:
+            task, confidence = predictor.table.lookup_one(conditions)
+            return format_response({
+                'recommended_task': task,
+                'confidence': confidence,
+                'alternative_tasks': [],
+                'current_conditions': dict(zip(DEFAULT_CONDITIONS, conditions))
+            })
+        except (TypeError, ValueError):
+            pass  # not finite numbers; predict_tasks handles those
     
-    # Format response for API
+    # Make prediction
+    result = predictor.predict_tasks(*conditions)
+    return format_response(result)
+
+def conditions_from_json(json_data):
+    """Request's conditions in feature order, with the defaults filled in"""
+    return [json_data.get(name, default) for name, default in DEFAULT_CONDITIONS.items()]
+
+def format_response(result):
+    """API response for one predict_tasks result"""
     response = {
         'success': True,
         'tasks': [
@@ -11,7 +11,15 @@ except ImportError as e:
     sys.exit(1)
 
 if __name__ == "__main__":
-    if len(sys.argv) > 2 and sys.argv[1] == '--file':
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        # Stay up and answer one JSON request per line (see predictor_daemon.py)
+        from predictor_daemon import main
+        main(sys.argv[2:])
+    elif len(sys.argv) > 2 and sys.argv[1] == '--batch':
+        # Many records from a JSONL/CSV file or stdin, one JSON result per line (see batch_predict.py)
+        from batch_predict import main
+        main(sys.argv[2:])
+    elif len(sys.argv) > 2 and sys.argv[1] == '--file':
         try:
             input_file = sys.argv[2]
             print(f"Debug: Reading from file: {input_file}", file=sys.stderr)
@@ -0,0 +1,130 @@
+# test_forest_engine.py - FlatForest must match sklearn's predict_proba exactly
+import contextlib
+import copy
+import io
+
+import numpy as np
+import pytest
+
+import advanced_ml_predictor
+import task_predictor
+from forest_engine import FlatForest, scale_features
+
+
+@pytest.fixture(scope='module', params=['task_predictor', 'advanced_ml_predictor'])
+def predictor(request):
+    module = {'task_predictor': task_predictor, 'advanced_ml_predictor': advanced_ml_predictor}[request.param]
+    predictor = module.AdvancedFarmingTaskPredictor()
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert predictor.train_model()
+    return predictor
+
+
+@pytest.fixture(scope='module')
+def engine(predictor):
+    return FlatForest.from_sklearn(predictor.model)
+
+
+def random_rows(predictor, n=5000, seed=0):
+    """Scaled rows around and beyond the training conditions"""
+    rng = np.random.default_rng(seed)
+    X = predictor.X_train
+    low, high = X.min(axis=0), X.max(axis=0)
+    spread = high - low
+    conditions = rng.uniform(low - spread / 2, high + spread / 2, (n, X.shape[1]))
+    conditions[: n // 2] = np.round(conditions[: n // 2])
+    return scale_features(predictor.scaler, conditions)
+
+
+def assert_same_proba(predictor, engine, X):
+    expected = predictor.model.predict_proba(X)
+    actual = engine.predict_proba(X)
+    mismatches = np.flatnonzero((expected != actual).any(axis=1))
+    assert len(mismatches) == 0, f"{len(mismatches)} of {len(X)} rows differ, first: {X[mismatches[0]]}"
+
+
+def test_random_rows_match(predictor, engine):
+    assert_same_proba(predictor, engine, random_rows(predictor))
+
+
+def test_single_rows_match(predictor, engine):
+    X = random_rows(predictor, n=50, seed=1)
+    for row in X:
+        assert np.array_equal(engine.predict_proba(row[np.newaxis]), predictor.model.predict_proba(row[np.newaxis]))
+
+
+def test_rows_with_nan_match(predictor, engine):
+    X = random_rows(predictor, n=3000, seed=2)
+    rng = np.random.default_rng(2)
+    # One missing feature per row, then a few rows missing two or all of them
+    X[np.arange(len(X)), rng.integers(0, X.shape[1], len(X))] = np.nan
+    X[::7, rng.integers(0, X.shape[1])] = np.nan
+    X[::100] = np.nan
+    assert_same_proba(predictor, engine, X)
+
+
+def test_rows_on_split_thresholds_match(predictor, engine):
+    internal = np.isfinite(engine.threshold)
+    X = random_rows(predictor, n=int(internal.sum()), seed=3)
+    rows = np.arange(len(X))
+    feature = engine.feature[internal]
+
+    # Trees compare float32 inputs: the threshold as float32 and its neighbours either side
+    at = engine.threshold[internal].astype(np.float32)
+    for values in (at, np.nextafter(at, np.float32(-np.inf)), np.nextafter(at, np.float32(np.inf))):
+        X[rows, feature] = values
+        assert_same_proba(predictor, engine, X)
+
+
+def test_predict_matches_sklearn(predictor, engine):
+    X = random_rows(predictor, n=2000, seed=4)
+    assert np.array_equal(engine.predict(X), predictor.model.predict(X))
+
+
+def test_save_load_round_trip(predictor, engine, tmp_path):
+    path = tmp_path / 'model.forest.npz'
+    engine.save(path)
+    loaded = FlatForest.load(path)
+
+    assert loaded.matches(predictor.model)
+    X = random_rows(predictor, n=1000, seed=5)
+    X[::5, 0] = np.nan
+    assert np.array_equal(loaded.predict_proba(X), engine.predict_proba(X))
+    assert_same_proba(predictor, loaded, X)
+
+
+def test_matches_rejects_other_models(predictor, engine, tmp_path):
+    from sklearn.ensemble import RandomForestClassifier
+
+    X = scale_features(predictor.scaler, predictor.X_train)
+    other = RandomForestClassifier(n_estimators=engine.n_trees, max_depth=3, random_state=0).fit(X, predictor.y_train)
+    assert not engine.matches(other)
+
+    # A forest with the same shapes but one moved threshold, as a retrain could produce
+    retrained = copy.deepcopy(predictor.model)
+    tree = retrained.estimators_[-1].tree_
+    state = tree.__getstate__()
+    state['nodes']['threshold'][0] += 0.5
+    tree.__setstate__(state)
+    assert not engine.matches(retrained)
+
+    # Exports made before NaN routing or the fingerprint were stored are recompiled rather than trusted
+    path = tmp_path / 'old.forest.npz'
+    np.savez(path, feature=engine.feature, threshold=engine.threshold, left=engine.left, right=engine.right,
+             leaf_values=engine.leaf_values, roots=engine.roots, depth=engine.depth, classes=engine.classes_)
+    assert not FlatForest.load(path).matches(predictor.model)
+    np.savez(path, feature=engine.feature, threshold=engine.threshold, left=engine.left, right=engine.right,
+             missing_left=engine.missing_left, leaf_values=engine.leaf_values, roots=engine.roots,
+             depth=engine.depth, classes=engine.classes_)
+    assert not FlatForest.load(path).matches(predictor.model)
+
+
+def test_task_predictor_uses_engine_with_missing_values():
+    predictor = task_predictor.AdvancedFarmingTaskPredictor()
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert predictor.train_model()
+    assert predictor.engine is not None
+
+    conditions = np.array([[35, 28, np.nan, 0, 40, 2], [50, np.nan, 60, 2, 45, 3]])
+    X = scale_features(predictor.scaler, conditions)
+    assert np.array_equal(predictor.forest_probabilities(X), predictor.model.predict_proba(X))
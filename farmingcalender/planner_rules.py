@@ -0,0 +1,108 @@
+# planner_rules.py
+from datetime import datetime
+
+# Shown in front of a day's main task in the week summary
+TASK_EMOJIS = {
+    'irrigation': '💧',
+    'fertilizer': '🌱',
+    'pest_control': '🐛',
+    'harvest': '🌾',
+    'pruning': '✂️',
+    'weeding': '🌿',
+    'general_care': '✅',
+    'drainage_check': '🌧️',
+    'shade_management': '☀️',
+    'frost_protection': '❄️'
+}
+
+# Goals listed with a weekly plan, by growth stage
+WEEKLY_GOALS = {
+    'germination': [
+        'Achieve 90% germination rate',
+        'Maintain optimal soil moisture',
+        'Prevent fungal diseases'
+    ],
+    'seedling': [
+        'Ensure strong root development',
+        'Prevent leggy growth',
+        'Begin light fertilization'
+    ],
+    'vegetative': [
+        'Promote leaf and stem growth',
+        'Apply nitrogen-rich fertilizer',
+        'Control weeds and pests'
+    ],
+    'flowering': [
+        'Ensure proper pollination',
+        'Apply phosphorus-rich fertilizer',
+        'Monitor for blossom drop'
+    ],
+    'fruiting': [
+        'Support fruit development',
+        'Maintain consistent watering',
+        'Prevent pest damage to fruits'
+    ],
+    'harvest': [
+        'Harvest at optimal ripeness',
+        'Proper post-harvest handling',
+        'Prepare for next cycle'
+    ]
+}
+
+DEFAULT_WEEKLY_GOALS = [
+    'Monitor plant health',
+    'Adjust care as needed',
+    'Maintain optimal growing conditions'
+]
+
+
+def task_relevance_rules(crop_age, temp, humidity, rain, soil_moisture, season):
+    """Whether each task is still relevant; takes scalars or NumPy condition arrays"""
+    return {
+        'irrigation': soil_moisture < 60,
+        'fertilizer': (15 <= crop_age) & (crop_age <= 50) & (rain < 5),
+        'pest_control': (humidity > 70) | (temp > 30),
+        'harvest': crop_age >= 70,
+        'weeding': True,
+        'pruning': (30 <= crop_age) & (crop_age <= 80),
+        'general_care': True,
+        'drainage_check': rain > 5,
+        'shade_management': temp > 35,
+        'frost_protection': temp < 10
+    }
+
+
+def is_task_still_relevant(task, conditions):
+    """Check if task is still relevant"""
+    if len(conditions) < 6:
+        return True
+    return task_relevance_rules(*conditions).get(task, True)
+
+
+def get_weekly_goals(current_stage):
+    """Get weekly goals based on crop stage"""
+    return list(WEEKLY_GOALS.get(current_stage, DEFAULT_WEEKLY_GOALS))
+
+
+def format_single_line_tasks(tasks, date):
+    """Format tasks for single-line display"""
+    if not tasks:
+        return "No tasks scheduled"
+
+    main_task = tasks[0]
+    emoji = TASK_EMOJIS.get(main_task['task'], '✅')
+    task_name = main_task['task'].replace('_', ' ').title()
+
+    # Today's task display
+    if date.date() == datetime.now().date():
+        base_display = f"{emoji} {task_name}"
+        if len(tasks) > 1:
+            return f"{base_display} +{len(tasks)-1} more"
+        return base_display
+
+    # Future day display
+    additional_count = len(tasks) - 1
+    if additional_count > 0:
+        return f"{emoji} {task_name} (+{additional_count})"
+
+    return f"{emoji} {task_name}"
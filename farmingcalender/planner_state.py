@@ -0,0 +1,165 @@
+# planner_state.py
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from q_table import QTable, StateEncoder
+
+
+class PlannerStateStore:
+    """Persistent learning state for RLWeeklyPlanner.
+
+    Q-values and the touched mask live in .npy files (one pair per task set
+    and state bins) mapped into memory with MAP_SHARED, so every worker
+    process on the host reads and updates the same table and a restart maps
+    it back in milliseconds. Files are only ever created whole and moved into
+    place, never rewritten under a worker that has them mapped. Task completion history
+    goes to SQLite in WAL mode, which lets workers read while one writes.
+    Completions are buffered and written in one transaction, together with a
+    flush of the mapped Q-values, at most every snapshot_interval seconds (or
+    once max_pending rows pile up) and at exit.
+
+    With directory=None everything stays in process memory, as before.
+    """
+
+    def __init__(self, actions, directory=None, encoder=None, snapshot_interval=30, max_pending=256):
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval
+        self.max_pending = max_pending
+        self._pending = []  # completion rows not yet written
+        self._lock = threading.Lock()
+        self._last_snapshot = time.monotonic()
+
+        encoder = encoder or StateEncoder()
+        actions = list(actions)
+
+        if directory is None:
+            self._conn = self._connect(':memory:')
+            self.q_table = QTable(actions, encoder)
+        else:
+            os.makedirs(directory, exist_ok=True)
+            self._conn = self._connect(os.path.join(directory, 'planner_state.db'))
+            self.q_table = self._open_q_table(actions, encoder)
+            atexit.register(self.snapshot)
+
+    def _connect(self, path):
+        # Autocommit mode; transactions are opened explicitly
+        conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('''CREATE TABLE IF NOT EXISTS task_completions (
+            task_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            completed INTEGER NOT NULL,
+            timestamp TEXT NOT NULL
+        )''')
+        conn.execute('CREATE INDEX IF NOT EXISTS task_completions_task_id ON task_completions (task_id)')
+        conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        return conn
+
+    def _open_q_table(self, actions, encoder):
+        shape = (encoder.n_states, len(actions))
+        layout = json.dumps({'actions': actions, 'bins': encoder.bins})
+        # Each layout has its own files, so workers of two releases running side
+        # by side during a deploy each keep their table instead of resetting the other's
+        tag = hashlib.sha1(layout.encode('utf-8')).hexdigest()[:12]
+        values_path = os.path.join(self.directory, f'q_values.{tag}.npy')
+        seen_path = os.path.join(self.directory, f'q_seen.{tag}.npy')
+
+        # The exclusive transaction keeps concurrently starting workers from
+        # creating the files twice
+        with self._lock:
+            self._conn.execute('BEGIN EXCLUSIVE')
+            try:
+                row = self._conn.execute("SELECT value FROM meta WHERE key = 'q_layout'").fetchone()
+                if row is not None and row[0] != layout:
+                    print("⚠️ Task set or state bins changed - switching to the Q-table for the new layout")
+
+                if not os.path.exists(values_path):
+                    self._create_array(values_path, np.zeros(shape, dtype=np.float32))
+                if not os.path.exists(seen_path):
+                    # Rebuilt from the surviving values, marking every non-zero entry as learned
+                    values = np.load(values_path, mmap_mode='r')
+                    self._create_array(seen_path, values != 0)
+                    del values
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('q_layout', ?)", (layout,))
+
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+        values = np.lib.format.open_memmap(values_path, mode='r+')
+        seen = np.lib.format.open_memmap(seen_path, mode='r+')
+        return QTable(actions, encoder, values=values, seen=seen)
+
+    def _create_array(self, path, array):
+        """Write array to a temporary file and move it into place, so no worker ever maps a half-written file"""
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(temp_path, path)
+
+    def record_completion(self, task_id, completed, completion_date=None):
+        """Buffer one completion entry; it is written with the next snapshot"""
+        completion_date = completion_date or datetime.now()
+        with self._lock:
+            self._pending.append((
+                str(task_id),
+                completion_date.isoformat(),
+                int(bool(completed)),
+                datetime.now().isoformat()
+            ))
+        self.maybe_snapshot()
+
+    def completion_history(self, task_id):
+        """All completion entries for a task, written and still buffered, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT task_id, date, completed, timestamp FROM task_completions WHERE task_id = ? ORDER BY rowid',
+                (str(task_id),)
+            ).fetchall()
+            rows += [row for row in self._pending if row[0] == str(task_id)]
+
+        return [{'date': date, 'completed': bool(completed), 'timestamp': timestamp}
+                for _, date, completed, timestamp in rows]
+
+    def maybe_snapshot(self):
+        """Snapshot if the interval has passed or enough writes are buffered"""
+        due = time.monotonic() - self._last_snapshot >= self.snapshot_interval
+        if due or len(self._pending) >= self.max_pending:
+            self.snapshot()
+
+    def snapshot(self):
+        """Write buffered completions in one transaction and flush the mapped Q-values"""
+        with self._lock:
+            if self._pending:
+                self._conn.execute('BEGIN')
+                try:
+                    self._conn.executemany('INSERT INTO task_completions VALUES (?, ?, ?, ?)', self._pending)
+                    self._conn.execute('COMMIT')
+                except Exception:
+                    self._conn.execute('ROLLBACK')
+                    raise
+                self._pending = []
+
+            self.q_table.flush()
+            self._last_snapshot = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            stored = self._conn.execute('SELECT COUNT(*) FROM task_completions').fetchone()[0]
+            return {
+                'persistent': self.directory is not None,
+                'stored_completions': stored,
+                'pending_completions': len(self._pending),
+                'seconds_since_snapshot': round(time.monotonic() - self._last_snapshot, 1),
+                'q_table': self.q_table.stats()
+            }
@@ -0,0 +1,126 @@
+# q_table.py
+import numpy as np
+
+# Interior bin edges per state feature; n edges give n + 1 bins.
+# Edges sit on the thresholds the planners' rules use (rain > 5, soil < 30, ...)
+DEFAULT_STATE_BINS = {
+    'crop_age': [10, 20, 30, 40, 50, 60, 70, 80, 90, 100, 110],  # 12 bins, days
+    'temperature': [10, 15, 20, 25, 30, 35, 40],                  # 8 bins, °C
+    'humidity': [40, 55, 70, 85],                                 # 5 bins, %
+    'rain': [1, 5, 10],                                           # 4 bins, mm
+    'soil_moisture': [20, 30, 40, 55, 70],                        # 6 bins, %
+    'season': [2, 3, 4]                                           # 4 bins, 1-4
+}
+
+
+class StateEncoder:
+    """Maps raw (crop_age, temperature, humidity, rain, soil_moisture, season)
+    conditions onto a fixed grid and returns the flat index of the grid cell"""
+
+    def __init__(self, bins=None):
+        bins = bins or DEFAULT_STATE_BINS
+        self.bins = {name: list(edges) for name, edges in bins.items()}
+        self.features = list(bins)
+        self.edges = [np.asarray(bins[name], dtype=np.float64) for name in self.features]
+        self.shape = tuple(len(edges) + 1 for edges in self.edges)
+        self.n_states = int(np.prod(self.shape))
+
+    def encode(self, conditions):
+        """Grid cell index of one state"""
+        return int(self.encode_many(np.asarray(conditions, dtype=np.float64)[None, :len(self.edges)])[0])
+
+    def encode_many(self, conditions):
+        """Grid cell indices of an (n, 6) array of states"""
+        conditions = np.asarray(conditions, dtype=np.float64)
+        cells = [np.searchsorted(edges, conditions[:, i], side='right') for i, edges in enumerate(self.edges)]
+        return np.ravel_multi_index(cells, self.shape)
+
+
+class QTable:
+    """Dense float32 Q-values indexed by (state cell, action).
+
+    Memory is fixed at n_states x n_actions no matter how many distinct
+    conditions are seen. A parallel boolean mask records which
+    (state, action) pairs have been touched, so callers can still tell a
+    learned 0 from "no entry yet". Pass values/seen to back the table with
+    existing arrays, e.g. memory-mapped files shared between processes.
+    """
+
+    def __init__(self, actions, encoder=None, values=None, seen=None):
+        self.encoder = encoder or StateEncoder()
+        self.actions = list(actions)
+        self.action_index = {action: i for i, action in enumerate(self.actions)}
+
+        shape = (self.encoder.n_states, len(self.actions))
+        self.values = values if values is not None else np.zeros(shape, dtype=np.float32)
+        self.seen = seen if seen is not None else np.zeros(shape, dtype=bool)
+        if self.values.shape != shape or self.seen.shape != shape:
+            raise ValueError(f"Q-table arrays must have shape {shape}")
+
+    def state_index(self, state):
+        return self.encoder.encode(state)
+
+    def has(self, state_index, action):
+        return bool(self.seen[state_index, self.action_index[action]])
+
+    def get(self, state_index, action):
+        return float(self.values[state_index, self.action_index[action]])
+
+    def best_action(self, state_index, actions):
+        """Highest-valued action among the candidates (read-only)"""
+        columns = [self.action_index[action] for action in actions]
+        return actions[int(np.argmax(self.values[state_index, columns]))]
+
+    def mark_seen(self, state_index, actions):
+        """Record that the actions were candidates in a state; returns how many were new"""
+        columns = [self.action_index[action] for action in actions]
+        new = int((~self.seen[state_index, columns]).sum())
+        if new:
+            self.seen[state_index, columns] = True
+        return new
+
+    def update(self, state_index, action, reward, next_state_index, learning_rate, discount_factor):
+        """One Q-learning step; returns the new Q-value"""
+        column = self.action_index[action]
+        current_q = self.values[state_index, column]
+        max_next_q = self.values[next_state_index].max()
+
+        new_q = current_q + learning_rate * (reward + discount_factor * max_next_q - current_q)
+        self.values[state_index, column] = new_q
+        self.seen[state_index, column] = True
+        return float(new_q)
+
+    def update_many(self, state_indices, action_columns, rewards, next_state_indices, learning_rate, discount_factor):
+        """Batched Q-learning step over arrays of transitions.
+
+        Transitions landing on the same (state, action) pair share one update
+        with their TD errors averaged, so the result does not depend on the
+        order inside the batch.
+        """
+        values = self.values
+        cells = np.asarray(state_indices) * len(self.actions) + np.asarray(action_columns)
+        targets = np.asarray(rewards, dtype=np.float64) + discount_factor * values[next_state_indices].max(axis=1)
+        td_error = targets - values.reshape(-1)[cells]
+
+        unique_cells, inverse = np.unique(cells, return_inverse=True)
+        mean_error = np.bincount(inverse, weights=td_error) / np.bincount(inverse)
+        values.reshape(-1)[unique_cells] += (learning_rate * mean_error).astype(np.float32)
+        self.seen.reshape(-1)[unique_cells] = True
+
+    def copy(self):
+        """In-memory copy of the table, detached from any mapped files"""
+        return QTable(self.actions, self.encoder, values=np.array(self.values), seen=np.array(self.seen))
+
+    def flush(self):
+        """Write memory-mapped arrays back to disk (no-op for in-memory tables)"""
+        for array in (self.values, self.seen):
+            if isinstance(array, np.memmap):
+                array.flush()
+
+    def stats(self):
+        return {
+            'states': self.encoder.n_states,
+            'actions': len(self.actions),
+            'visited_states': int(self.seen.any(axis=1).sum()),
+            'memory_bytes': int(self.values.nbytes + self.seen.nbytes)
+        }
@@ -0,0 +1,163 @@
+# replay_learner.py
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class ReplayLearner:
+    """Background Q-learning for RLWeeklyPlanner.
+
+    Request handlers only append outcome events to a bounded replay buffer
+    (the oldest events are dropped once it is full) and planned states to a
+    bounded visit queue. A daemon thread marks the visits, drains the buffer
+    in mini-batches, applies one batched update to the planner's learning
+    table (the shared, possibly memory-mapped one owned by the state
+    store) and then publishes a detached copy as planner.q_table. Publishing
+    is a single reference assignment, so serving threads always read one
+    consistent policy and never wait for learning.
+    """
+
+    def __init__(self, planner, capacity=10000, batch_size=256, interval=1.0, refresh_interval=30):
+        self.planner = planner
+        self.table = planner.state_store.q_table
+        self.batch_size = batch_size
+        self.interval = interval
+        self.refresh_interval = refresh_interval  # re-publish to pick up other workers' learning
+
+        self._events = deque(maxlen=capacity)
+        self._visits = deque(maxlen=capacity)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._learn_lock = threading.Lock()
+
+        self.submitted = 0
+        self.dropped = 0
+        self.learned = 0
+        self.skipped = 0
+        self.batches = 0
+        self.last_batch_ms = 0.0
+        self._last_publish = 0.0
+
+        self.publish()
+
+    def submit(self, conditions, task, outcome):
+        """Queue one outcome event ('completed' or 'postponed'); never blocks on learning"""
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append((list(conditions), task, outcome))
+        self.submitted += 1
+        if len(self._events) >= self.batch_size:
+            self._wake.set()
+
+    def submit_visit(self, state_index, actions):
+        """Queue the candidate actions of a planned state, to be marked as seen on the learning table"""
+        self._visits.append((state_index, list(actions)))
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='replay-learner', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the learner thread after learning whatever is still queued"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.learn_pending()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.learn_pending()
+                if time.monotonic() - self._last_publish >= self.refresh_interval:
+                    self.publish()
+            except Exception as e:
+                print(f"❌ Replay learner error: {str(e)}")
+
+    def _take_batch(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._events.popleft())
+            except IndexError:
+                break
+        return batch
+
+    def learn_pending(self):
+        """Drain the buffer in mini-batches; returns the number of events learned"""
+        learned = 0
+        with self._learn_lock:
+            marked = self._mark_visits()
+            batch = self._take_batch()
+            while batch:
+                learned += self._learn_batch(batch)
+                batch = self._take_batch()
+
+            if learned or marked:
+                self.publish()
+                self.planner.state_store.maybe_snapshot()
+        return learned
+
+    def _mark_visits(self):
+        marked = 0
+        while True:
+            try:
+                state_index, actions = self._visits.popleft()
+            except IndexError:
+                return marked
+            marked += self.table.mark_seen(state_index, actions)
+
+    def _learn_batch(self, batch):
+        start = time.perf_counter()
+        planner = self.planner
+        action_index = self.table.action_index
+
+        states, next_states, actions, rewards = [], [], [], []
+        for conditions, task, outcome in batch:
+            if task not in action_index or len(conditions) < 6:
+                self.skipped += 1
+                continue
+            states.append(conditions[:6])
+            next_states.append(planner.predict_conditions(conditions, 1))
+            actions.append(action_index[task])
+            rewards.append(planner.calculate_reward(task, conditions, outcome))
+
+        if actions:
+            encoder = self.table.encoder
+            self.table.update_many(encoder.encode_many(states), np.asarray(actions), np.asarray(rewards),
+                                   encoder.encode_many(next_states),
+                                   planner.learning_rate, planner.discount_factor)
+
+        self.learned += len(actions)
+        self.batches += 1
+        self.last_batch_ms = (time.perf_counter() - start) * 1000
+        return len(actions)
+
+    def publish(self):
+        """Swap a fresh copy of the learning table in as the serving policy"""
+        self.planner.q_table = self.table.copy()
+        self._last_publish = time.monotonic()
+
+    def stats(self):
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'queued': len(self._events),
+            'queued_visits': len(self._visits),
+            'capacity': self._events.maxlen,
+            'submitted': self.submitted,
+            'dropped': self.dropped,
+            'learned': self.learned,
+            'skipped': self.skipped,
+            'batches': self.batches,
+            'last_batch_ms': round(self.last_batch_ms, 2),
+            'seconds_since_publish': round(time.monotonic() - self._last_publish, 1)
+        }
@@ -0,0 +1,168 @@
+# result_cache.py
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from image_ingest import read_image_bytes
+from q_table import StateEncoder
+
+
+def content_digest(data):
+    """Stable hash of raw bytes, used as a cache key"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def stable_digest(*parts):
+    """Stable hash of JSON-serializable values (same in every process, unlike hash())"""
+    return content_digest(json.dumps(parts, sort_keys=True, default=str).encode())
+
+
+def seconds_until_midnight(now=None):
+    """Seconds left in the current local day"""
+    now = now or datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return (midnight - now).total_seconds()
+
+
+class ResultCache:
+    """Thread-safe LRU cache with a size limit, a TTL and hit/miss counters"""
+
+    def __init__(self, maxsize=512, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value; ttl (seconds) overrides the cache default for this entry"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+class CachedDetector:
+    """Answers repeat submissions of the same image from a ResultCache.
+
+    Keys are a hash of the decoded upload bytes, so the same photo hits the
+    cache whether it arrives as base64 JSON, multipart or a raw body. Callers
+    get their own copy of a cached result and may modify it freely.
+    """
+
+    def __init__(self, detector, cache):
+        self.detector = detector
+        self.cache = cache
+
+    def lookup(self, image_data):
+        """Return (key, image_bytes, cached_result or None)"""
+        image_bytes = read_image_bytes(image_data)
+        key = content_digest(image_bytes)
+        cached = self.cache.get(key)
+        return key, image_bytes, (copy.deepcopy(cached) if cached is not None else None)
+
+    def store(self, key, result):
+        if result.get('success'):
+            self.cache.set(key, copy.deepcopy(result))
+
+    def detect_crop_from_image(self, image_data):
+        key, image_bytes, cached = self.lookup(image_data)
+        if cached is not None:
+            cached['cache_hit'] = True
+            return cached
+
+        result = self.detector.detect_crop_from_image(image_bytes)
+        self.store(key, result)
+        return result
+
+
+class CachedWeeklyPlanner:
+    """Deterministic, memoized weekly plans.
+
+    A plan's forecast is seeded from a stable hash of (farm id, crop, stage,
+    days since planting, bucketed conditions, pending tasks, week start), so
+    identical requests get identical plans, and the plan is kept in a
+    ResultCache until the end of the day. Conditions are bucketed with the
+    Q-table's StateEncoder, whose bin edges sit on the planners' rule
+    thresholds. Callers get their own copy of a cached plan.
+    """
+
+    def __init__(self, planner, cache, encoder=None):
+        self.planner = planner
+        self.cache = cache
+        self.encoder = encoder or StateEncoder()
+
+    def plan_key(self, farm_id, crop_info, current_conditions, pending_tasks, week_start):
+        if current_conditions and len(current_conditions) >= 6:
+            condition_bucket = self.encoder.encode(current_conditions)
+        else:
+            condition_bucket = None
+        return stable_digest(
+            farm_id,
+            crop_info.get('crop', 'tomato'),
+            crop_info.get('growth_stage', 'vegetative'),
+            crop_info.get('days_estimate', 30),
+            condition_bucket,
+            pending_tasks or [],
+            week_start
+        )
+
+    def generate_weekly_plan(self, crop_info, current_conditions, pending_tasks=None, farm_id=None):
+        """Return (weekly_plan, cache_hit)"""
+        now = datetime.now()
+        key = self.plan_key(farm_id, crop_info, current_conditions, pending_tasks, now.strftime('%Y-%m-%d'))
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached), True
+
+        rng = np.random.default_rng(int(key[:16], 16))
+        weekly_plan = self.planner.generate_weekly_plan(crop_info, current_conditions, pending_tasks, rng=rng)
+        weekly_plan['plan_id'] = key
+        self.cache.set(key, copy.deepcopy(weekly_plan), ttl=min(self.cache.ttl, seconds_until_midnight(now)))
+        return weekly_plan, False
@@ -0,0 +1,454 @@
+# rl_weekly_planner.py
+import atexit
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from condition_forecast import VARIED_FORECAST, as_condition_lists
+from planner_rules import format_single_line_tasks, get_weekly_goals, is_task_still_relevant
+from planner_state import PlannerStateStore
+from replay_learner import ReplayLearner
+from task_scheduler import DEFAULT_DAILY_CAPACITY, PendingTaskScheduler
+
+
+class RLWeeklyPlanner:
+    def __init__(self, state_dir=None, snapshot_interval=30, async_learning=False,
+                 replay_capacity=10000, replay_batch_size=256, learn_interval=1.0, seed=None,
+                 daily_capacity=DEFAULT_DAILY_CAPACITY):
+        self.learning_rate = 0.1
+        self.discount_factor = 0.9
+        self.exploration_rate = 0.3
+        
+        # Condition forecasts draw from this generator; pass a seed for reproducible plans
+        self.forecast = VARIED_FORECAST
+        self.rng = np.random.default_rng(seed)
+        
+        self.task_config = {
+            'irrigation': {'priority': 1, 'duration': 2, 'max_delay': 2},
+            'fertilizer': {'priority': 2, 'duration': 1, 'max_delay': 3},
+            'pest_control': {'priority': 1, 'duration': 1, 'max_delay': 1},
+            'harvest': {'priority': 1, 'duration': 3, 'max_delay': 0},
+            'pruning': {'priority': 3, 'duration': 2, 'max_delay': 5},
+            'weeding': {'priority': 2, 'duration': 2, 'max_delay': 4},
+            'general_care': {'priority': 4, 'duration': 1, 'max_delay': 7},
+            'drainage_check': {'priority': 1, 'duration': 1, 'max_delay': 1},
+            'shade_management': {'priority': 2, 'duration': 1, 'max_delay': 2},
+            'frost_protection': {'priority': 1, 'duration': 1, 'max_delay': 1}
+        }
+        
+        # Packs pending tasks into each day's labour hours, honouring max_delay
+        self.scheduler = PendingTaskScheduler(self.task_config, daily_capacity)
+        
+        # Q-learning table (binned conditions x tasks) and completion history;
+        # kept on disk and shared between workers when state_dir is set
+        self.state_store = PlannerStateStore(self.task_config, state_dir, snapshot_interval=snapshot_interval)
+        self.q_table = self.state_store.q_table
+        
+        # With async learning, outcome events go to a replay buffer and a
+        # background thread learns from them; self.q_table then holds the
+        # latest published copy of the state store's table
+        self.learner = None
+        if async_learning:
+            self.learner = ReplayLearner(self, capacity=replay_capacity, batch_size=replay_batch_size,
+                                         interval=learn_interval).start()
+            # Registered after the state store's exit snapshot, so it runs first
+            atexit.register(self.learner.stop)
+        
+        # Task sequences for different crops and stages
+        self.crop_task_sequences = {
+            'tomato': {
+                'vegetative': ['irrigation', 'fertilizer', 'weeding', 'general_care'],
+                'flowering': ['irrigation', 'pest_control', 'pruning', 'general_care'],
+                'fruiting': ['irrigation', 'pest_control', 'general_care'],
+                'harvest': ['harvest', 'irrigation', 'general_care']
+            },
+            'rice': {
+                'vegetative': ['irrigation', 'fertilizer', 'weeding'],
+                'flowering': ['irrigation', 'pest_control', 'drainage_check'],
+                'harvest': ['harvest', 'drainage_check']
+            },
+            'chili': {
+                'vegetative': ['irrigation', 'fertilizer', 'weeding'],
+                'flowering': ['irrigation', 'pest_control', 'general_care'],
+                'fruiting': ['irrigation', 'harvest', 'general_care']
+            }
+        }
+    
+    def get_state_key(self, state):
+        """Grid cell of a state in the Q-table (conditions are binned, so similar days share a cell)"""
+        return self.q_table.state_index(state)
+    
+    def choose_action(self, state, possible_actions):
+        """Choose action using epsilon-greedy policy (Real RL)"""
+        state_key = self.get_state_key(state)
+        best_action = self.q_table.best_action(state_key, possible_actions)
+        self.record_visit(state_key, possible_actions)
+        
+        # Exploration vs Exploitation
+        if np.random.random() < self.exploration_rate:
+            return np.random.choice(possible_actions)
+        else:
+            return best_action
+    
+    def record_visit(self, state_key, possible_actions):
+        """Mark the candidates of a planned state as seen on the learning table, never the serving copy"""
+        if self.learner is not None:
+            self.learner.submit_visit(state_key, possible_actions)
+        else:
+            self.state_store.q_table.mark_seen(state_key, possible_actions)
+    
+    def update_q_value(self, state, action, reward, next_state):
+        """Update Q-value using Q-learning algorithm"""
+        state_key = self.get_state_key(state)
+        next_state_key = self.get_state_key(next_state)
+        
+        # Q-learning update formula (always on the learning table, not a published copy)
+        new_q = self.state_store.q_table.update(state_key, action, reward, next_state_key,
+                                                self.learning_rate, self.discount_factor)
+        self.state_store.maybe_snapshot()
+        return new_q
+    
+    def calculate_reward(self, task, conditions, outcome):
+        """Calculate reward based on task performance and conditions"""
+        base_reward = 0
+        
+        if outcome == 'completed':
+            base_reward += 10
+        elif outcome == 'postponed':
+            base_reward -= 5
+        
+        # Reward for weather-appropriate tasks
+        if self.is_weather_appropriate(task, conditions):
+            base_reward += 3
+        
+        # Reward for stage-appropriate tasks
+        crop_age = conditions[0]
+        if self.is_stage_appropriate(task, crop_age):
+            base_reward += 2
+        
+        return base_reward
+    
+    def is_weather_appropriate(self, task, conditions):
+        """Check if task is appropriate for weather"""
+        if len(conditions) < 6:
+            return True
+            
+        _, temp, humidity, rain, _, _ = conditions
+        
+        weather_rules = {
+            'irrigation': rain < 5,
+            'fertilizer': rain < 3 and temp < 35,
+            'pest_control': not (rain > 10),
+            'harvest': rain < 2,
+            'pruning': not (rain > 5 or temp > 35),
+            'drainage_check': rain > 5,
+            'shade_management': temp > 30,
+            'frost_protection': temp < 15
+        }
+        
+        return weather_rules.get(task, True)
+    
+    def is_stage_appropriate(self, task, crop_age):
+        """Check if task is appropriate for crop stage"""
+        stage_rules = {
+            'irrigation': True,  # Always needed
+            'fertilizer': 15 <= crop_age <= 60,
+            'pest_control': crop_age >= 20,
+            'harvest': crop_age >= 70,
+            'pruning': 25 <= crop_age <= 75,
+            'weeding': crop_age >= 10,
+            'general_care': True
+        }
+        
+        return stage_rules.get(task, True)
+    
+    def generate_weekly_plan(self, crop_info, current_conditions, pending_tasks=None):
+        """Generate unified weekly plan with RL optimization"""
+        if pending_tasks is None:
+            pending_tasks = []
+            
+        crop_type = crop_info.get('crop', 'tomato')
+        current_stage = crop_info.get('growth_stage', 'vegetative')
+        days_since_planting = crop_info.get('days_estimate', 30)
+        
+        # Get today's date
+        today = datetime.now()
+        
+        weekly_plan = {
+            'crop': crop_type,
+            'current_stage': current_stage,
+            'days_since_planting': days_since_planting,
+            'generated_date': today.isoformat(),
+            'week_start': today.strftime('%Y-%m-%d'),
+            'daily_plans': {},
+            'carry_over_tasks': [],
+            'weekly_goals': get_weekly_goals(current_stage),
+            'week_summary': [],
+            'rl_used': True  # Indicate RL was used
+        }
+        
+        current_pending = pending_tasks.copy()
+        
+        # The whole week's conditions come from one forecast draw
+        forecast = as_condition_lists(current_conditions, self.forecast.horizon(current_conditions, 7, self.rng))
+        
+        # Generate plan for next 7 days with varied tasks
+        for day_offset in range(7):
+            day_date = today + timedelta(days=day_offset)
+            day_plan = self.generate_unified_daily_plan(
+                day_date, 
+                current_conditions, 
+                crop_info,
+                current_pending,
+                day_offset,
+                forecast[day_offset]
+            )
+            
+            weekly_plan['daily_plans'][day_date.strftime('%Y-%m-%d')] = day_plan
+            
+            # Update pending tasks for next day
+            current_pending = day_plan.get('postponed_tasks', [])
+            
+            # Add to unified week summary
+            weekly_plan['week_summary'].append({
+                'date': day_date.strftime('%Y-%m-%d'),
+                'day_name': day_date.strftime('%A'),
+                'is_today': day_offset == 0,
+                'main_task': day_plan.get('main_task', {}),
+                'additional_tasks': day_plan.get('additional_tasks', []),
+                'postponed_count': len(day_plan.get('postponed_tasks', [])),
+                'total_duration': day_plan.get('total_duration', 0),
+                'single_line_display': format_single_line_tasks(day_plan.get('tasks', []), day_date)
+            })
+        
+        weekly_plan['carry_over_tasks'] = current_pending
+        return weekly_plan
+
+    def generate_unified_daily_plan(self, date, conditions, crop_info, pending_tasks, day_offset, adjusted_conditions=None):
+        """Generate daily plan with RL-optimized task selection"""
+        # Adjust conditions for future days (unless the weekly forecast already did)
+        if adjusted_conditions is None:
+            adjusted_conditions = self.predict_conditions(conditions, day_offset)
+        
+        # Get AI recommendations for this day using RL
+        ai_recommendations = self.get_ai_recommendations_with_rl(adjusted_conditions, crop_info, pending_tasks, day_offset)
+        
+        # Convert to task format
+        main_task = {
+            'id': f"main_{date.strftime('%Y%m%d')}",
+            'task': ai_recommendations,
+            'type': 'ai_recommendation',
+            'priority': 'high',
+            'reason': self.get_task_reason(ai_recommendations, adjusted_conditions, crop_info, day_offset),
+            'estimated_duration': self.task_config.get(ai_recommendations, {}).get('duration', 1),
+            'is_carry_over': False,
+            'rl_confidence': self.get_rl_confidence(adjusted_conditions, ai_recommendations)  # RL confidence score
+        }
+        
+        # Pending tasks by RL score (escalated first) into the hours the main task leaves
+        additional_tasks, postponed_tasks = self.scheduler.schedule_day(
+            pending_tasks,
+            lambda task_data: self.calculate_task_rl_score(task_data, adjusted_conditions),
+            self.scheduler.duration(main_task)
+        )
+        
+        all_tasks = [main_task] + additional_tasks
+        carry_over_count = sum(1 for task in postponed_tasks if task.get('is_carry_over', False))
+        
+        return {
+            'date': date.strftime('%Y-%m-%d'),
+            'day_name': date.strftime('%A'),
+            'day_offset': day_offset,
+            'predicted_conditions': adjusted_conditions,
+            'main_task': main_task,
+            'additional_tasks': additional_tasks,
+            'tasks': all_tasks,
+            'postponed_tasks': postponed_tasks,
+            'total_tasks': len(all_tasks),
+            'total_duration': sum(task.get('estimated_duration', 1) for task in all_tasks),
+            'has_carry_over': carry_over_count > 0,
+            'rl_optimized': True
+        }
+
+    def get_ai_recommendations_with_rl(self, conditions, crop_info, pending_tasks, day_offset):
+        """AI-based task recommendation with RL optimization"""
+        if len(conditions) < 6:
+            return "general_care"
+            
+        crop_age, temp, humidity, rain, soil_moisture, season = conditions
+        crop_type = crop_info.get('crop', 'tomato')
+        current_stage = crop_info.get('growth_stage', 'vegetative')
+        
+        # Get possible actions based on crop sequence
+        possible_actions = self.get_possible_actions(crop_type, current_stage, conditions, day_offset)
+        
+        if not possible_actions:
+            return "general_care"
+        
+        # Use RL to choose optimal action
+        state = self.prepare_rl_state(conditions, crop_info, day_offset)
+        optimal_task = self.choose_action(state, possible_actions)
+        
+        print(f"🤖 RL Selected: {optimal_task} from {possible_actions}")
+        return optimal_task
+
+    def get_possible_actions(self, crop_type, current_stage, conditions, day_offset):
+        """Get possible actions that make sense for the crop and conditions"""
+        crop_age, temp, humidity, rain, soil_moisture, season = conditions
+        
+        # Base possible actions from crop sequence
+        base_actions = self.crop_task_sequences.get(crop_type, {}).get(current_stage, ['general_care'])
+        
+        # Filter based on conditions
+        possible_actions = []
+        
+        for action in base_actions:
+            if self.is_task_relevant(action, conditions, day_offset):
+                possible_actions.append(action)
+        
+        # Always include some variety
+        if len(possible_actions) < 2:
+            possible_actions.extend(['general_care', 'irrigation'])
+        
+        return list(set(possible_actions))
+
+    def is_task_relevant(self, task, conditions, day_offset):
+        """Check if task is relevant given conditions and day"""
+        crop_age, temp, humidity, rain, soil_moisture, season = conditions
+        
+        # Vary tasks based on day offset to prevent repetition
+        day_specific_rules = {
+            0: lambda t: t in ['irrigation', 'general_care'],  # Day 1
+            1: lambda t: t in ['fertilizer', 'weeding'],       # Day 2  
+            2: lambda t: t in ['pest_control', 'pruning'],     # Day 3
+            3: lambda t: t in ['irrigation', 'general_care'],  # Day 4
+            4: lambda t: t in ['harvest', 'weeding'],          # Day 5
+            5: lambda t: t in ['general_care', 'drainage_check'], # Day 6
+            6: lambda t: t in ['irrigation', 'planning']       # Day 7
+        }
+        
+        rule = day_specific_rules.get(day_offset % 7, lambda t: True)
+        if not rule(task):
+            return False
+        
+        # Condition-based rules
+        if task == 'irrigation' and soil_moisture > 70:
+            return False
+        if task == 'fertilizer' and rain > 5:
+            return False
+        if task == 'harvest' and crop_age < 60:
+            return False
+            
+        return True
+
+    def prepare_rl_state(self, conditions, crop_info, day_offset):
+        """Prepare state representation for RL"""
+        crop_age, temp, humidity, rain, soil_moisture, season = conditions
+        
+        # Raw conditions; the Q-table bins them. The day offset is left out so
+        # what is learned on one day of the week applies to the others
+        return [crop_age, temp, humidity, rain, soil_moisture, season]
+
+    def get_rl_confidence(self, conditions, task):
+        """Calculate RL confidence score for the chosen task"""
+        state = self.prepare_rl_state(conditions, {'crop': 'tomato'}, 0)
+        state_key = self.get_state_key(state)
+        
+        if task in self.task_config and self.q_table.has(state_key, task):
+            q_value = self.q_table.get(state_key, task)
+            # Convert Q-value to confidence (0-100%)
+            confidence = min(max((q_value + 10) * 5, 0), 100)
+            return round(confidence, 1)
+        
+        return 75.0  # Default confidence
+
+    def prioritize_pending_tasks_with_rl(self, pending_tasks, conditions):
+        """Use RL to prioritize pending tasks (full ranking; daily plans use self.scheduler)"""
+        if not pending_tasks:
+            return []
+            
+        scored_tasks = []
+        
+        for task in pending_tasks:
+            if isinstance(task, dict):
+                task_data = task
+            else:
+                task_data = {'task': task, 'priority': 'medium', 'days_pending': 0}
+                
+            # Calculate RL-based score
+            rl_score = self.calculate_task_rl_score(task_data, conditions)
+            final_score = self.scheduler.priority_score(task_data, rl_score)
+            scored_tasks.append((final_score, task_data))
+        
+        # Sort by score (descending)
+        scored_tasks.sort(key=lambda x: x[0], reverse=True)
+        return [task for score, task in scored_tasks]
+
+    def calculate_task_rl_score(self, task, conditions):
+        """Calculate RL score for task based on current conditions"""
+        state = self.prepare_rl_state(conditions, {'crop': 'tomato'}, 0)
+        task_name = task['task'] if isinstance(task, dict) else task
+        
+        state_key = self.get_state_key(state)
+        if task_name in self.task_config and self.q_table.has(state_key, task_name):
+            return self.q_table.get(state_key, task_name)
+        
+        # Default scoring based on conditions
+        base_score = 50
+        
+        if is_task_still_relevant(task_name, conditions):
+            base_score += 30
+            
+        if self.is_weather_appropriate(task_name, conditions):
+            base_score += 20
+            
+        return min(base_score, 100)
+
+    def get_task_reason(self, task, conditions, crop_info, day_offset):
+        """Generate reason for task with day-specific context"""
+        crop_age, temp, humidity, rain, soil_moisture, season = conditions
+        crop_type = crop_info.get('crop', 'tomato')
+        
+        # Day-specific reasons
+        day_context = {
+            0: "Start of week - ",
+            1: "Mid-week maintenance - ",
+            2: "Growth phase - ",
+            3: "Regular care - ",
+            4: "Weekend preparation - ",
+            5: "Weekly review - ",
+            6: "End of week - "
+        }
+        
+        context = day_context.get(day_offset % 7, "")
+        
+        reason_map = {
+            'irrigation': f"{context}Soil moisture at {soil_moisture}% - {crop_type} needs water",
+            'fertilizer': f"{context}{crop_type} at day {crop_age} needs nutrients for growth",
+            'pest_control': f"{context}Preventive care with {humidity}% humidity",
+            'harvest': f"{context}{crop_type} ready for harvesting at day {crop_age}",
+            'pruning': f"{context}Optimal time for pruning {crop_type} plants",
+            'weeding': f"{context}Weed control for better {crop_type} growth",
+            'general_care': f"{context}Routine maintenance for healthy {crop_type} plants"
+        }
+        
+        return reason_map.get(task, f"{context}AI-optimized task for {crop_type}")
+
+    def predict_conditions(self, current_conditions, day_offset):
+        """Predict conditions for one future day (see condition_forecast for the noise model)"""
+        forecast = self.forecast.horizon(current_conditions, 1, self.rng, start=day_offset)
+        return as_condition_lists(current_conditions, forecast, start=day_offset)[0]
+
+    def update_task_completion(self, task_id, completed, completion_date=None, task=None, conditions=None):
+        """Update RL model with task completion data"""
+        self.state_store.record_completion(task_id, completed, completion_date)
+        
+        if task not in self.task_config or not conditions or len(conditions) < 6:
+            return
+        
+        outcome = 'completed' if completed else 'postponed'
+        if self.learner is not None:
+            self.learner.submit(conditions, task, outcome)
+        else:
+            reward = self.calculate_reward(task, conditions, outcome)
+            self.update_q_value(conditions, task, reward, self.predict_conditions(conditions, 1))
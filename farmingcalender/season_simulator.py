@@ -0,0 +1,275 @@
+# season_simulator.py
+import argparse
+import os
+import time
+
+import numpy as np
+
+# Days since planting at which each stage ends (crop_stage_detector's stage table)
+STAGE_BY_AGE = [(45, 'vegetative'), (65, 'flowering'), (85, 'fruiting'), (float('inf'), 'harvest')]
+
+# Tasks allowed on each day of the week (RLWeeklyPlanner.is_task_relevant)
+DAY_TASKS = {
+    0: ['irrigation', 'general_care'],
+    1: ['fertilizer', 'weeding'],
+    2: ['pest_control', 'pruning'],
+    3: ['irrigation', 'general_care'],
+    4: ['harvest', 'weeding'],
+    5: ['general_care', 'drainage_check'],
+    6: ['irrigation', 'planning']
+}
+
+# Added when fewer than two tasks are relevant (RLWeeklyPlanner.get_possible_actions)
+FALLBACK_TASKS = ['general_care', 'irrigation']
+
+# Chance a farmer completes the chosen task, by weather suitability
+COMPLETION_PROBABILITY = {True: 0.85, False: 0.35}
+
+
+class SeasonSimulator:
+    """Simulates many crop seasons at once to pre-train RLWeeklyPlanner offline.
+
+    Every array holds one entry per simulated season, and one step plans the
+    same day for all of them. Conditions, candidate tasks and rewards follow
+    the planner's scalar rules (predict_conditions, is_task_relevant,
+    get_possible_actions, calculate_reward) using its crop_task_sequences and
+    task_config tables. check_rules() compares the two. Q-updates are
+    applied in bulk to the planner's own QTable, so training straight into a
+    persistent planner state is picked up by the serving workers.
+    """
+
+    def __init__(self, planner, n_seasons=4096, season_length=120, seed=None):
+        self.planner = planner
+        self.q_table = planner.q_table
+        self.n_seasons = n_seasons
+        self.season_length = season_length
+        self.rng = np.random.default_rng(seed)
+
+        self.actions = self.q_table.actions
+        self.crops = list(planner.crop_task_sequences)
+        self.stages = [stage for _, stage in STAGE_BY_AGE]
+        self.stage_ends = np.array([end for end, _ in STAGE_BY_AGE[:-1]])
+
+        column = self.q_table.action_index
+        self.fallback_mask = self._mask(FALLBACK_TASKS)
+        self.day_mask = np.stack([self._mask(DAY_TASKS[day]) for day in range(7)])
+
+        # (crop, stage, action) -> task is in that crop's sequence for the stage
+        self.sequence_mask = np.zeros((len(self.crops), len(self.stages), len(self.actions)), dtype=bool)
+        for c, crop in enumerate(self.crops):
+            for s, stage in enumerate(self.stages):
+                sequence = planner.crop_task_sequences[crop].get(stage, ['general_care'])
+                self.sequence_mask[c, s] = self._mask(sequence)
+
+        self._irrigation = column['irrigation']
+        self._fertilizer = column['fertilizer']
+        self._harvest = column['harvest']
+
+    def _mask(self, tasks):
+        mask = np.zeros(len(self.actions), dtype=bool)
+        mask[[self.q_table.action_index[task] for task in tasks if task in self.q_table.action_index]] = True
+        return mask
+
+    def initial_conditions(self):
+        """Random starting (crop_age, temp, humidity, rain, soil_moisture, season) per season"""
+        n = self.n_seasons
+        return np.column_stack([
+            self.rng.integers(1, 30, n),
+            self.rng.uniform(12, 40, n),
+            self.rng.uniform(35, 90, n),
+            self.rng.exponential(3, n),
+            self.rng.uniform(20, 80, n),
+            self.rng.integers(1, 5, n)
+        ]).astype(np.float64)
+
+    def predict_conditions(self, base, day_offset):
+        """RLWeeklyPlanner.predict_conditions for every season at once"""
+        return self.planner.forecast.horizon_many(base, 1, self.rng, start=day_offset)[:, 0]
+
+    def possible_actions(self, conditions, crop_index, day_offset):
+        """(seasons, actions) mask of get_possible_actions"""
+        crop_age, rain, soil_moisture = conditions[:, 0], conditions[:, 3], conditions[:, 4]
+        stage_index = np.searchsorted(self.stage_ends, crop_age, side='left')
+
+        relevant = self.sequence_mask[crop_index, stage_index] & self.day_mask[day_offset % 7]
+        relevant[:, self._irrigation] &= soil_moisture <= 70
+        relevant[:, self._fertilizer] &= rain <= 5
+        relevant[:, self._harvest] &= crop_age >= 60
+
+        too_few = relevant.sum(axis=1) < 2
+        relevant[too_few] |= self.fallback_mask
+        return relevant
+
+    def weather_appropriate(self, conditions):
+        """(seasons, actions) mask of is_weather_appropriate"""
+        temp, rain = conditions[:, 1, None], conditions[:, 3, None]
+        rules = {
+            'irrigation': rain < 5,
+            'fertilizer': (rain < 3) & (temp < 35),
+            'pest_control': ~(rain > 10),
+            'harvest': rain < 2,
+            'pruning': ~((rain > 5) | (temp > 35)),
+            'drainage_check': rain > 5,
+            'shade_management': temp > 30,
+            'frost_protection': temp < 15
+        }
+        return self._rule_mask(rules, len(conditions))
+
+    def stage_appropriate(self, conditions):
+        """(seasons, actions) mask of is_stage_appropriate"""
+        crop_age = conditions[:, 0, None]
+        rules = {
+            'fertilizer': (crop_age >= 15) & (crop_age <= 60),
+            'pest_control': crop_age >= 20,
+            'harvest': crop_age >= 70,
+            'pruning': (crop_age >= 25) & (crop_age <= 75),
+            'weeding': crop_age >= 10
+        }
+        return self._rule_mask(rules, len(conditions))
+
+    def _rule_mask(self, rules, n):
+        mask = np.ones((n, len(self.actions)), dtype=bool)
+        for task, rule in rules.items():
+            if task in self.q_table.action_index:
+                mask[:, self.q_table.action_index[task]] = rule[:, 0]
+        return mask
+
+    def choose_actions(self, states, allowed):
+        """Epsilon-greedy action per season, restricted to its allowed tasks"""
+        q_values = np.where(allowed, self.q_table.values[states], -np.inf)
+        greedy = q_values.argmax(axis=1)
+
+        # Uniform pick among allowed tasks: argmax over random keys
+        explore_keys = np.where(allowed, self.rng.random(allowed.shape), -1.0)
+        explore = self.rng.random(len(states)) < self.planner.exploration_rate
+        return np.where(explore, explore_keys.argmax(axis=1), greedy)
+
+    def rewards(self, conditions, actions, completed, weather_ok=None):
+        """calculate_reward for every season's chosen task"""
+        rows = np.arange(len(actions))
+        if weather_ok is None:
+            weather_ok = self.weather_appropriate(conditions)[rows, actions]
+        reward = np.where(completed, 10, -5).astype(np.float32)
+        reward += 3 * weather_ok
+        reward += 2 * self.stage_appropriate(conditions)[rows, actions]
+        return reward
+
+    def update(self, states, actions, rewards, next_states):
+        """Batched Q-learning step; seasons landing on the same (state, action) share one averaged update"""
+        self.q_table.update_many(states, actions, rewards, next_states,
+                                 self.planner.learning_rate, self.planner.discount_factor)
+
+    def run(self, episodes=1):
+        """Simulate episodes x n_seasons full seasons; returns throughput and outcome stats"""
+        encoder = self.q_table.encoder
+        plan_days = 0
+        total_reward = 0.0
+        completions = 0
+        start = time.perf_counter()
+
+        for _ in range(episodes):
+            crop_index = self.rng.integers(0, len(self.crops), self.n_seasons)
+            base = self.initial_conditions()
+            conditions = self.predict_conditions(base, 0)
+            states = encoder.encode_many(conditions)
+
+            for day in range(self.season_length):
+                day_offset = day % 7
+                allowed = self.possible_actions(conditions, crop_index, day_offset)
+                actions = self.choose_actions(states, allowed)
+
+                weather_ok = self.weather_appropriate(conditions)[np.arange(self.n_seasons), actions]
+                completed = self.rng.random(self.n_seasons) < np.where(
+                    weather_ok, COMPLETION_PROBABILITY[True], COMPLETION_PROBABILITY[False])
+                rewards = self.rewards(conditions, actions, completed, weather_ok)
+
+                # Each week is forecast from the last day of the previous one
+                if day_offset == 6:
+                    base = conditions.copy()
+                    base[:, 0] += 1
+                    next_conditions = self.predict_conditions(base, 0)
+                else:
+                    next_conditions = self.predict_conditions(base, day_offset + 1)
+                next_states = encoder.encode_many(next_conditions)
+
+                self.update(states, actions, rewards, next_states)
+
+                plan_days += self.n_seasons
+                total_reward += float(rewards.sum())
+                completions += int(completed.sum())
+                conditions, states = next_conditions, next_states
+
+        elapsed = time.perf_counter() - start
+        return {
+            'plan_days': plan_days,
+            'seconds': round(elapsed, 3),
+            'plan_days_per_second': round(plan_days / elapsed),
+            'mean_reward': round(total_reward / plan_days, 3),
+            'completion_rate': round(completions / plan_days, 3),
+            'q_table': self.q_table.stats()
+        }
+
+    def check_rules(self, samples=500):
+        """Compare the vectorized rules with the planner's scalar methods on random conditions"""
+        conditions = self.initial_conditions()[:samples]
+        conditions[:, 0] = self.rng.integers(1, 120, len(conditions))
+        crop_index = self.rng.integers(0, len(self.crops), len(conditions))
+        weather = self.weather_appropriate(conditions)
+        stage = self.stage_appropriate(conditions)
+        mismatches = []
+
+        for day_offset in range(7):
+            allowed = self.possible_actions(conditions, crop_index, day_offset)
+            for i, row in enumerate(conditions):
+                crop = self.crops[crop_index[i]]
+                stage_name = self.stages[np.searchsorted(self.stage_ends, row[0], side='left')]
+                expected = set(self.planner.get_possible_actions(crop, stage_name, list(row), day_offset))
+                actual = {self.actions[a] for a in np.flatnonzero(allowed[i])}
+                if expected != actual:
+                    mismatches.append(('possible_actions', crop, stage_name, day_offset, list(row)))
+
+        for i, row in enumerate(conditions):
+            for a, task in enumerate(self.actions):
+                if weather[i, a] != self.planner.is_weather_appropriate(task, list(row)):
+                    mismatches.append(('weather', task, list(row)))
+                if stage[i, a] != self.planner.is_stage_appropriate(task, row[0]):
+                    mismatches.append(('stage', task, list(row)))
+
+        return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-train the weekly planner Q-table on simulated seasons')
+    parser.add_argument('--seasons', type=int, default=4096, help='seasons simulated in parallel')
+    parser.add_argument('--days', type=int, default=120, help='plan-days per season')
+    parser.add_argument('--episodes', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--state-dir', default=os.environ.get('PLANNER_STATE_DIR', 'planner_state'),
+                        help='planner state to train into (shared with the serving planner)')
+    parser.add_argument('--check-rules', action='store_true', help='verify the vectorized rules first')
+    args = parser.parse_args()
+
+    from rl_weekly_planner import RLWeeklyPlanner
+
+    planner = RLWeeklyPlanner(state_dir=args.state_dir)
+    simulator = SeasonSimulator(planner, args.seasons, args.days, args.seed)
+
+    if args.check_rules:
+        mismatches = simulator.check_rules()
+        if mismatches:
+            print(f"❌ {len(mismatches)} rule mismatches, first: {mismatches[0]}")
+            raise SystemExit(1)
+        print("✅ Vectorized rules match the planner")
+
+    print(f"🌾 Simulating {args.episodes} x {args.seasons} seasons of {args.days} days...")
+    stats = simulator.run(args.episodes)
+    planner.state_store.snapshot()
+
+    print(f"✅ {stats['plan_days']} plan-days in {stats['seconds']}s "
+          f"({stats['plan_days_per_second']} per second)")
+    print(f"📊 Mean reward {stats['mean_reward']}, completion rate {stats['completion_rate']}, "
+          f"visited states {stats['q_table']['visited_states']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,6 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import numpy as np
-import pandas as pd
-import joblib
 from datetime import datetime
 import os
 import random
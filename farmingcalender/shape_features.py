@@ -0,0 +1,89 @@
+# shape_features.py
+import numpy as np
+
+# Contours smaller than this (in px at 400x400) are treated as noise
+MIN_CONTOUR_AREA = 100
+
+# Circularity bands used for crop shape scoring (open intervals, as before)
+CIRCULARITY_BANDS = {
+    'tomato': (0.7, 1.2),   # round fruits
+    'rice': (None, 0.3),    # long thin shapes
+    'chili': (0.3, 0.6)     # elongated
+}
+
+# Edges of the circularity distribution returned as a feature vector;
+# the last bin also collects everything above 1.2
+CIRCULARITY_BIN_EDGES = np.round(np.linspace(0.0, 1.2, 13), 2)
+
+
+def contour_stats(contours):
+    """Area, perimeter, circularity and bounding box of every contour, as arrays.
+
+    All contour points are concatenated once and reduced per contour with
+    np.add/minimum/maximum.reduceat, instead of calling cv2.contourArea and
+    cv2.arcLength contour by contour. Area is the shoelace formula and the
+    perimeter is the closed polyline length, matching OpenCV.
+    """
+    count = len(contours)
+    if count == 0:
+        empty = np.zeros(0)
+        return {'area': empty, 'perimeter': empty, 'circularity': empty,
+                'bbox': np.zeros((0, 4), dtype=np.int64)}
+
+    lengths = np.fromiter(map(len, contours), dtype=np.intp, count=count)
+    points = np.concatenate(contours).reshape(-1, 2)
+    ends = np.cumsum(lengths) - 1
+    starts = ends - lengths + 1
+
+    x = points[:, 0].astype(np.float64)
+    y = points[:, 1].astype(np.float64)
+
+    # Following point of every point, wrapping around inside each contour
+    next_x = np.empty_like(x)
+    next_y = np.empty_like(y)
+    next_x[:-1] = x[1:]
+    next_y[:-1] = y[1:]
+    next_x[ends] = x[starts]
+    next_y[ends] = y[starts]
+
+    area = np.abs(np.add.reduceat(x * next_y - next_x * y, starts)) / 2
+    dx = next_x - x
+    dy = next_y - y
+    perimeter = np.add.reduceat(np.sqrt(dx * dx + dy * dy), starts)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        circularity = np.where(perimeter > 0, 4 * np.pi * area / (perimeter * perimeter), np.nan)
+
+    left = np.minimum.reduceat(points[:, 0], starts)
+    top = np.minimum.reduceat(points[:, 1], starts)
+    right = np.maximum.reduceat(points[:, 0], starts)
+    bottom = np.maximum.reduceat(points[:, 1], starts)
+    bbox = np.stack([left, top, right - left + 1, bottom - top + 1], axis=1).astype(np.int64)
+
+    return {'area': area, 'perimeter': perimeter, 'circularity': circularity, 'bbox': bbox}
+
+
+def substantial_circularity(stats, min_area=MIN_CONTOUR_AREA):
+    """Circularity of contours with area >= min_area and a non-zero perimeter"""
+    keep = (stats['area'] >= min_area) & (stats['perimeter'] > 0)
+    return stats['circularity'][keep]
+
+
+def band_counts(circularity):
+    """Number of contours falling in each crop's circularity band"""
+    counts = {}
+    for crop, (low, high) in CIRCULARITY_BANDS.items():
+        inside = np.ones(circularity.shape, dtype=bool)
+        if low is not None:
+            inside &= circularity > low
+        if high is not None:
+            inside &= circularity < high
+        counts[crop] = int(np.count_nonzero(inside))
+    return counts
+
+
+def circularity_histogram(circularity):
+    """Distribution of contour circularity over CIRCULARITY_BIN_EDGES"""
+    clipped = np.minimum(circularity, CIRCULARITY_BIN_EDGES[-1])
+    histogram, _ = np.histogram(clipped, bins=CIRCULARITY_BIN_EDGES)
+    return histogram.tolist()
@@ -0,0 +1,119 @@
+# startup_report.py
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Entry points, each measured in its own fresh interpreter
+DEFAULT_MODULES = ['enhanced_crop_detector', 'farming_ai', 'crop_detector', 'app', 'server', 'task_predictor']
+
+# Module-level singletons whose construction is part of cold start
+SINGLETONS = ['enhanced_detector', 'weekly_planner', 'farming_ai', 'predictor']
+
+# Dependencies worth reporting when an import pulls them in
+HEAVY_DEPENDENCIES = ['numpy', 'cv2', 'PIL', 'flask', 'flask_cors', 'pandas', 'joblib', 'sklearn', 'tensorflow']
+
+
+def measure_module(name):
+    """Import one module and re-create its singletons; runs inside the child interpreter"""
+    sys.path[:0] = [HERE, os.path.join(HERE, 'ml')]
+    before = set(sys.modules)
+
+    # The modules log heavily while loading
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        module = __import__(name)
+        import_ms = (time.perf_counter() - start) * 1000
+
+        singletons = {}
+        for attr in SINGLETONS:
+            instance = getattr(module, attr, None)
+            if instance is None or isinstance(instance, type(module)):
+                continue
+            start = time.perf_counter()
+            type(instance)()
+            singletons[attr] = round((time.perf_counter() - start) * 1000, 1)
+
+    loaded = set(sys.modules) - before
+    return {
+        'module': name,
+        'import_ms': round(import_ms, 1),
+        'singletons_ms': singletons,
+        'heavy_dependencies': [dep for dep in HEAVY_DEPENDENCIES if dep in loaded]
+    }
+
+
+def run_child(name):
+    """Measure a module in a fresh interpreter so shared imports do not hide its cost"""
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', name],
+        capture_output=True, text=True, cwd=HERE
+    )
+    if completed.returncode != 0:
+        error = (completed.stderr.strip().splitlines() or ['unknown error'])[-1]
+        return {'module': name, 'error': error}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def print_report(results, budget_ms=None):
+    print(f"{'module':<24}{'import ms':>11}  heavy dependencies loaded")
+    for result in results:
+        if 'error' in result:
+            print(f"{result['module']:<24}{'failed':>11}  {result['error']}")
+            continue
+        print(f"{result['module']:<24}{result['import_ms']:>11.1f}  {', '.join(result['heavy_dependencies']) or '-'}")
+
+    print()
+    print(f"{'singleton':<44}{'init ms':>9}")
+    for result in results:
+        for attr, init_ms in result.get('singletons_ms', {}).items():
+            print(f"{result['module'] + '.' + attr:<44}{init_ms:>9.1f}")
+
+    over_budget = []
+    if budget_ms is not None:
+        for result in results:
+            if 'error' in result:
+                continue
+            # The singletons are built during import, so import_ms already covers them
+            if result['import_ms'] > budget_ms:
+                over_budget.append(result['module'])
+        print()
+        if over_budget:
+            print(f"❌ Over the {budget_ms:.0f} ms budget: {', '.join(over_budget)}")
+        else:
+            print(f"✅ All modules start within {budget_ms:.0f} ms")
+    return over_budget
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold-start import and singleton init times per entry point')
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES)
+    parser.add_argument('--budget-ms', type=float, help='exit with status 1 if any module imports slower than this')
+    parser.add_argument('--json', action='store_true', help='print the raw measurements as JSON')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure_module(args.child)))
+        return
+
+    results = [run_child(name) for name in args.modules]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        over_budget = [r['module'] for r in results
+                       if args.budget_ms is not None and r.get('import_ms', 0) > args.budget_ms]
+    else:
+        over_budget = print_report(results, args.budget_ms)
+
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
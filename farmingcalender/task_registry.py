@@ -0,0 +1,161 @@
+# task_registry.py
+import copy
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+
+
+class TaskRegistry:
+    """Index of planned tasks by (farm_id, task_id).
+
+    Each entry holds the task's day, the live weekly plan it belongs to, its
+    status and a bounded history of status changes, so postponing or
+    completing a task is a dict lookup instead of a scan over every day of
+    every plan. Memory stays flat over a season: a farm keeps one plan per
+    week, plans are dropped once their week is over (or when more than
+    max_plans are held), and history for task ids outside any plan is kept
+    for at most max_loose tasks.
+    """
+
+    def __init__(self, history_size=20, max_plans=10000, max_loose=10000, sweep_interval=300):
+        self.history_size = history_size
+        self.max_plans = max_plans
+        self.max_loose = max_loose
+        self.sweep_interval = sweep_interval  # seconds between expired-week sweeps
+        self._last_sweep = None
+        self._tasks = {}              # (farm_id, task_id) -> entry
+        self._plans = OrderedDict()   # (farm_id, week_start) -> {'plan', 'ends', 'keys'}
+        self._loose = OrderedDict()   # keys of entries that belong to no plan, oldest first
+        self._lock = threading.RLock()
+        self.evictions = 0
+
+    def register_plan(self, weekly_plan, farm_id=None):
+        """Index a plan's tasks and return a copy of the farm's live plan for that week.
+
+        If the farm already has a plan for the week with the same plan_id,
+        the registered one (with any completions and postponements applied)
+        is kept; otherwise the new plan replaces it.
+        """
+        plan_key = (farm_id, weekly_plan.get('week_start'))
+        with self._lock:
+            now = datetime.now()
+            if self._last_sweep is None or (now - self._last_sweep).total_seconds() >= self.sweep_interval:
+                self.evict_expired(now)
+
+            current = self._plans.get(plan_key)
+            if current is not None and weekly_plan.get('plan_id') is not None \
+                    and current['plan'].get('plan_id') == weekly_plan.get('plan_id'):
+                self._plans.move_to_end(plan_key)
+                return copy.deepcopy(current['plan'])
+
+            week_start = datetime.strptime(weekly_plan['week_start'], '%Y-%m-%d')
+            record = {'plan': weekly_plan, 'ends': week_start + timedelta(days=7), 'keys': set()}
+            self._plans[plan_key] = record
+            self._plans.move_to_end(plan_key)
+            self.index_days(farm_id, weekly_plan, sorted(weekly_plan.get('daily_plans', {})))
+
+            # Tasks of the replaced plan keep their history if the new plan has them too
+            if current is not None:
+                self._drop_entries(current, keep=record['keys'])
+
+            while len(self._plans) > self.max_plans:
+                self._drop_plan(next(iter(self._plans)))
+                self.evictions += 1
+
+            return copy.deepcopy(weekly_plan)
+
+    def index_days(self, farm_id, weekly_plan, date_keys):
+        """(Re)index the tasks scheduled on the given days of a registered plan"""
+        with self._lock:
+            record = self._plans.get((farm_id, weekly_plan.get('week_start')))
+            if record is None or record['plan'] is not weekly_plan:
+                return
+
+            for date_key in date_keys:
+                for task in weekly_plan['daily_plans'][date_key].get('tasks', []):
+                    if task.get('id') is None:
+                        continue
+                    key = (farm_id, task.get('id'))
+                    entry = self._entry(key)
+                    entry['date'] = date_key
+                    entry['plan'] = weekly_plan
+                    entry['status'] = 'completed' if task.get('completed') else 'planned'
+                    self._loose.pop(key, None)
+                    record['keys'].add(key)
+
+    def lookup(self, task_id, farm_id=None):
+        """Entry for a task (date, plan, status, history) or None"""
+        with self._lock:
+            return self._tasks.get((farm_id, task_id))
+
+    def update_plan(self, task_id, change, farm_id=None):
+        """Run change(entry) for a task that belongs to a registered plan, under the registry lock.
+
+        Returns change's result, or None if the task is not in any plan.
+        """
+        with self._lock:
+            entry = self._tasks.get((farm_id, task_id))
+            if entry is None or entry['plan'] is None:
+                return None
+            return change(entry)
+
+    def record(self, task_id, status, farm_id=None, **details):
+        """Set a task's status and append it to the task's history"""
+        key = (farm_id, task_id)
+        with self._lock:
+            entry = self._tasks.get(key)
+            if entry is None:
+                entry = self._entry(key)
+                self._loose[key] = True
+                while len(self._loose) > self.max_loose:
+                    self._tasks.pop(self._loose.popitem(last=False)[0], None)
+                    self.evictions += 1
+            elif key in self._loose:
+                self._loose.move_to_end(key)
+
+            entry['status'] = status
+            entry['history'].append(dict(details, status=status, timestamp=datetime.now().isoformat()))
+            return entry
+
+    def history(self, task_id, farm_id=None):
+        with self._lock:
+            entry = self._tasks.get((farm_id, task_id))
+            return list(entry['history']) if entry is not None else []
+
+    def evict_expired(self, now=None):
+        """Drop plans whose week is over, with their tasks"""
+        now = now or datetime.now()
+        with self._lock:
+            expired = [plan_key for plan_key, record in self._plans.items() if record['ends'] <= now]
+            for plan_key in expired:
+                self._drop_plan(plan_key)
+                self.evictions += 1
+            self._last_sweep = now
+
+    def _entry(self, key):
+        entry = self._tasks.get(key)
+        if entry is None:
+            entry = {'date': None, 'plan': None, 'status': 'planned',
+                     'history': deque(maxlen=self.history_size)}
+            self._tasks[key] = entry
+        return entry
+
+    def _drop_plan(self, plan_key):
+        self._drop_entries(self._plans.pop(plan_key))
+
+    def _drop_entries(self, record, keep=()):
+        for key in record['keys']:
+            entry = self._tasks.get(key)
+            if key not in keep and entry is not None and entry['plan'] is record['plan']:
+                del self._tasks[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'plans': len(self._plans),
+                'tasks': len(self._tasks),
+                'loose_tasks': len(self._loose),
+                'max_plans': self.max_plans,
+                'history_size': self.history_size,
+                'evictions': self.evictions
+            }
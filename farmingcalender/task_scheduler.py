@@ -0,0 +1,88 @@
+# task_scheduler.py
+import heapq
+
+# Multiplies a pending task's score by its priority
+PRIORITY_MULTIPLIERS = {
+    'urgent': 3.0,
+    'high': 2.0,
+    'medium': 1.5,
+    'low': 1.0
+}
+
+# Labour hours available per farm and day, main task included
+DEFAULT_DAILY_CAPACITY = 8
+
+
+class PendingTaskScheduler:
+    """Packs pending tasks into a day's labour-hour capacity.
+
+    Candidates go into a heap ordered by (escalated first, score, input
+    order) and are popped only until the day is full, so a farm with
+    hundreds of pending tasks costs a linear heapify plus a few pops per
+    day instead of a full sort. A task is escalated once it has waited
+    within escalation_window days of its task_config max_delay. Durations
+    come from the task's estimated_duration or task_config (and are filled
+    in on scheduled tasks). Tasks that do not fit are postponed with
+    days_pending + 1; carry-over tasks are always postponed, as before.
+    """
+
+    def __init__(self, task_config, daily_capacity=DEFAULT_DAILY_CAPACITY, escalation_window=1):
+        self.task_config = task_config
+        self.daily_capacity = daily_capacity
+        self.escalation_window = escalation_window
+
+    def priority_score(self, task_data, score):
+        """Task score with the waiting bonus and priority multiplier"""
+        urgency_bonus = task_data.get('days_pending', 0) * 2
+        multiplier = PRIORITY_MULTIPLIERS.get(task_data.get('priority', 'medium'), 1.0)
+        return (score + urgency_bonus) * multiplier
+
+    def duration(self, task_data):
+        return task_data.get('estimated_duration') or self.task_config.get(task_data.get('task'), {}).get('duration', 1)
+
+    def is_escalated(self, task_data):
+        max_delay = self.task_config.get(task_data.get('task'), {}).get('max_delay', 7)
+        return task_data.get('days_pending', 0) >= max_delay - self.escalation_window
+
+    def schedule_day(self, pending_tasks, task_score, used_hours=0):
+        """Split pending tasks into (scheduled, postponed) for one day.
+
+        task_score(task_data) is the planner's score for the day's
+        conditions; used_hours is what the main task already takes.
+        Scheduled tasks come out in priority order, postponed ones in their
+        original order.
+        """
+        tasks = [task if isinstance(task, dict) else {'task': task, 'priority': 'medium', 'days_pending': 0}
+                 for task in pending_tasks or []]
+
+        heap = []
+        for position, task_data in enumerate(tasks):
+            if task_data.get('is_carry_over', False):
+                continue
+            escalated = self.is_escalated(task_data)
+            score = self.priority_score(task_data, task_score(task_data))
+            heap.append((not escalated, -score, position))
+        heapq.heapify(heap)
+
+        remaining = self.daily_capacity - used_hours
+        shortest = min((self.duration(tasks[position]) for _, _, position in heap), default=0)
+        scheduled = []
+        while heap and remaining >= shortest:
+            not_escalated, _, position = heapq.heappop(heap)
+            task_data = tasks[position]
+            hours = self.duration(task_data)
+            if hours <= remaining:
+                remaining -= hours
+                scheduled.append(position)
+                if not_escalated and 'estimated_duration' in task_data:
+                    continue
+                task_data = dict(task_data, estimated_duration=hours)
+                if not not_escalated:
+                    task_data['escalated'] = True
+                tasks[position] = task_data
+
+        placed = set(scheduled)
+        postponed = [task_data if task_data.get('is_carry_over', False)
+                     else dict(task_data, days_pending=task_data.get('days_pending', 0) + 1)
+                     for position, task_data in enumerate(tasks) if position not in placed]
+        return [tasks[position] for position in scheduled], postponed
@@ -0,0 +1,164 @@
+# tiled_analysis.py
+import argparse
+import contextlib
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from enhanced_crop_detector import AdvancedCropDetector
+from crop_stage_detector import TomatoStageDetector
+from image_ingest import ANALYSIS_SIZE
+
+# Tiles match the detector's analysis resolution, so they are scored without resizing
+DEFAULT_TILE_SIZE = ANALYSIS_SIZE[0]
+
+
+def open_mosaic(path):
+    """Memory-map an (height, width, 3 or 4) uint8 .npy raster without reading it into RAM"""
+    mosaic = np.load(path, mmap_mode='r')
+    if mosaic.ndim != 3 or mosaic.shape[2] not in (3, 4) or mosaic.dtype != np.uint8:
+        raise ValueError(f"Expected an (H, W, 3|4) uint8 raster, got {mosaic.shape} {mosaic.dtype}")
+    return mosaic
+
+
+def tile_windows(height, width, tile_size):
+    """(row, col, y, x) of every tile, row by row; edge tiles may be smaller"""
+    for row, y in enumerate(range(0, height, tile_size)):
+        for col, x in enumerate(range(0, width, tile_size)):
+            yield row, col, y, x
+
+
+class TiledFieldAnalyzer:
+    """Scores a whole-field drone mosaic tile by tile.
+
+    Each worker copies only its own tile out of the memory-mapped raster, so
+    at most max_in_flight tiles are resident at once no matter how large the
+    field is. Every tile gets the crop detector's crop and growth stage and
+    TomatoStageDetector's health score. Tiles with no image data (black or
+    fully transparent mosaic borders) are reported as None.
+    """
+
+    def __init__(self, crop_detector=None, stage_detector=None, tile_size=DEFAULT_TILE_SIZE,
+                 workers=None, max_in_flight=None, channel_order='rgb'):
+        if channel_order not in ('rgb', 'bgr'):
+            raise ValueError(f"Unknown channel order: {channel_order}")
+
+        self.crop_detector = crop_detector or AdvancedCropDetector()
+        self.stage_detector = stage_detector or TomatoStageDetector()
+        self.tile_size = tile_size
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or self.workers * 2
+        self.channel_order = channel_order
+
+    def analyze_tile(self, mosaic, y, x):
+        window = mosaic[y:y + self.tile_size, x:x + self.tile_size]
+
+        # Transparent (alpha 0) or all-black pixels are outside the surveyed area
+        if window.shape[2] == 4:
+            if not window[:, :, 3].any():
+                return None
+        elif not window.any():
+            return None
+
+        tile = np.ascontiguousarray(window[:, :, :3])
+        if self.channel_order == 'rgb':
+            tile = cv2.cvtColor(tile, cv2.COLOR_RGB2BGR)
+
+        detection = self.crop_detector.detect_crop_from_array(tile)
+        if not detection.get('success'):
+            return {'error': detection.get('error')}
+
+        return {
+            'crop': detection['detected_crop'],
+            'growth_stage': detection['growth_stage'],
+            'confidence': detection['confidence'],
+            'health_score': round(float(self.stage_detector.assess_plant_health(tile)), 1)
+        }
+
+    def iter_tiles(self, mosaic):
+        """Yield (row, col, tile result) in row-major order"""
+        height, width = mosaic.shape[:2]
+        in_flight = deque()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='field-tile') as executor:
+            for row, col, y, x in tile_windows(height, width, self.tile_size):
+                if len(in_flight) >= self.max_in_flight:
+                    done_row, done_col, future = in_flight.popleft()
+                    yield done_row, done_col, future.result()
+
+                in_flight.append((row, col, executor.submit(self.analyze_tile, mosaic, y, x)))
+
+            while in_flight:
+                done_row, done_col, future = in_flight.popleft()
+                yield done_row, done_col, future.result()
+
+    def analyze(self, mosaic):
+        """Per-tile grid of crop, growth stage and health for the whole mosaic"""
+        height, width = mosaic.shape[:2]
+        rows = -(-height // self.tile_size)
+        cols = -(-width // self.tile_size)
+
+        grid = [[None] * cols for _ in range(rows)]
+        crop_counts = {}
+        health_scores = []
+
+        for row, col, cell in self.iter_tiles(mosaic):
+            grid[row][col] = cell
+            if cell and 'crop' in cell:
+                crop_counts[cell['crop']] = crop_counts.get(cell['crop'], 0) + 1
+                health_scores.append(cell['health_score'])
+
+        return {
+            'width': width,
+            'height': height,
+            'tile_size': self.tile_size,
+            'rows': rows,
+            'cols': cols,
+            'grid': grid,
+            'summary': {
+                'analyzed_tiles': len(health_scores),
+                'empty_tiles': sum(cell is None for line in grid for cell in line),
+                'crop_counts': crop_counts,
+                'mean_health_score': round(float(np.mean(health_scores)), 1) if health_scores else None
+            }
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tiled crop, stage and health analysis of a drone orthomosaic')
+    parser.add_argument('mosaic', help='(H, W, 3|4) uint8 .npy raster; convert GeoTIFFs upstream')
+    parser.add_argument('--tile-size', type=int, default=DEFAULT_TILE_SIZE)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--bgr', action='store_true', help='raster is stored in OpenCV BGR order')
+    parser.add_argument('--output', help='write the JSON grid here instead of stdout')
+    parser.add_argument('--verbose', action='store_true', help='keep the per-tile detector logs')
+    args = parser.parse_args()
+
+    mosaic = open_mosaic(args.mosaic)
+    analyzer = TiledFieldAnalyzer(
+        tile_size=args.tile_size,
+        workers=args.workers,
+        channel_order='bgr' if args.bgr else 'rgb'
+    )
+
+    print(f"🛰️ Analyzing {mosaic.shape[1]}x{mosaic.shape[0]} mosaic in {args.tile_size}px tiles...", file=sys.stderr)
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull):
+            report = analyzer.analyze(mosaic)
+    print(f"✅ Done: {report['summary']}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f)
+    else:
+        json.dump(report, sys.stdout)
+        print()
+
+
+if __name__ == '__main__':
+    main()